@@ -0,0 +1,144 @@
+# ann_index.py
+import math
+from typing import Dict, Optional
+
+# ──────────────────────────────────────────────
+# example_embeddings용 pgvector ANN 인덱스 (HNSW / IVFFlat) 관리
+# ──────────────────────────────────────────────
+INDEX_NAMES = {
+    "hnsw"   : "idx_example_embeddings_hnsw",
+    "ivfflat": "idx_example_embeddings_ivfflat",
+}
+
+EMBEDDING_DIM = 384
+
+# 인덱스/검색에 쓰는 임베딩 표현: (인덱싱 식, opclass 접미사, 거리 연산자, 질의 캐스트)
+#   float32: 원본 vector
+#   float16: halfvec 식 인덱스 (인덱스 크기 1/2)
+#   binary : binary_quantize() 부호 비트 + 해밍 거리 (인덱스 크기 1/32)
+# 테이블에는 항상 원본 vector가 남으므로 정확한 re-rank가 가능하다.
+# (int8 스칼라 양자화는 pgvector 타입이 없어 인메모리 백엔드에서만 지원)
+ENCODINGS = {
+    "float32": ("embedding", "vector_l2_ops", "<->", "{q}"),
+    "float16": (f"(embedding::halfvec({EMBEDDING_DIM}))", "halfvec_l2_ops", "<->",
+                f"{{q}}::halfvec({EMBEDDING_DIM})"),
+    "binary" : (f"(binary_quantize(embedding)::bit({EMBEDDING_DIM}))", "bit_hamming_ops", "<~>",
+                f"binary_quantize({{q}})::bit({EMBEDDING_DIM})"),
+}
+
+
+def _encoding(encoding: str):
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Encoding not supported by pgvector: {encoding}")
+    return ENCODINGS[encoding]
+
+
+def default_ivf_lists(n_rows: int) -> int:
+    """pgvector 권장값: 100만 행 이하 rows/1000, 그 이상 sqrt(rows)"""
+    if n_rows > 1_000_000:
+        return max(1, int(math.sqrt(n_rows)))
+    return max(1, n_rows // 1000)
+
+
+def index_ddl(kind: str, params: Dict[str, int], name: Optional[str] = None,
+              encoding: str = "float32") -> str:
+    name = name or INDEX_NAMES[kind]
+    expr, opclass, _, _ = _encoding(encoding)
+    if kind == "hnsw":
+        with_clause = f"m = {int(params['m'])}, ef_construction = {int(params['ef_construction'])}"
+    elif kind == "ivfflat":
+        with_clause = f"lists = {int(params['lists'])}"
+    else:
+        raise ValueError(f"Unknown ANN index kind: {kind}")
+    return (
+        f"CREATE INDEX {name} ON example_embeddings "
+        f"USING {kind} ({expr} {opclass}) WITH ({with_clause});"
+    )
+
+
+def _existing_indexdefs(cur) -> Dict[str, str]:
+    cur.execute("""
+        SELECT indexname, indexdef
+        FROM pg_indexes
+        WHERE tablename = 'example_embeddings';
+    """)
+    return dict(cur.fetchall())
+
+
+def _same_params(indexdef: str, kind: str, params: Dict[str, int], encoding: str = "float32") -> bool:
+    ddl = index_ddl(kind, params, encoding=encoding)
+    wanted = ddl[ddl.index("WITH") + 5:-2].replace(" ", "").lower()
+    indexdef = indexdef.replace(" ", "").replace("'", "").lower()
+    return wanted in indexdef and _encoding(encoding)[1] in indexdef
+
+
+def ensure_ann_index(cur, kind: str, params: Dict[str, int], rebuild: bool = False,
+                     encoding: str = "float32") -> str:
+    """
+    kind: "none" | "hnsw" | "ivfflat",  encoding: ENCODINGS 키
+    - 다른 종류의 인덱스는 삭제
+    - 같은 종류라도 빌드 파라미터·encoding이 다르거나 rebuild=True면 다시 생성
+    Return: 수행 결과 문자열 ("created" / "unchanged" / "dropped" / "none")
+    """
+    existing = _existing_indexdefs(cur)
+    dropped = False
+    for other, name in INDEX_NAMES.items():
+        if other != kind and name in existing:
+            cur.execute(f"DROP INDEX IF EXISTS {name};")
+            dropped = True
+
+    if kind == "none":
+        return "dropped" if dropped else "none"
+
+    name = INDEX_NAMES[kind]
+    if name in existing and not rebuild and _same_params(existing[name], kind, params, encoding):
+        return "unchanged"
+
+    cur.execute(f"DROP INDEX IF EXISTS {name};")
+    cur.execute(index_ddl(kind, params, encoding=encoding))
+    cur.execute("ANALYZE example_embeddings;")
+    return "created"
+
+
+# ──────────────────────────────────────────────
+# 질의 시점 파라미터 (트랜잭션 범위)
+# ──────────────────────────────────────────────
+def search_settings_sql(ef_search: int = 0, probes: int = 0) -> Optional[str]:
+    """
+    hnsw.ef_search / ivfflat.probes를 현재 트랜잭션에만 적용하는 SELECT 문.
+    둘 다 0이면 None (서버 기본값 사용)
+    """
+    parts = []
+    if ef_search > 0:
+        parts.append(f"set_config('hnsw.ef_search', '{int(ef_search)}', true)")
+    if probes > 0:
+        parts.append(f"set_config('ivfflat.probes', '{int(probes)}', true)")
+    return f"SELECT {', '.join(parts)};" if parts else None
+
+
+# ──────────────────────────────────────────────
+# k-NN 서브쿼리 (encoding + 선택적 re-rank)
+# ──────────────────────────────────────────────
+def knn_subquery(encoding: str, vec: str, limit: str, candidates: Optional[str] = None) -> str:
+    """
+    (embedding_id, distance)를 거리순으로 limit개 반환하는 SELECT 문.
+      vec       : 질의 vector 식 (예: "CAST(:vec AS vector)", "%(vec)s::vector")
+      limit     : 결과 수 placeholder
+      candidates: 양자화 encoding일 때 re-rank 후보 수 placeholder.
+                  주어지면 양자화 거리로 후보를 고른 뒤 원본 vector의 L2로 다시 정렬,
+                  없으면 양자화 거리를 그대로 distance로 사용
+    """
+    expr, _, op, q_cast = _encoding(encoding)
+    q = q_cast.format(q=vec)
+    if encoding == "float32":
+        return (f"SELECT embedding_id, embedding <-> {vec} AS distance "
+                f"FROM example_embeddings ORDER BY distance LIMIT {limit}")
+    if candidates is None:
+        return (f"SELECT embedding_id, {expr} {op} {q} AS distance "
+                f"FROM example_embeddings ORDER BY distance LIMIT {limit}")
+    return (
+        f"SELECT embedding_id, embedding <-> {vec} AS distance FROM ("
+        f"SELECT embedding_id, embedding FROM example_embeddings "
+        f"ORDER BY {expr} {op} {q} LIMIT {candidates}"
+        f") AS c ORDER BY distance LIMIT {limit}"
+    )
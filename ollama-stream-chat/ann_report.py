@@ -0,0 +1,189 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import psycopg2
+
+from ann_index import INDEX_NAMES, default_ivf_lists, index_ddl, knn_subquery, search_settings_sql
+from insert import DB_PARAMS
+from vector_index import parse_vector
+
+# =============================================================================
+# ANN 인덱스 recall / latency 비교 리포트
+#   - 정답: NumPy 전수(L2) 검색
+#   - 각 인덱스는 트랜잭션 안에서 임시로 빌드 후 ROLLBACK → 운영 인덱스에 영향 없음
+#     (측정 중에는 기존 ANN 인덱스를 트랜잭션 안에서 잠시 DROP하므로
+#      example_embeddings에 배타 락이 걸린다. 운영 DB라면 한가한 시간에 실행)
+#
+#   python ann_report.py --queries 200 --k 10 --json ann_report.json
+# =============================================================================
+
+
+def knn_sql(encoding: str = "float32", rerank: int = 0) -> str:
+    """encoding 식 인덱스용 k-NN 쿼리 (rerank > 0: k*rerank개 후보를 원본 vector로 재정렬)"""
+    cand = "%(cand)s" if rerank > 0 and encoding != "float32" else None
+    return knn_subquery(encoding, "%(vec)s::vector", "%(k)s", cand) + ";"
+
+
+def _vec_literal(vec: np.ndarray) -> str:
+    return "[" + ",".join(map(repr, vec.tolist())) + "]"
+
+
+def load_embeddings(cur):
+    cur.execute("SELECT embedding_id, embedding::text FROM example_embeddings ORDER BY embedding_id;")
+    rows = cur.fetchall()
+    ids = np.array([r[0] for r in rows])
+    mat = np.vstack([parse_vector(r[1]) for r in rows])
+    return ids, mat
+
+
+def exact_top_k(ids, mat, queries, k):
+    sq = np.einsum("ij,ij->i", mat, mat)
+    out = []
+    for q in queries:
+        scores = sq - 2.0 * (mat @ q)
+        idx = np.argpartition(scores, k - 1)[:k]
+        out.append(set(ids[idx].tolist()))
+    return out
+
+
+def drop_live_indexes(cur):
+    """비교 대상만 쓰이도록 기존 ANN 인덱스를 현재 트랜잭션에서 제거 (ROLLBACK 시 복구)"""
+    for name in INDEX_NAMES.values():
+        cur.execute(f"DROP INDEX IF EXISTS {name};")
+
+
+def run_queries(cur, queries, k, settings_sql=None, encoding="float32", rerank=0):
+    """쿼리별 (결과 id 집합, 지연 ms)"""
+    sql = knn_sql(encoding, rerank)
+    results, lat = [], []
+    for q in queries:
+        if settings_sql:
+            cur.execute(settings_sql)
+        lit = _vec_literal(q)
+        t0 = time.perf_counter()
+        cur.execute(sql, {"vec": lit, "k": k, "cand": k * max(rerank, 1)})
+        rows = cur.fetchall()
+        lat.append((time.perf_counter() - t0) * 1000)
+        results.append({r[0] for r in rows})
+    return results, np.array(lat)
+
+
+def index_size(cur, name):
+    cur.execute("SELECT pg_relation_size(%s::regclass);", (name,))
+    return cur.fetchone()[0]
+
+
+def summarize(name, params, results, truth, lat, k, build_sec=None, index_bytes=None):
+    recall = float(np.mean([len(r & t) / k for r, t in zip(results, truth)]))
+    return {
+        "index": name,
+        "params": params,
+        "recall_at_k": round(recall, 4),
+        "latency_ms_mean": round(float(lat.mean()), 3),
+        "latency_ms_p95": round(float(np.percentile(lat, 95)), 3),
+        "build_sec": None if build_sec is None else round(build_sec, 3),
+        "index_mb": None if index_bytes is None else round(index_bytes / 2**20, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pgvector ANN 인덱스 recall/latency 리포트")
+    parser.add_argument("--queries", type=int, default=200, help="샘플 질의 수")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--hnsw-ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--ivf-lists", type=int, default=0, help="0: 행 수 기준 자동")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--encodings", nargs="*", default=["float16", "binary"],
+                        help="HNSW 식 인덱스로 비교할 양자화 표현 (float16 → halfvec, binary)")
+    parser.add_argument("--rerank", type=int, default=4, help="양자화 후보 k*rerank개를 원본으로 재정렬")
+    parser.add_argument("--json", default="", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    cur = conn.cursor()
+    try:
+        ids, mat = load_embeddings(cur)
+        rng = np.random.default_rng(args.seed)
+        # 저장된 임베딩에 약간의 잡음을 더해 질의로 사용 (자기 자신만 찾는 편향 완화)
+        sample = rng.choice(len(mat), size=min(args.queries, len(mat)), replace=False)
+        queries = mat[sample] + rng.normal(0, 0.01, size=(len(sample), mat.shape[1])).astype(np.float32)
+        truth = exact_top_k(ids, mat, queries, args.k)
+
+        report = []
+
+        # ========= 1) 전수 검색 (인덱스 미사용) =========
+        cur.execute("SET LOCAL enable_indexscan = off;")
+        res, lat = run_queries(cur, queries, args.k)
+        report.append(summarize("exact", {}, res, truth, lat, args.k))
+        conn.rollback()
+
+        # ========= 2) HNSW =========
+        params = {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction}
+        drop_live_indexes(cur)
+        t0 = time.perf_counter()
+        cur.execute(index_ddl("hnsw", params, name="ann_report_tmp_hnsw"))
+        build_sec = time.perf_counter() - t0
+        size = index_size(cur, "ann_report_tmp_hnsw")
+        for ef in args.ef_search:
+            res, lat = run_queries(cur, queries, args.k, search_settings_sql(ef_search=ef))
+            report.append(summarize("hnsw", dict(params, ef_search=ef), res, truth, lat, args.k,
+                                    build_sec, size))
+        conn.rollback()
+
+        # ========= 2-1) 양자화 HNSW (halfvec / binary 식 인덱스, ± re-rank) =========
+        for enc in args.encodings:
+            name = f"ann_report_tmp_hnsw_{enc}"
+            drop_live_indexes(cur)
+            t0 = time.perf_counter()
+            cur.execute(index_ddl("hnsw", params, name=name, encoding=enc))
+            build_sec = time.perf_counter() - t0
+            size = index_size(cur, name)
+            for rerank in sorted({0, args.rerank}):
+                # HNSW는 ef_search개까지만 반환하므로 후보 수 이상으로 설정
+                ef = max(max(args.ef_search), args.k * max(rerank, 1))
+                res, lat = run_queries(cur, queries, args.k, search_settings_sql(ef_search=ef),
+                                       encoding=enc, rerank=rerank)
+                report.append(summarize(f"hnsw-{enc}", dict(params, ef_search=ef, rerank=rerank),
+                                        res, truth, lat, args.k, build_sec, size))
+            conn.rollback()
+
+        # ========= 3) IVFFlat =========
+        params = {"lists": args.ivf_lists or default_ivf_lists(len(mat))}
+        drop_live_indexes(cur)
+        t0 = time.perf_counter()
+        cur.execute(index_ddl("ivfflat", params, name="ann_report_tmp_ivfflat"))
+        build_sec = time.perf_counter() - t0
+        size = index_size(cur, "ann_report_tmp_ivfflat")
+        for probes in args.probes:
+            if probes > params["lists"]:
+                continue
+            res, lat = run_queries(cur, queries, args.k, search_settings_sql(probes=probes))
+            report.append(summarize("ivfflat", dict(params, probes=probes), res, truth, lat, args.k,
+                                    build_sec, size))
+        conn.rollback()
+    finally:
+        cur.close()
+        conn.close()
+
+    print(f"rows={len(mat)}  queries={len(queries)}  k={args.k}")
+    print(f"{'index':<14} {'params':<56} {'recall@k':>8} {'mean ms':>8} {'p95 ms':>8} "
+          f"{'build s':>8} {'MB':>8}")
+    for r in report:
+        build = "" if r["build_sec"] is None else f"{r['build_sec']:.2f}"
+        size = "" if r["index_mb"] is None else f"{r['index_mb']:.2f}"
+        print(f"{r['index']:<14} {json.dumps(r['params']):<56} {r['recall_at_k']:>8.3f} "
+              f"{r['latency_ms_mean']:>8.2f} {r['latency_ms_p95']:>8.2f} {build:>8} {size:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": len(mat), "queries": len(queries), "k": args.k, "results": report}, f, indent=2)
+        print(f"✅ {args.json} 저장 완료")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+# archive_paths.py
+import os
+
+# ──────────────────────────────────────────────
+# archive/ 원본 CSV 경로 (benchmark, retrieval_eval 등 오프라인 도구 공용)
+#   config를 import하지 않음 → benchmark가 환경 변수를 먼저 설정할 수 있도록
+# ──────────────────────────────────────────────
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+EXAMPLES_PATH = os.path.join(ARCHIVE_DIR, "distortion_examples.csv")
+DESCRIPTION_PATH = os.path.join(ARCHIVE_DIR, "distortion_description.csv")
+REFRAMING_PATH = os.path.join(ARCHIVE_DIR, "reframing_dataset.csv")
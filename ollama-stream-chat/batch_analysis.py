@@ -0,0 +1,287 @@
+# batch_analysis.py
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+import rag_engine
+from llm_client import LLMOverloadedError
+from metrics import record_stage
+
+# ──────────────────────────────────────────────
+# 배치(오프라인) 분석
+#   입력 레코드 {id, situation, thought}를 BATCH_SIZE개씩 묶어
+#   임베딩 encode 1회 → top-k 검색 1회(행렬 곱 / LATERAL 쿼리) → (선택) LLM 호출
+#   LLM 호출은 BATCH_LLM_CONCURRENCY개까지 동시에, 다음 묶음의 임베딩·검색과 겹쳐 진행
+#   결과는 입력 순서대로 한 줄씩(JSONL) 내보낸다
+# ──────────────────────────────────────────────
+LLM_RETRIES = 3
+
+
+def input_format(name: str) -> str:
+    """파일 이름 / Content-Type → "csv" | "jsonl" """
+    return "csv" if "csv" in (name or "").lower() else "jsonl"
+
+
+def parse_records(lines: Iterable[str], fmt: str = "jsonl") -> Iterator[Dict]:
+    """
+    JSONL 또는 헤더가 있는 CSV → {'id', 'situation', 'thought'}
+    (열 이름은 대소문자 무시, id가 없으면 1부터의 레코드 번호)
+    """
+    rows = csv.DictReader(lines) if fmt == "csv" else (json.loads(line) for line in lines if line.strip())
+    for n, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            raise ValueError(f"record {n}: expected an object, got {type(row).__name__}")
+        fields = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+        yield {
+            "id"       : fields.get("id") if fields.get("id") not in (None, "") else n,
+            "situation": str(fields.get("situation") or "").strip(),
+            "thought"  : str(fields.get("thought") or "").strip()
+        }
+
+
+def chunked(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk: List[Dict] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ──────────────────────────────────────────────
+# 이어서 실행 (resume)
+# ──────────────────────────────────────────────
+def completed_ids(path: str) -> Set[str]:
+    """
+    기존 결과 파일에서 오류 없이 끝난 id 집합.
+    중간에 끊겨 깨진 마지막 줄은 무시하고, 같은 id가 여러 번이면 마지막 줄 기준
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            key = str(result.get("id"))
+            if "error" in result:
+                done.discard(key)
+            else:
+                done.add(key)
+    return done
+
+
+def skip_completed(records: Iterable[Dict], done: Set[str]) -> Iterator[Dict]:
+    return (r for r in records if str(r["id"]) not in done)
+
+
+# ──────────────────────────────────────────────
+# 묶음 처리
+# ──────────────────────────────────────────────
+def _candidates(items: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "distortion_id"  : it["distortion_id"],
+            "trap_name"      : it.get("trap_name"),
+            "example_thought": it.get("example_thought")
+        }
+        for it in items
+    ]
+
+
+async def _prepare_chunk(
+    chunk: List[Dict],
+    session: AsyncSession,
+    top_k: int,
+    retrieval_only: bool
+) -> List[tuple]:
+    """Return: [(결과 dict, LLM에 넘길 prepare_prompt 형태 ctx 또는 None), …] (입력 순서)"""
+    valid = [r for r in chunk if r["thought"]]
+
+    t0 = time.perf_counter()
+    embeddings = await rag_engine.embed_many([r["thought"] for r in valid])
+    record_stage("batch_embed", time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    retrieved = await rag_engine.fetch_top_k_many(embeddings, session, top_k) if valid else []
+    record_stage("batch_retrieval", time.perf_counter() - t0)
+
+    reframes_by_id: Dict[int, List[Dict]] = {}
+    if not retrieval_only:
+        ids = {it["distortion_id"] for items in retrieved for it in items}
+        if ids:
+            reframes_by_id = await rag_engine.get_reframes_for(list(ids), session, limit=2)
+
+    found = {id(r): (emb, items) for r, emb, items in zip(valid, embeddings, retrieved)}
+    prepared = []
+    for record in chunk:
+        result = {"id": record["id"]}
+        if id(record) not in found:
+            result["error"] = "thought is required"
+            prepared.append((result, None))
+            continue
+        emb, items = found[id(record)]
+        if not items:
+            result.update(distortion_id=None, distortion_ids=[], candidates=[])
+            if not retrieval_only:
+                result["response"] = None
+            prepared.append((result, None))
+            continue
+        result.update(
+            distortion_id=items[0]["distortion_id"],
+            distortion_ids=[it["distortion_id"] for it in items],
+            candidates=_candidates(items)
+        )
+        ctx = None
+        if not retrieval_only:
+            ctx = rag_engine.build_prompt_context(
+                record["situation"], record["thought"], emb, items, reframes_by_id
+            )
+            if ctx["prompt_usage"]:
+                result["prompt_usage"] = ctx["prompt_usage"]
+        prepared.append((result, ctx))
+    return prepared
+
+
+async def _answer(result: Dict, ctx: Dict, semaphore: asyncio.Semaphore) -> Dict:
+    async with semaphore:
+        for attempt in range(1, LLM_RETRIES + 1):
+            try:
+                result["response"] = await rag_engine.ask_llm(ctx["prompt"], ctx)
+                break
+            except LLMOverloadedError as e:
+                # 대화형 요청이 슬롯을 쓰고 있으면 잠시 뒤 재시도
+                if attempt == LLM_RETRIES:
+                    result["error"] = f"LLM is busy: {e}"
+                    break
+                await asyncio.sleep(0.5 * 2 ** attempt)
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                break
+    return result
+
+
+def _finished(result: Dict) -> asyncio.Future:
+    fut = asyncio.get_running_loop().create_future()
+    fut.set_result(result)
+    return fut
+
+
+async def analyze_stream(
+    records: Iterable[Dict],
+    session_factory: Callable[[], AsyncSession],
+    top_k: int = 3,
+    retrieval_only: bool = False,
+    batch_size: int = config.BATCH_SIZE,
+    llm_concurrency: int = config.BATCH_LLM_CONCURRENCY
+) -> AsyncIterator[Dict]:
+    """
+    레코드를 batch_size개씩 처리해 결과를 입력 순서대로 yield.
+    LLM 호출은 공유 LLMClient의 동시성 한도(LLM_MAX_CONCURRENCY) 안에서 llm_concurrency개까지,
+    대기 중인 결과가 batch_size를 넘으면 앞쪽이 끝날 때까지 다음 묶음을 읽지 않는다.
+    """
+    semaphore = asyncio.Semaphore(max(1, min(llm_concurrency, config.LLM_MAX_CONCURRENCY)))
+    pending: Deque[asyncio.Future] = deque()
+    try:
+        for chunk in chunked(records, batch_size):
+            async with session_factory() as session:
+                prepared = await _prepare_chunk(chunk, session, top_k, retrieval_only)
+            for result, ctx in prepared:
+                pending.append(
+                    _finished(result) if ctx is None
+                    else asyncio.ensure_future(_answer(result, ctx, semaphore))
+                )
+            while pending and (pending[0].done() or len(pending) > batch_size):
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+# =============================================================================
+# CLI
+#   python batch_analysis.py thoughts.csv -o results.jsonl --retrieval-only
+#   python batch_analysis.py thoughts.jsonl -o results.jsonl --llm-concurrency 2 --resume
+#   (--resume: 결과 파일에 오류 없이 있는 id는 건너뛰고 이어 씀)
+# =============================================================================
+async def run(args) -> int:
+    from database import async_session
+    from llm_client import close_llm_client
+
+    # 참조 데이터를 먼저 적재 (static_* 레이아웃의 num_ctx 확인 포함, rag_engine.ensure_num_ctx)
+    if config.REFERENCE_DATA_PRELOAD and not args.retrieval_only:
+        async with async_session() as session:
+            await rag_engine.load_reference_data(session)
+
+    done = completed_ids(args.output) if args.resume and args.output != "-" else set()
+    fmt = args.format or input_format(args.input)
+
+    if args.output == "-":
+        out = sys.stdout
+    else:
+        out = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+        # 이전 실행이 줄 중간에 끊겼으면 새 줄부터 이어 씀
+        if args.resume and out.tell() > 0:
+            with open(args.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")
+
+    n, errors, t0 = 0, 0, time.perf_counter()
+    try:
+        with open(args.input, encoding="utf-8", newline="") as f:
+            records = skip_completed(parse_records(f, fmt), done)
+            async for result in analyze_stream(
+                records, async_session,
+                top_k=args.top_k,
+                retrieval_only=args.retrieval_only,
+                batch_size=args.batch_size,
+                llm_concurrency=args.llm_concurrency
+            ):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                n += 1
+                errors += "error" in result
+                if n % args.batch_size == 0:
+                    elapsed = time.perf_counter() - t0
+                    print(f"⏱️ {n}건 ({n / elapsed:.1f}건/s, 오류 {errors})", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        await close_llm_client()
+
+    elapsed = time.perf_counter() - t0
+    skipped = f", 건너뜀 {len(done)}" if done else ""
+    print(f"✅ {n}건 완료 ({elapsed:.1f}s, 오류 {errors}{skipped})", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="JSONL/CSV 배치 분석 → JSONL 결과")
+    parser.add_argument("input", help="입력 파일 (JSONL 또는 CSV, 열: id, situation, thought)")
+    parser.add_argument("-o", "--output", default="-", help="결과 JSONL 경로 (-: stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="", help="기본: 확장자로 판단")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--retrieval-only", action="store_true", help="LLM 없이 top-k distortion만")
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_SIZE)
+    parser.add_argument("--llm-concurrency", type=int, default=config.BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--resume", action="store_true", help="결과 파일에 이미 있는 id는 건너뜀")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
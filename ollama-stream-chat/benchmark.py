@@ -0,0 +1,546 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from archive_paths import DESCRIPTION_PATH, EXAMPLES_PATH, REFRAMING_PATH
+
+# =============================================================================
+# End-to-end 벤치마크: fastapi_server.app 을 실제 HTTP로 호출
+#   - LLM  : 토큰 속도/지연을 조절할 수 있는 가짜 Ollama 서버 (/api/generate)
+#   - 검색 : --backend memory | centroid → CSV(또는 스냅샷)로 만든 인메모리 인덱스, DB 불필요
+#            --backend pgvector → insert.py로 적재된 로컬 Postgres 사용
+#   - 질의 : archive/distortion_examples.csv 의 Thought를 시드 고정으로 샘플링
+#   - 결과 : 단계별(embed, retrieval, reframes, prompt, ttft, total …) p50/p95/p99, req/s
+#            → JSON 저장, --baseline 과 비교해 회귀 검출
+#
+#   python benchmark.py --backend memory --concurrency 1 4 16 --requests 200 \
+#       --json bench.json --baseline bench_prev.json
+#   # 프롬프트 배치별 prompt_eval_duration 전후 비교 (가짜 Ollama가 KV 캐시 재사용을 흉내)
+#   python benchmark.py --layout user_first --llm-prompt-tokens-per-sec 400 --json before.json
+#   python benchmark.py --layout static_all --llm-prompt-tokens-per-sec 400 --baseline before.json
+# =============================================================================
+# 출력 순서 (파이프라인 순). 그 외 단계는 뒤에 이름순
+STAGE_ORDER = ["embed", "retrieval", "reframes", "prompt", "llm", "ttft", "total"]
+
+
+def _none(value):
+    return None if pd.isna(value) else value
+
+
+# =============================================================================
+# 1. 가짜 Ollama 서버
+# =============================================================================
+def make_fake_ollama(first_token_ms: float, tokens_per_sec: float, num_tokens: int,
+                     prompt_tokens_per_sec: float = 0.0, slots: int = 4):
+    """
+    Ollama /api/generate 흉내: first_token_ms 후 첫 토큰, 이후 tokens_per_sec 속도로 생성.
+    마지막 청크(done=true)에 prompt_eval_count / eval_count / *_duration(ns)을 담는다.
+    prompt_tokens_per_sec > 0 이면 프롬프트 평가 시간도 흉내 낸다: 슬롯(slots개)에 남은
+    이전 프롬프트와 공통 앞부분은 KV 캐시로 재사용하고 나머지 토큰만 평가한다.
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+    cached_prompts: List[str] = []  # 슬롯별 마지막 프롬프트 (오래된 것부터)
+
+    def _prompt_eval(prompt: str) -> tuple:
+        """Return: (평가한 토큰 수, prompt_eval 초). 대략 4글자 ≈ 1토큰"""
+        total = max(1, len(prompt) // 4)
+        if prompt_tokens_per_sec <= 0:
+            return total, first_token_ms / 1000
+        best = max(cached_prompts, key=lambda p: len(os.path.commonprefix([p, prompt])), default=None)
+        reused = 0
+        if best is not None:
+            reused = len(os.path.commonprefix([best, prompt])) // 4
+            cached_prompts.remove(best)
+        cached_prompts.append(prompt)
+        del cached_prompts[:-slots]
+        evaluated = max(1, total - reused)
+        return evaluated, evaluated / prompt_tokens_per_sec
+
+    def _stats(prompt_eval: tuple, started: float) -> Dict:
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        eval_ns = int(num_tokens * interval * 1e9)
+        return {
+            "done"                : True,
+            "prompt_eval_count"   : prompt_eval[0],
+            "prompt_eval_duration": int(prompt_eval[1] * 1e9),
+            "eval_count"          : num_tokens,
+            "eval_duration"       : eval_ns,
+            "total_duration"      : total_ns,
+        }
+
+    async def generate(request):
+        body = await request.json()
+        prompt, model = body.get("prompt", ""), body.get("model", "fake")
+        started = time.perf_counter()
+        prompt_eval = _prompt_eval(prompt)
+        # prompt_tokens_per_sec를 주면 first_token_ms는 평가 외 고정 지연
+        first_token_s = first_token_ms / 1000 + (prompt_eval[1] if prompt_tokens_per_sec > 0 else 0.0)
+
+        if not body.get("stream", True):
+            await asyncio.sleep(first_token_s + num_tokens * interval)
+            data = {"model": model, "response": " token" * num_tokens}
+            data.update(_stats(prompt_eval, started))
+            return JSONResponse(data)
+
+        async def chunks():
+            await asyncio.sleep(first_token_s)
+            for i in range(num_tokens):
+                if i:
+                    await asyncio.sleep(interval)
+                yield json.dumps({"model": model, "response": " token", "done": False}) + "\n"
+            final = {"model": model, "response": ""}
+            final.update(_stats(prompt_eval, started))
+            yield json.dumps(final) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return Starlette(routes=[Route("/api/generate", generate, methods=["POST"])])
+
+
+# =============================================================================
+# 2. DB 없이 검색/참조 데이터 준비 (--backend memory | centroid)
+# =============================================================================
+def load_reference_from_csv() -> tuple:
+    """distortion_description.csv / reframing_dataset.csv → (distortions, reframes)"""
+    df_definition = pd.read_csv(DESCRIPTION_PATH)
+    df_definition = df_definition[df_definition["Distortion_ID"].notna()]
+    distortions = {
+        int(row["Distortion_ID"]): {
+            "distortion_id": int(row["Distortion_ID"]),
+            "trap_name"    : _none(row["Distortion"]) or "UnknownDistortion",
+            "definition"   : _none(row["Definition"]) or "Definition not available.",
+            "example"      : _none(row["Example"]),
+            "tips"         : _none(row["Tips to Overcome"]) or "No tips available."
+        }
+        for _, row in df_definition.iterrows()
+    }
+
+    df_reframe = pd.read_csv(REFRAMING_PATH)
+    reframes: Dict[int, List[Dict]] = {}
+    for _, row in df_reframe.iterrows():
+        if _none(row["reframe"]) is None or _none(row["distortion_id"]) is None:
+            continue
+        reframes.setdefault(int(row["distortion_id"]), []).append({
+            "situation": _none(row["situation"]) or "(no situation provided)",
+            "thought"  : row["thought"],
+            "reframe"  : row["reframe"]
+        })
+    return distortions, reframes
+
+
+def build_index_from_csv(encode_fn, distortions: Dict[int, Dict], batch_size: int = 256,
+                         index_cls=None, **options):
+    """distortion_examples.csv → InMemoryVectorIndex (insert.py + load_from_db와 같은 메타데이터)"""
+    from vector_index import InMemoryVectorIndex
+
+    index_cls = index_cls or InMemoryVectorIndex
+    df = pd.read_csv(EXAMPLES_PATH)
+    df["Distortion_ID"] = df["Distortion_ID"].fillna(0).astype(int)
+    thoughts = df["Thought"].astype(str).tolist()
+
+    embeddings = np.vstack([
+        np.asarray(encode_fn(thoughts[i:i + batch_size]), dtype=np.float32)
+        for i in range(0, len(thoughts), batch_size)
+    ])
+    metadata = []
+    for thought, did in zip(thoughts, df["Distortion_ID"].tolist()):
+        d = distortions.get(did, {})
+        metadata.append({
+            "example_thought": thought,
+            "distortion_id"  : did,
+            "trap_name"      : d.get("trap_name") or "UnknownDistortion",
+            "definition"     : d.get("definition") or "Definition not available.",
+            "tips"           : d.get("tips") or "No tips available."
+        })
+    return index_cls(embeddings, metadata, **options)
+
+
+def sample_workload(n: int, seed: int) -> List[str]:
+    thoughts = pd.read_csv(EXAMPLES_PATH)["Thought"].dropna().astype(str).tolist()
+    rng = np.random.default_rng(seed)
+    return [thoughts[i] for i in rng.integers(0, len(thoughts), size=n)]
+
+
+# =============================================================================
+# 3. 서버 실행 (별도 스레드의 이벤트 루프에서 가짜 Ollama + API 서버)
+# =============================================================================
+class ServerThread:
+    def __init__(self, servers, setup=None):
+        self.servers = servers
+        self.setup = setup
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name="bench-servers", daemon=True)
+
+    def _run(self):
+        async def main():
+            if self.setup is not None:
+                await self.setup()
+            await asyncio.gather(*(s.serve() for s in self.servers))
+        try:
+            asyncio.run(main())
+        except BaseException as e:  # 시작 실패를 메인 스레드에 전달
+            self.error = e
+
+    def start(self, timeout: float = 600.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not all(s.started for s in self.servers):
+            if self.error is not None or not self.thread.is_alive():
+                raise RuntimeError(f"benchmark servers failed to start: {self.error}")
+            if time.monotonic() > deadline:
+                raise TimeoutError("benchmark servers did not start in time")
+            time.sleep(0.05)
+
+    def stop(self):
+        for s in self.servers:
+            s.should_exit = True
+        self.thread.join(10)
+
+
+# =============================================================================
+# 4. 부하 생성 / 집계
+# =============================================================================
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    """'embed;dur=12.3, retrieval;dur=4.0' → {'embed': 12.3, 'retrieval': 4.0} (ms)"""
+    out: Dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in (header or "").split(","))):
+        name, *params = part.split(";")
+        for p in params:
+            if p.strip().startswith("dur="):
+                out[name.strip()] = float(p.strip()[4:])
+    return out
+
+
+async def _one_request(client, endpoint: str, thought: str, top_k: int) -> Dict[str, float]:
+    body = {"situation": "", "thought": thought}
+    if top_k:
+        body["top_k"] = top_k
+    t0 = time.perf_counter()
+
+    if endpoint == "sync":
+        r = await client.post("/api/query_explanation", json=body)
+        r.raise_for_status()
+        timings = _parse_server_timing(r.headers.get("server-timing"))
+        timings["total"] = (time.perf_counter() - t0) * 1000
+        return timings
+
+    ttft = None
+    async with client.stream("POST", "/api/query_explanation/stream", json=body) as r:
+        r.raise_for_status()
+        timings = _parse_server_timing(r.headers.get("server-timing"))
+        async for line in r.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            if ttft is None and "token" in event:
+                ttft = (time.perf_counter() - t0) * 1000
+    timings["ttft"] = ttft if ttft is not None else float("nan")
+    timings["total"] = (time.perf_counter() - t0) * 1000
+    return timings
+
+
+def summarize(samples: List[Dict[str, float]], wall: float, errors: int) -> Dict:
+    stages: Dict[str, Dict] = {}
+    names = sorted(
+        {k for s in samples for k in s},
+        key=lambda k: (STAGE_ORDER.index(k) if k in STAGE_ORDER else len(STAGE_ORDER), k)
+    )
+    for name in names:
+        vals = np.array([s[name] for s in samples if name in s and not np.isnan(s[name])])
+        if len(vals) == 0:
+            continue
+        stages[name] = {
+            "count"  : int(len(vals)),
+            "mean_ms": float(vals.mean()),
+            "p50_ms" : float(np.percentile(vals, 50)),
+            "p95_ms" : float(np.percentile(vals, 95)),
+            "p99_ms" : float(np.percentile(vals, 99)),
+            # 이 단계만 직렬로 처리한다고 가정할 때의 처리량 상한
+            "serial_rps": float(1000.0 / vals.mean()) if vals.mean() > 0 else None,
+        }
+    return {
+        "requests"  : len(samples) + errors,
+        "errors"    : errors,
+        "wall_s"    : wall,
+        "throughput_rps": len(samples) / wall if wall > 0 else 0.0,
+        "stages"    : stages,
+    }
+
+
+_PROMPT_METRICS = {
+    'ollama_duration_seconds_sum{phase="prompt_eval"}'  : "prompt_eval_s",
+    'ollama_duration_seconds_count{phase="prompt_eval"}': "generations",
+    'ollama_tokens_total{kind="prompt"}'                : "prompt_tokens",
+}
+
+
+async def _ollama_prompt_stats(client) -> Dict[str, float]:
+    """서버 /metrics에서 Ollama prompt eval 누적값 (실제 Ollama·가짜 서버 모두 동일)"""
+    out = {name: 0.0 for name in _PROMPT_METRICS.values()}
+    try:
+        r = await client.get("/metrics")
+        r.raise_for_status()
+    except Exception:
+        return out
+    for line in r.text.splitlines():
+        key, _, value = line.rpartition(" ")
+        if key in _PROMPT_METRICS:
+            out[_PROMPT_METRICS[key]] = float(value)
+    return out
+
+
+def _prompt_eval_summary(before: Dict[str, float], after: Dict[str, float]) -> Dict:
+    n = after["generations"] - before["generations"]
+    if n <= 0:
+        return {}
+    return {
+        "generations"       : int(n),
+        "prompt_eval_ms_mean": (after["prompt_eval_s"] - before["prompt_eval_s"]) / n * 1000,
+        "prompt_tokens_mean": (after["prompt_tokens"] - before["prompt_tokens"]) / n,
+    }
+
+
+async def run_load(base_url: str, endpoint: str, workload: List[str], warmup: List[str],
+                   concurrency: int, top_k: int) -> Dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        for thought in warmup:
+            try:
+                await _one_request(client, endpoint, thought, top_k)
+            except Exception:
+                pass
+
+        pending = iter(workload)
+        samples: List[Dict[str, float]] = []
+        errors: List[str] = []
+        before = await _ollama_prompt_stats(client)
+
+        async def worker():
+            for thought in pending:
+                try:
+                    samples.append(await _one_request(client, endpoint, thought, top_k))
+                except Exception as e:
+                    errors.append(repr(e))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+        after = await _ollama_prompt_stats(client)
+
+    result = summarize(samples, wall, len(errors))
+    result["concurrency"] = concurrency
+    # Ollama가 보고한 prompt eval (KV 캐시 재사용 시 평가 토큰 수·시간이 줄어듦)
+    result["ollama"] = _prompt_eval_summary(before, after)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+# =============================================================================
+# 5. 회귀 비교
+# =============================================================================
+def compare(current: Dict, baseline: Dict, tolerance: float, min_delta_ms: float = 1.0) -> List[str]:
+    """
+    같은 concurrency끼리 p95 / 처리량을 비교해 tolerance 이상 나빠진 항목 나열
+    (p95 차이가 min_delta_ms 미만인 단계는 측정 잡음으로 보고 무시)
+    """
+    base_runs = {r["concurrency"]: r for r in baseline.get("runs", [])}
+    regressions = []
+    for run in current["runs"]:
+        base = base_runs.get(run["concurrency"])
+        if base is None:
+            continue
+        c = run["concurrency"]
+        if base["throughput_rps"] and run["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"c={c} throughput {base['throughput_rps']:.2f} → {run['throughput_rps']:.2f} req/s"
+            )
+        for stage, st in run["stages"].items():
+            b = base["stages"].get(stage)
+            if (b and st["p95_ms"] > b["p95_ms"] * (1 + tolerance)
+                    and st["p95_ms"] - b["p95_ms"] >= min_delta_ms):
+                regressions.append(
+                    f"c={c} {stage} p95 {b['p95_ms']:.1f} → {st['p95_ms']:.1f} ms"
+                )
+        cur_pe = run.get("ollama", {}).get("prompt_eval_ms_mean")
+        base_pe = base.get("ollama", {}).get("prompt_eval_ms_mean")
+        if (cur_pe is not None and base_pe and cur_pe > base_pe * (1 + tolerance)
+                and cur_pe - base_pe >= min_delta_ms):
+            regressions.append(f"c={c} prompt_eval mean {base_pe:.1f} → {cur_pe:.1f} ms")
+    return regressions
+
+
+def prompt_eval_changes(current: Dict, baseline: Dict) -> List[str]:
+    """같은 concurrency끼리 Ollama prompt_eval_duration / 평가 토큰 수 전후 비교"""
+    base_runs = {r["concurrency"]: r.get("ollama", {}) for r in baseline.get("runs", [])}
+    lines = []
+    for run in current["runs"]:
+        cur, base = run.get("ollama", {}), base_runs.get(run["concurrency"], {})
+        if cur and base:
+            lines.append(
+                f"c={run['concurrency']:3d} prompt_eval {base['prompt_eval_ms_mean']:8.1f} → "
+                f"{cur['prompt_eval_ms_mean']:8.1f} ms   tokens {base['prompt_tokens_mean']:7.1f} → "
+                f"{cur['prompt_tokens_mean']:7.1f}"
+            )
+    return lines
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# =============================================================================
+# 6. main
+# =============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="RAG API end-to-end 벤치마크 (가짜 Ollama)")
+    parser.add_argument("--backend", choices=["memory", "centroid", "pgvector"], default="memory",
+                        help="memory/centroid: DB 없이 CSV/스냅샷으로 검색, pgvector: 로컬 Postgres")
+    parser.add_argument("--diversify", action="store_true", help="top-k를 서로 다른 distortion에서")
+    parser.add_argument("--snapshot", default="", help="memory 백엔드용 인덱스 스냅샷(.npz)")
+    parser.add_argument("--endpoint", choices=["stream", "sync"], default="stream")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="concurrency 단계별 요청 수")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=0, help="0: 서버 기본값")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="임베딩/검색 캐시 사용 (기본: 끔)")
+    parser.add_argument("--llm-first-token-ms", type=float, default=200.0)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--llm-tokens", type=int, default=64)
+    parser.add_argument("--llm-prompt-tokens-per-sec", type=float, default=0.0,
+                        help=">0: 가짜 Ollama가 프롬프트 평가 시간과 앞부분 KV 캐시 재사용을 흉내")
+    parser.add_argument("--llm-slots", type=int, default=4, help="가짜 Ollama KV 캐시 슬롯 수")
+    parser.add_argument("--layout", choices=["user_first", "static_first", "static_all"], default="",
+                        help="PROMPT_LAYOUT (기본: 환경변수/설정값)")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--json", default="", help="결과 JSON 저장 경로")
+    parser.add_argument("--baseline", default="", help="비교할 이전 결과 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="회귀 판정 허용 비율")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="이보다 작은 p95 차이는 무시")
+    args = parser.parse_args()
+
+    # config는 import 시점에 환경변수를 읽으므로 서버 모듈 import 전에 설정
+    os.environ["RETRIEVAL_BACKEND"] = args.backend
+    os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{args.ollama_port}"
+    os.environ["CACHE_ENABLED"] = "1" if args.cache else "0"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "0"
+    os.environ["SERVER_TIMING_HEADER"] = "1"
+    os.environ["METRICS_ENABLED"] = "1"
+    os.environ["RETRIEVAL_DIVERSIFY"] = "1" if args.diversify else "0"
+    if args.layout:
+        os.environ["PROMPT_LAYOUT"] = args.layout
+    in_memory = args.backend != "pgvector"
+    if in_memory:
+        os.environ["LOG_ENABLED"] = "0"  # DB 없음 → logs 기록 생략
+        os.environ["REFERENCE_DATA_PRELOAD"] = "1"
+        if args.snapshot:
+            os.environ["VECTOR_INDEX_SNAPSHOT"] = args.snapshot
+
+    import uvicorn
+    import embedding_model
+    import rag_engine
+    from fastapi_server import app
+
+    async def setup_memory():
+        distortions, reframes = load_reference_from_csv()
+        rag_engine.reference_data.replace(distortions, reframes)
+        if args.snapshot:
+            await rag_engine.load_vector_index()
+        else:
+            index_cls, options = rag_engine._index_class_and_options()
+            rag_engine._vector_index = build_index_from_csv(
+                embedding_model.encode, distortions,
+                index_cls=index_cls, **options
+            )
+        print(f"✅ 인메모리 인덱스 {len(rag_engine._vector_index)}개 준비")
+
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            make_fake_ollama(args.llm_first_token_ms, args.llm_tokens_per_sec, args.llm_tokens,
+                             args.llm_prompt_tokens_per_sec, args.llm_slots),
+            host="127.0.0.1", port=args.ollama_port, log_level="warning", lifespan="off"
+        )),
+        uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=args.api_port, log_level="warning",
+            # memory: DB를 읽는 lifespan 대신 setup_memory()로 준비
+            lifespan="off" if in_memory else "on"
+        )),
+    ]
+    runner = ServerThread(servers, setup_memory if in_memory else None)
+    runner.start()
+
+    base_url = f"http://127.0.0.1:{args.api_port}"
+    report = {
+        "commit"   : _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python"   : platform.python_version(),
+        "params"   : vars(args),
+        "runs"     : [],
+    }
+    try:
+        for c in args.concurrency:
+            workload = sample_workload(args.requests + args.warmup, args.seed)
+            run = asyncio.run(run_load(
+                base_url, args.endpoint, workload[args.warmup:], workload[:args.warmup],
+                c, args.top_k
+            ))
+            report["runs"].append(run)
+            total = run["stages"].get("total", {})
+            print(f"⏱️ c={c:3d}  {run['throughput_rps']:7.2f} req/s  "
+                  f"p50={total.get('p50_ms', 0):8.1f}ms  p95={total.get('p95_ms', 0):8.1f}ms  "
+                  f"p99={total.get('p99_ms', 0):8.1f}ms  errors={run['errors']}")
+            for stage, st in run["stages"].items():
+                print(f"     {stage:16s} p50={st['p50_ms']:8.2f}  p95={st['p95_ms']:8.2f}  "
+                      f"p99={st['p99_ms']:8.2f} ms")
+            if run["ollama"]:
+                print(f"     {'prompt_eval':16s} mean={run['ollama']['prompt_eval_ms_mean']:8.2f} ms  "
+                      f"tokens={run['ollama']['prompt_tokens_mean']:.1f}")
+    finally:
+        runner.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ 결과 저장: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for line in prompt_eval_changes(report, baseline):
+            print("⏱️", line)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("🚨 회귀 감지:")
+            for r in regressions:
+                print("   -", r)
+            raise SystemExit(1)
+        print("✅ baseline 대비 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# cache.py
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def _json_default(value):
+    """np.ndarray 등 NumPy 값을 JSON으로 (임베딩 캐시용)"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def normalize_thought(text: str) -> str:
+    """
+    캐시 키용 정규화: 유니코드 NFKC, 소문자, 공백 압축, 끝 문장부호 제거
+    ("I always fail" / "i always fail." → "i always fail")
+    """
+    t = unicodedata.normalize("NFKC", text or "").lower()
+    t = re.sub(r"\s+", " ", t).strip()
+    return t.rstrip(".!?…,;:~ ").strip()
+
+
+# ──────────────────────────────────────────────
+# 영속 계층 (선택): Redis 호환 서버 / 로컬 SQLite 파일
+# ──────────────────────────────────────────────
+class RedisCacheBackend:
+    """Redis 호환 서버(Redis, Valkey, KeyDB 등)에 JSON 값으로 저장"""
+
+    def __init__(self, url: str, namespace: str):
+        import redis  # 선택 의존성
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(f"{self.namespace}:{key}")
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(
+            f"{self.namespace}:{key}",
+            json.dumps(value, default=_json_default),
+            ex=max(1, int(ttl))
+        )
+
+    def clear(self) -> None:
+        for k in self.client.scan_iter(f"{self.namespace}:*"):
+            self.client.delete(k)
+
+
+class DiskCacheBackend:
+    """SQLite 파일 하나에 (key, value, expires_at) 형태로 저장"""
+
+    def __init__(self, path: str, namespace: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.table = re.sub(r"\W", "_", namespace)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, default=_json_default), time.time() + ttl)
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.commit()
+
+
+def make_cache_backend(kind: str, namespace: str, redis_url: str = "", disk_path: str = ""):
+    """kind: "" (메모리만) | "redis" | "disk" """
+    if not kind:
+        return None
+    if kind == "redis":
+        return RedisCacheBackend(redis_url, namespace)
+    if kind == "disk":
+        return DiskCacheBackend(disk_path, namespace)
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+# ──────────────────────────────────────────────
+# LRU + TTL 캐시
+# ──────────────────────────────────────────────
+class TTLCache:
+    """
+    크기(maxsize) 초과 시 가장 오래 쓰이지 않은 항목부터, TTL 경과 시 조회 시점에 제거.
+    backend가 주어지면 로컬 미스 시 영속 계층을 조회하고, set은 양쪽에 기록한다.
+    값은 JSON 직렬화 가능한 객체(또는 np.ndarray)여야 한다.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception:
+                value = None
+            if value is not None:
+                self._store(key, value, now)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        self._store(key, value, time.monotonic())
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, self.ttl)
+            except Exception:
+                pass  # 영속 계층 장애는 캐시 미스로 취급
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0
+            }
+
+    def _store(self, key: str, value: Any, now: float) -> None:
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
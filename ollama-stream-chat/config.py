@@ -0,0 +1,147 @@
+# config.py
+import os
+
+# ──────────────────────────────────────────────
+# 검색(Retrieval) 백엔드 설정
+# ──────────────────────────────────────────────
+# "pgvector": 매 요청마다 Postgres에서 <-> 정렬 (기존 방식)
+# "memory"  : 시작 시 example_embeddings를 메모리(float32 행렬)로 적재 후 NumPy로 검색
+# "centroid": memory + distortion별 centroid로 후보 partition을 먼저 고른 뒤 그 안에서만 검색
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pgvector")
+
+# centroid 백엔드: distortion당 sub-centroid 수 / 검색할 distortion partition 수
+CENTROID_SUB_CENTROIDS = int(os.getenv("CENTROID_SUB_CENTROIDS", "1"))
+CENTROID_N_PROBE = int(os.getenv("CENTROID_N_PROBE", "3"))
+
+# "1": top-k를 서로 다른 distortion에서 하나씩 (가장 가까운 예시) 뽑음
+RETRIEVAL_DIVERSIFY = os.getenv("RETRIEVAL_DIVERSIFY", "0") == "1"
+# pgvector에서 diversify 시 먼저 가져올 후보 수 (그 안에서 distortion별 1개)
+RETRIEVAL_DIVERSIFY_POOL = int(os.getenv("RETRIEVAL_DIVERSIFY_POOL", "50"))
+
+# 메모리 인덱스 스냅샷(.npz) 경로. 비어 있으면 DB에서 적재
+VECTOR_INDEX_SNAPSHOT = os.getenv("VECTOR_INDEX_SNAPSHOT", "")
+
+# "1": asyncpg에 vector 바이너리 코덱 등록 → 임베딩을 float32 버퍼로 전송
+# "0": 기존처럼 '[x,y,...]' 문자열로 전송
+PGVECTOR_BINARY = os.getenv("PGVECTOR_BINARY", "1") == "1"
+
+# 임베딩 표현: "float32" | "float16" | "int8" | "binary"
+#   memory  : QuantizedVectorIndex (int8 포함)
+#   centroid: float32만 지원 (그 외 값이면 인덱스 적재 시 ValueError)
+#   pgvector: float16 → halfvec 식 인덱스, binary → binary_quantize 식 인덱스
+#             (insert.py --index-encoding 과 맞춰야 인덱스를 탄다, int8 미지원)
+EMBEDDING_ENCODING = os.getenv("EMBEDDING_ENCODING", "float32")
+# 양자화 검색 후 top_k * RERANK_FACTOR개 후보를 원본 float로 다시 정렬 (0: re-rank 안 함)
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+
+# pgvector ANN 인덱스 질의 파라미터 (0: 서버 기본값). insert.py --index 로 인덱스 생성
+PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "0"))
+PGVECTOR_IVF_PROBES = int(os.getenv("PGVECTOR_IVF_PROBES", "0"))
+
+# ──────────────────────────────────────────────
+# 임베딩 모델 (embedding_model: 처음 사용할 때 로드)
+# ──────────────────────────────────────────────
+EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+# "torch": SentenceTransformer | "onnx": ONNX Runtime | "onnx-int8": 동적 int8 양자화 ONNX
+# (ONNX 모델은 python embedding_model.py export --quantize 로 미리 만들거나 첫 로드 때 생성)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "onnx_models")
+# 추론 스레드 수 (torch.set_num_threads / ORT intra_op_num_threads). 0: 런타임 기본값
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+# 공유 임베딩 워커 소켓 경로 (python embedding_model.py serve --socket ...). 비어 있으면 프로세스 내 모델
+EMBED_SERVER_SOCKET = os.getenv("EMBED_SERVER_SOCKET", "")
+# "1": FastAPI 시작 시 모델 로드 + 첫 forward pass (첫 요청 지연 제거)
+EMBED_WARMUP = os.getenv("EMBED_WARMUP", "1") == "1"
+
+# ──────────────────────────────────────────────
+# 임베딩 배치 설정 (EmbeddingBatcher)
+# ──────────────────────────────────────────────
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+# ──────────────────────────────────────────────
+# 임베딩 / 검색 결과 캐시 (cache.TTLCache)
+# ──────────────────────────────────────────────
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "4096"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+# "" (프로세스 메모리만) | "redis" | "disk"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_DISK_PATH = os.getenv("CACHE_DISK_PATH", "./rag_cache.sqlite3")
+
+# ──────────────────────────────────────────────
+# 참조 데이터(distortions, reframing_dataset) 사전 적재
+# ──────────────────────────────────────────────
+# "1": 시작 시 메모리에 적재 후 조회 / "0": 요청마다 배치 쿼리 1회
+REFERENCE_DATA_PRELOAD = os.getenv("REFERENCE_DATA_PRELOAD", "1") == "1"
+
+# ──────────────────────────────────────────────
+# 프롬프트 템플릿 (prompt_templates.TEMPLATES)
+# ──────────────────────────────────────────────
+# "v1": 현재 포맷 | "archive": archive/rag_engine.py 포맷
+PROMPT_TEMPLATE = os.getenv("PROMPT_TEMPLATE", "v1")
+# "user_first": 상황/생각이 맨 앞 (기존) | "static_first" | "static_all": 고정 안내문·참고 블록이 앞
+# → static_*는 요청 간 공통 앞부분이 생겨 Ollama가 prompt eval(KV 캐시)을 재사용
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "user_first")
+# 토큰 예산 (token_budget.PromptBudget, 0: 제한 없음)
+#   전체 예산을 넘으면 리프레임 예시 → 하위 후보 순으로 제외 (static_all은 공유 앞부분 제외한 나머지 기준)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+PROMPT_USER_MAX_TOKENS = int(os.getenv("PROMPT_USER_MAX_TOKENS", "0"))     # 상황 / 생각 각각
+PROMPT_FIELD_MAX_TOKENS = int(os.getenv("PROMPT_FIELD_MAX_TOKENS", "0"))   # 정의·팁·예시 필드 각각
+# 토큰 수 계산용 HF 토크나이저 (대상 Ollama 모델과 같은 것). 비어 있으면 근사치
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+
+# ──────────────────────────────────────────────
+# LLM (Ollama) 설정
+# ──────────────────────────────────────────────
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+# 동시에 진행 가능한 생성 수 / 그 뒤에 대기 가능한 요청 수 / 대기 최대 시간(초)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# 요청 사이 모델을 메모리에 유지할 시간 ("30m", "-1": 계속, "": Ollama 기본값 5m)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# 컨텍스트 길이 (0: 모델 기본값). 요청마다 달라지면 모델이 다시 로드되므로 고정값 권장
+#   PROMPT_LAYOUT=static_*는 프롬프트가 길어(static_all ≈ 전체 distortion 참고 블록) 모델 기본값(흔히 2048)이면
+#   앞부분이 조용히 잘리고 KV 캐시 재사용도 안 된다 → 참조 데이터 적재 시 프롬프트 크기 + 여유를 계산해
+#   0이면 1024 단위로 올림한 값을 자동 설정, 지정값이 그보다 작으면 시작 시 ValueError
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+# 위 계산에 더하는 여유 토큰 (사용자 상황/생각 + 응답 생성)
+OLLAMA_NUM_CTX_HEADROOM = int(os.getenv("OLLAMA_NUM_CTX_HEADROOM", "1024"))
+# 그 밖의 Ollama options (JSON, 예: '{"temperature": 0.2, "seed": 1}')
+OLLAMA_OPTIONS = os.getenv("OLLAMA_OPTIONS", "")
+
+# ──────────────────────────────────────────────
+# LLM 응답 시맨틱 캐시 (semantic_cache.SemanticResponseCache)
+# ──────────────────────────────────────────────
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAXSIZE = int(os.getenv("SEMANTIC_CACHE_MAXSIZE", "1024"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+
+# ──────────────────────────────────────────────
+# 배치 분석 (batch_analysis: CLI, POST /api/batch_analysis)
+# ──────────────────────────────────────────────
+# 한 번에 임베딩·검색할 레코드 수
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "256"))
+# 배치 분석이 동시에 쓰는 LLM 슬롯 수 (LLM_MAX_CONCURRENCY 이하, 나머지는 대화형 요청용)
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))
+
+# ──────────────────────────────────────────────
+# users / logs 비동기 배치 기록 (interaction_logger.InteractionLogger)
+# ──────────────────────────────────────────────
+LOG_ENABLED = os.getenv("LOG_ENABLED", "1") == "1"
+LOG_MAX_BATCH = int(os.getenv("LOG_MAX_BATCH", "200"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_MAX_QUEUE = int(os.getenv("LOG_MAX_QUEUE", "10000"))
+
+# ──────────────────────────────────────────────
+# 지표 (metrics: /metrics, Server-Timing 헤더)
+# ──────────────────────────────────────────────
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "1") == "1"
@@ -2,9 +2,14 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+import config
+from pgvector_codec import register_vector_codec
+
 DATABASE_URL = "postgresql+asyncpg://postgres@localhost:5432/cognitive_distortion"
 
 engine = create_async_engine(DATABASE_URL, echo=False)
+if config.PGVECTOR_BINARY:
+    register_vector_codec(engine)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
@@ -0,0 +1,347 @@
+# embedding_model.py
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+# ──────────────────────────────────────────────
+# 지연 로딩 모델 (torch / onnxruntime은 처음 쓸 때 import)
+#   backend="torch"    : SentenceTransformer
+#   backend="onnx"     : ONNX Runtime (CPU) + mean pooling + L2 정규화
+#   backend="onnx-int8": 위와 동일, 동적 int8 양자화 가중치
+# ──────────────────────────────────────────────
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+_models: Dict[Tuple[str, str], object] = {}
+_models_lock = threading.Lock()
+
+
+def onnx_dir(name: str) -> str:
+    """모델 이름별 ONNX export 위치 (EMBED_ONNX_DIR/<모델 이름>)"""
+    return os.path.join(config.EMBED_ONNX_DIR, name.replace("/", "__"))
+
+
+def export_onnx(name: str, out_dir: Optional[str] = None, quantize: bool = True) -> str:
+    """
+    HF 모델을 ONNX로 export (+ 동적 int8 양자화) 하고 토크나이저를 같은 폴더에 저장.
+    한 번만 실행하면 되며, 이후 onnx 백엔드는 torch 없이 로드된다.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = out_dir or onnx_dir(name)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    model = AutoModel.from_pretrained(name).eval()
+
+    dummy = tokenizer(["warm-up sentence"], return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in dummy]
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[k] for k in input_names),
+            os.path.join(out_dir, ONNX_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={k: {0: "batch", 1: "seq"} for k in input_names + ["last_hidden_state"]},
+            opset_version=14
+        )
+    tokenizer.save_pretrained(out_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            os.path.join(out_dir, ONNX_FILE),
+            os.path.join(out_dir, ONNX_INT8_FILE),
+            weight_type=QuantType.QInt8
+        )
+    return out_dir
+
+
+class OnnxEmbedder:
+    """
+    SentenceTransformer.encode와 같은 호출 형태의 ONNX Runtime 임베더.
+    all-MiniLM-L6-v2 파이프라인(Transformer → mean pooling → Normalize)을 그대로 재현한다.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = False,
+        threads: int = 0,
+        max_seq_length: int = 256,
+        normalize: bool = True
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{path} not found; run: python embedding_model.py export"
+                + (" --quantize" if quantized else "")
+            )
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        # 요청 단위 동시성은 EmbeddingBatcher가 담당하므로 연산자 간 병렬은 끔
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self.normalize = normalize
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        enc = self.tokenizer(
+            sentences, padding=True, truncation=True,
+            max_length=self.max_seq_length, return_tensors="np"
+        )
+        feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+        return emb.astype(np.float32, copy=False)
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **_) -> np.ndarray:
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        if not sentences:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        # 길이순으로 묶어 패딩 최소화 후 원래 순서로 복원 (SentenceTransformer와 동일)
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        out = np.empty((len(sentences), self.dim), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            out[rows] = self._encode_batch([sentences[i] for i in rows])
+        return out[0] if single else out
+
+
+def _load(name: str, backend: str):
+    if backend in ("onnx", "onnx-int8"):
+        quantized = backend == "onnx-int8"
+        model_dir = onnx_dir(name)
+        if not os.path.exists(os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)):
+            print(f"🗂️ ONNX export: {name} → {model_dir}")
+            export_onnx(name, model_dir, quantize=quantized)
+        return OnnxEmbedder(model_dir, quantized=quantized, threads=config.EMBED_THREADS)
+    if backend != "torch":
+        raise ValueError(f"unknown embedding backend: {backend} (expected one of {BACKENDS})")
+
+    from sentence_transformers import SentenceTransformer
+    if config.EMBED_THREADS > 0:
+        import torch
+        torch.set_num_threads(config.EMBED_THREADS)
+    return SentenceTransformer(name)
+
+
+def get_model(name: Optional[str] = None, backend: Optional[str] = None):
+    """
+    임베딩 모델 인스턴스 (프로세스당 (모델 이름, 백엔드)별 1회 로드).
+    반환 객체는 모두 SentenceTransformer.encode 형태의 encode()를 제공한다.
+    """
+    key = (name or config.EMBED_MODEL_NAME, backend or config.EMBED_BACKEND)
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                model = _load(*key)
+                _models[key] = model
+    return model
+
+
+def encode_local(sentences: Sequence[str], batch_size: Optional[int] = None) -> np.ndarray:
+    sentences = list(sentences)
+    return np.asarray(
+        get_model().encode(
+            sentences,
+            batch_size=batch_size or max(1, len(sentences)),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ),
+        dtype=np.float32
+    )
+
+
+def encode(sentences: Sequence[str], batch_size: Optional[int] = None) -> np.ndarray:
+    """
+    문장 목록 → (N, dim) float32.
+    EMBED_SERVER_SOCKET이 설정되어 있으면 공유 임베딩 워커에 요청하고,
+    아니면 이 프로세스에서 모델을 (처음 호출 시) 로드해 계산한다.
+    """
+    if config.EMBED_SERVER_SOCKET:
+        return remote_client().encode(sentences)
+    return encode_local(sentences, batch_size)
+
+
+def warm_up() -> float:
+    """모델 로드 + 첫 forward pass를 미리 수행. Return: 걸린 시간(초)"""
+    t0 = time.perf_counter()
+    encode(["warm-up"])
+    return time.perf_counter() - t0
+
+
+# ──────────────────────────────────────────────
+# 공유 임베딩 워커 (Unix 도메인 소켓)
+#   요청: uint32 길이 | JSON {"sentences": [...]}
+#   응답: uint32 n | uint32 dim | float32[n*dim]   (n == 0xFFFFFFFF 이면 뒤에 오류 JSON)
+# ──────────────────────────────────────────────
+_LEN = struct.Struct(">I")
+_SHAPE = struct.Struct(">II")
+_ERROR = 0xFFFFFFFF
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding server closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class RemoteEmbeddingClient:
+    """
+    공유 임베딩 워커에 대한 동기 클라이언트.
+    EmbeddingBatcher의 워커 스레드에서 호출되므로 스레드별 연결을 유지하고,
+    연결이 끊기면 한 번 다시 연결해 재시도한다.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _request(self, sock: socket.socket, sentences: List[str]) -> np.ndarray:
+        body = json.dumps({"sentences": sentences}).encode("utf-8")
+        sock.sendall(_LEN.pack(len(body)) + body)
+        n, dim = _SHAPE.unpack(_recv_exactly(sock, _SHAPE.size))
+        if n == _ERROR:
+            raise RuntimeError(f"embedding server error: {_recv_exactly(sock, dim).decode('utf-8')}")
+        data = _recv_exactly(sock, n * dim * 4)
+        return np.frombuffer(data, dtype=np.float32).reshape(n, dim)
+
+    def encode(self, sentences: Sequence[str]) -> np.ndarray:
+        sentences = list(sentences)
+        sock = getattr(self._local, "sock", None)
+        try:
+            return self._request(sock or self._connect(), sentences)
+        except (ConnectionError, OSError):
+            if sock is None:
+                raise
+            # 워커 재시작 등으로 끊긴 연결 → 새로 연결해 한 번 재시도
+            sock.close()
+            return self._request(self._connect(), sentences)
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+_remote: Optional[RemoteEmbeddingClient] = None
+
+
+def remote_client() -> RemoteEmbeddingClient:
+    global _remote
+    if _remote is None or _remote.socket_path != config.EMBED_SERVER_SOCKET:
+        _remote = RemoteEmbeddingClient(config.EMBED_SERVER_SOCKET)
+    return _remote
+
+
+async def serve(socket_path: str, max_batch_size: int, max_wait_ms: float) -> None:
+    """
+    모델을 한 번만 로드하고 여러 웹 워커(uvicorn --workers, Streamlit)의 요청을 처리.
+    여러 연결에서 동시에 들어온 요청은 EmbeddingBatcher로 다시 묶어 한 번에 forward.
+    """
+    from embedding_service import EmbeddingBatcher
+
+    print(f"⏱️ 모델 로드: {warm_up():.2f}s ({config.EMBED_MODEL_NAME}, {config.EMBED_BACKEND})")
+    batcher = EmbeddingBatcher(encode_local, max_batch_size, max_wait_ms)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (length,) = _LEN.unpack(await reader.readexactly(_LEN.size))
+                sentences = json.loads(await reader.readexactly(length))["sentences"]
+                try:
+                    if len(sentences) == 1:
+                        vecs = (await batcher.encode(sentences[0]))[None, :]
+                    else:
+                        vecs = await batcher.encode_many(sentences)
+                    vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+                    writer.write(_SHAPE.pack(*vecs.shape) + vecs.tobytes())
+                except Exception as e:
+                    msg = str(e).encode("utf-8")
+                    writer.write(_SHAPE.pack(_ERROR, len(msg)) + msg)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    print(f"✅ 임베딩 워커 대기 중: {socket_path}")
+    async with server:
+        await server.serve_forever()
+
+
+# ──────────────────────────────────────────────
+# CLI
+#   python embedding_model.py serve --socket /tmp/rag-embed.sock
+#     → 웹 워커는 EMBED_SERVER_SOCKET=/tmp/rag-embed.sock 으로 실행
+#   python embedding_model.py export --quantize
+#     → EMBED_BACKEND=onnx | onnx-int8 (없으면 첫 로드 때 자동 export)
+# ──────────────────────────────────────────────
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="임베딩 모델 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="공유 임베딩 워커 (Unix 소켓)")
+    p_serve.add_argument("--socket", default=config.EMBED_SERVER_SOCKET or "/tmp/rag-embed.sock")
+    p_serve.add_argument("--max-batch-size", type=int, default=config.EMBED_MAX_BATCH_SIZE)
+    p_serve.add_argument("--max-wait-ms", type=float, default=config.EMBED_MAX_WAIT_MS)
+
+    p_export = sub.add_parser("export", help="ONNX export (+ 동적 int8 양자화)")
+    p_export.add_argument("--model", default=config.EMBED_MODEL_NAME)
+    p_export.add_argument("--output", default="", help="기본: EMBED_ONNX_DIR/<모델 이름>")
+    p_export.add_argument("--quantize", action="store_true", help=f"{ONNX_INT8_FILE}도 생성")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        # 이 프로세스는 항상 로컬 모델을 사용
+        config.EMBED_SERVER_SOCKET = ""
+        asyncio.run(serve(args.socket, args.max_batch_size, args.max_wait_ms))
+    else:
+        out = export_onnx(args.model, args.output or None, quantize=args.quantize)
+        print(f"✅ {out} 저장 완료")
@@ -0,0 +1,94 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from embedding_model import BACKENDS, get_model
+from retrieval_eval import DEFAULT_MODEL, exact_top_k, load_labeled_examples
+
+# =============================================================================
+# 임베딩 백엔드 parity 검사 (기준: torch SentenceTransformer)
+#   - 임베딩   : 행별 cosine, 원소별 최대 절대 오차
+#   - 검색     : archive/distortion_examples.csv 전체를 index로, 각 Thought를 질의로
+#                (LOO, 자기 자신 제외) top-k 행 집합/순서가 기준과 같은 비율
+#   - 속도     : 배치 인코딩 문장/s
+#   기준을 벗어나면 exit code 1
+#
+#   python embedding_parity.py --backends onnx onnx-int8 --k 3
+# =============================================================================
+
+
+def encode(model_name: str, backend: str, thoughts, batch_size: int):
+    model = get_model(model_name, backend)
+    model.encode(thoughts[:batch_size], batch_size=batch_size)  # warm-up
+    t0 = time.perf_counter()
+    emb = np.asarray(
+        model.encode(thoughts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+        dtype=np.float32
+    )
+    return emb, len(thoughts) / (time.perf_counter() - t0)
+
+
+def compare(ref: np.ndarray, emb: np.ndarray, k: int) -> dict:
+    cos = np.einsum("ij,ij->i", ref, emb) / (
+        np.linalg.norm(ref, axis=1) * np.linalg.norm(emb, axis=1)
+    )
+    rows = np.arange(len(ref))
+    ref_top = exact_top_k(ref, ref, k, exclude=rows)
+    top = exact_top_k(emb, emb, k, exclude=rows)
+    same_set = np.mean([set(a) == set(b) for a, b in zip(ref_top, top)])
+    return {
+        "min_cosine"     : float(cos.min()),
+        "mean_cosine"    : float(cos.mean()),
+        "max_abs_diff"   : float(np.abs(ref - emb).max()),
+        "topk_same_set"  : float(same_set),
+        "topk_same_order": float(np.mean(np.all(ref_top == top, axis=1))),
+        "top1_same"      : float(np.mean(ref_top[:, 0] == top[:, 0])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="임베딩 백엔드 parity 검사 (torch 기준)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"],
+                        choices=[b for b in BACKENDS if b != "torch"])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="행별 최소 cosine")
+    parser.add_argument("--min-topk-same", type=float, default=0.98,
+                        help="top-k 집합이 기준과 같은 질의 비율 하한")
+    parser.add_argument("--json", default="", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    thoughts = load_labeled_examples()["Thought"].tolist()
+    ref, ref_sps = encode(args.model, "torch", thoughts, args.batch_size)
+    print(f"rows={len(thoughts)}  k={args.k}  torch: {ref_sps:.1f} sent/s")
+
+    report, failed = [], False
+    for backend in args.backends:
+        emb, sps = encode(args.model, backend, thoughts, args.batch_size)
+        row = {"backend": backend, "sent_per_sec": sps, "speedup": sps / ref_sps}
+        row.update(compare(ref, emb, args.k))
+        row["ok"] = row["min_cosine"] >= args.min_cosine and row["topk_same_set"] >= args.min_topk_same
+        failed |= not row["ok"]
+        report.append(row)
+
+    print(f"{'backend':10s} {'min cos':>8s} {'max |d|':>8s} {'top-k set':>9s} {'order':>6s} "
+          f"{'top1':>6s} {'sent/s':>8s} {'x':>5s}")
+    for r in report:
+        print(f"{r['backend']:10s} {r['min_cosine']:8.5f} {r['max_abs_diff']:8.5f} "
+              f"{r['topk_same_set']:9.3f} {r['topk_same_order']:6.3f} {r['top1_same']:6.3f} "
+              f"{r['sent_per_sec']:8.1f} {r['speedup']:5.2f} {'✅' if r['ok'] else '🚨'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"params": vars(args), "torch_sent_per_sec": ref_sps, "results": report}, f, indent=2)
+        print(f"✅ 결과 저장: {args.json}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
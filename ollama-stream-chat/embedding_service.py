@@ -0,0 +1,102 @@
+# embedding_service.py
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ──────────────────────────────────────────────
+# 임베딩 마이크로 배처 (요청 병합)
+# ──────────────────────────────────────────────
+class EmbeddingBatcher:
+    """
+    동시에 들어온 encode 요청을 최대 max_wait_ms 동안 모아
+    한 번의 배치 encode로 처리하고, 각 호출자의 future를 완료시킨다.
+
+    - encode_fn: List[str] → np.ndarray (shape: [len, dim])
+    - 실제 forward pass는 executor(기본: 단일 워커 스레드)에서 실행되므로
+      이벤트 루프를 막지 않는다.
+    - 대기열은 현재 실행 중인 이벤트 루프에 묶이며, 루프가 바뀌면
+      (예: Streamlit의 asyncio.run) 새로 초기화된다.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="embedding"
+        )
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def encode(self, sentence: str) -> np.ndarray:
+        """문장 1개 임베딩 (다른 동시 요청과 함께 배치 처리됨)"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._reset(loop)
+
+        fut = loop.create_future()
+        self._pending.append((sentence, fut))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    async def encode_many(self, sentences: Sequence[str]) -> np.ndarray:
+        """이미 모여 있는 문장 목록은 대기 없이 바로 한 배치로 처리"""
+        if not sentences:
+            return np.zeros((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.encode_fn, list(sentences))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+    # ─── 내부 ───
+    def _reset(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._pending = []
+        self._timer = None
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        self._loop.create_task(self._run_batch(batch))
+
+        # 남은 요청이 있으면 다음 배치 예약
+        if self._pending:
+            self._timer = self._loop.call_later(self.max_wait, self._flush)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        sentences = [s for s, _ in batch]
+        try:
+            vectors = await self._loop.run_in_executor(
+                self.executor, self.encode_fn, sentences
+            )
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), vec in zip(batch, vectors):
+            if not fut.done():
+                fut.set_result(vec)
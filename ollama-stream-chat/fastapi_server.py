@@ -1,67 +1,332 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException
+import io
+import json
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
+import config
+from batch_analysis import analyze_stream, input_format, parse_records
+from llm_client import LLMOverloadedError, close_llm_client
+from interaction_logger import get_interaction_logger
+from metrics import (
+    REGISTRY,
+    HTTP_SECONDS,
+    gauge_lines,
+    current_timings,
+    start_request_timings,
+    server_timing_header
+)
+from pgvector_codec import register_vector_codec
 from rag_engine import (
-    search_similar_and_build_prompt,
-    ask_llm
+    prepare_prompt,
+    ask_llm,
+    ask_llm_stream,
+    llm_client,
+    load_vector_index,
+    warm_up_embeddings,
+    IN_MEMORY_BACKENDS,
+    MAX_TOP_K,
+    GENERATE_OPTIONS,
+    load_reference_data,
+    embedder,
+    retrieval_cache,
+    semantic_cache,
+    cache_stats
 )
 
 # === DB 연결 설정 ===
 DB_URL = "postgresql+asyncpg://jangjiwon@localhost:5432/cognitive_distortion"
 engine = create_async_engine(DB_URL, echo=False)
+if config.PGVECTOR_BINARY:
+    register_vector_codec(engine)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+# === users / logs 배치 기록기 (응답 경로 밖에서 DB 기록) ===
+interaction_logger = get_interaction_logger(
+    DB_URL,
+    max_batch=config.LOG_MAX_BATCH,
+    flush_interval=config.LOG_FLUSH_INTERVAL,
+    max_queue=config.LOG_MAX_QUEUE,
+    enabled=config.LOG_ENABLED
+)
+
+# === 정적 데이터 (재)적재 ===
+async def reload_static_data():
+    async with async_session() as session:
+        # 참조 데이터(distortions, reframing_dataset)
+        if config.REFERENCE_DATA_PRELOAD:
+            # static_* 레이아웃이면 프롬프트 크기에 맞춰 num_ctx 확인/설정 (rag_engine.ensure_num_ctx)
+            await load_reference_data(session)
+            if config.PROMPT_LAYOUT != "user_first":
+                print(f"🗂️ Ollama num_ctx: {GENERATE_OPTIONS.get('options', {}).get('num_ctx')}")
+        # 인메모리 검색 백엔드: 요청 전에 임베딩 행렬을 미리 적재
+        if config.RETRIEVAL_BACKEND in IN_MEMORY_BACKENDS:
+            await load_vector_index(session)
+
+# === 시작/종료 훅 ===
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.EMBED_WARMUP:
+        # 첫 요청이 모델 로드를 기다리지 않도록 시작 시 미리 로드
+        print(f"⏱️ 임베딩 warm-up: {await warm_up_embeddings():.2f}s")
+    await reload_static_data()
+    llm_client()  # 커넥션 풀을 가진 공유 LLM 클라이언트 생성
+    interaction_logger.start()
+    yield
+    interaction_logger.stop()  # 큐에 남은 로그까지 기록 후 종료
+    await close_llm_client()
+    embedder.shutdown()
+
 # === FastAPI 앱, 라우터 선언 ===
-app = FastAPI(title="Cognitive Distortion Explanation RAG API")
+app = FastAPI(title="Cognitive Distortion Explanation RAG API", lifespan=lifespan)
 router = APIRouter()
 
+# === 요청 지연 / 단계별 타이밍 (rag_stage_seconds, Server-Timing) ===
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    if not config.METRICS_ENABLED:
+        return await call_next(request)
+    t0 = time.perf_counter()
+    timings = start_request_timings()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        time.perf_counter() - t0,
+        path=getattr(route, "path", "unmatched"),
+        method=request.method,
+        status=response.status_code
+    )
+    # 스트리밍 응답은 헤더 전송 시점까지의 단계(embed, retrieval …)만 포함
+    if config.SERVER_TIMING_HEADER and timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+# === LLM 과부하 → 503 (클라이언트는 Retry-After 후 재시도) ===
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request, exc: LLMOverloadedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"LLM is busy: {exc}"},
+        headers={"Retry-After": "5"}
+    )
+
 # === Pydantic 모델 ===
 class ExplanationQuery(BaseModel):
     situation: str = Field(..., example="시험에서 떨어졌어요.")
     thought: str = Field(..., example="나는 항상 실패하는 사람 같아.")
+    user_id: Optional[str] = Field(None, example="user-001")
+    top_k: int = Field(3, ge=1, le=MAX_TOP_K, example=3)
+    stream: bool = Field(False, description="true: text/event-stream 응답 (/query_explanation/stream 과 동일)")
 
 class ExplanationResponse(BaseModel):
     response: str
     prompt: Optional[str]
     has_info: bool
+    distortion_id: Optional[int] = None
+    distortion_ids: List[int] = []
+    timings_ms: Dict[str, float] = {}
+    prompt_usage: Dict[str, Union[bool, int]] = {}
+
+NO_INFO_MESSAGE = "⚠️ No relevant counseling information was found."
 
 # === 의존성: DB 세션 제공 ===
 async def get_db_session() -> AsyncSession:
     async with async_session() as session:
         yield session
 
+# === 공통: 프롬프트 준비 / 단계별 타이밍 / 상호작용 기록 ===
+async def _prepare(req: ExplanationQuery, session: AsyncSession):
+    """Return: (prepare_prompt 결과 또는 None, 프롬프트 준비 ms)"""
+    if current_timings() is None:  # METRICS_ENABLED=0 이면 미들웨어가 만들지 않음
+        start_request_timings()
+    t_start = time.perf_counter()
+    try:
+        # 임베딩은 워커 스레드, 참조 데이터 조회는 별도 세션으로 검색과 동시에
+        ctx = await prepare_prompt(
+            req.situation, req.thought, session, req.top_k, session_factory=async_session
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    return ctx, (time.perf_counter() - t_start) * 1000
+
+def _timings_ms() -> Dict[str, float]:
+    return {stage: round(sec * 1000, 2) for stage, sec in (current_timings() or {}).items()}
+
+def _log_interaction(req: ExplanationQuery, distortion_id: int, retrieval_ms: float, llm_ms: float):
+    interaction_logger.log(
+        req.user_id, req.situation, req.thought, distortion_id,
+        latency={
+            "retrieval_ms": round(retrieval_ms, 1),
+            "llm_ms"      : round(llm_ms, 1),
+            "total_ms"    : round(retrieval_ms + llm_ms, 1)
+        }
+    )
+
 # === 핵심 POST API 라우트 ===
 @router.post("/query_explanation", response_model=ExplanationResponse)
 async def query_explanation(
     req: ExplanationQuery,
     session: AsyncSession = Depends(get_db_session)
 ):
-    try:
-        prompt = await search_similar_and_build_prompt(
-            req.thought,
-            session
-        )
-        if not prompt:
-            return ExplanationResponse(
-                response="⚠️ No relevant counseling information was found.",
-                prompt=None,
-                has_info=False
-            )
-        answer = await ask_llm(prompt)
+    if req.stream:
+        return await query_explanation_stream(req, session)
+
+    ctx, retrieval_ms = await _prepare(req, session)
+    if not ctx:
         return ExplanationResponse(
-            response=answer,
-            prompt=prompt,
-            has_info=True
+            response=NO_INFO_MESSAGE,
+            prompt=None,
+            has_info=False,
+            timings_ms=_timings_ms()
         )
+
+    t_llm = time.perf_counter()
+    try:
+        answer = await ask_llm(ctx["prompt"], ctx)  # 공유 LLMClient (커넥션 풀 + 동시성 제한)
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
-    
+    _log_interaction(req, ctx["distortion_id"], retrieval_ms, (time.perf_counter() - t_llm) * 1000)
+
+    return ExplanationResponse(
+        response=answer,
+        prompt=ctx["prompt"],
+        has_info=True,
+        distortion_id=ctx["distortion_id"],
+        distortion_ids=ctx["distortion_ids"],
+        timings_ms=_timings_ms(),
+        prompt_usage=ctx["prompt_usage"]
+    )
+
+# === 스트리밍 POST API 라우트 (SSE) ===
+def _sse(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/query_explanation/stream")
+async def query_explanation_stream(
+    req: ExplanationQuery,
+    session: AsyncSession = Depends(get_db_session)
+):
+    """
+    text/event-stream 응답
+      data: {"token": "..."}                     ← 생성되는 대로
+      data: {"done": true, "distortion_id": 3, "timings_ms": {...}}   ← 마지막
+      data: {"error": "..."}                     ← 생성 중 실패 시
+    """
+    ctx, retrieval_ms = await _prepare(req, session)
+
+    async def event_stream():
+        if not ctx:
+            yield _sse({"token": NO_INFO_MESSAGE})
+            yield _sse({"done": True, "distortion_id": None, "has_info": False,
+                        "timings_ms": _timings_ms()})
+            return
+        t_llm = time.perf_counter()
+        try:
+            async for token in ask_llm_stream(ctx["prompt"], ctx):
+                yield _sse({"token": token})
+        except LLMOverloadedError as e:
+            yield _sse({"error": f"LLM is busy: {e}", "retry_after": 5})
+            return
+        except Exception as e:
+            yield _sse({"error": str(e)})
+            return
+        yield _sse({"done": True, "distortion_id": ctx["distortion_id"], "has_info": True,
+                    "distortion_ids": ctx["distortion_ids"], "timings_ms": _timings_ms(),
+                    "prompt_usage": ctx["prompt_usage"]})
+        _log_interaction(req, ctx["distortion_id"], retrieval_ms, (time.perf_counter() - t_llm) * 1000)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# === 배치 분석 (JSONL/CSV 본문 → JSONL 스트림) ===
+@router.post("/batch_analysis")
+async def batch_analysis(
+    request: Request,
+    retrieval_only: bool = Query(False, description="true: LLM 없이 top-k distortion만"),
+    top_k: int = Query(3, ge=1, le=MAX_TOP_K),
+    offset: int = Query(0, ge=0, description="앞에서부터 건너뛸 레코드 수 (끊긴 뒤 받은 줄 수로 재요청)"),
+    batch_size: int = Query(config.BATCH_SIZE, ge=1, le=4096),
+    llm_concurrency: int = Query(config.BATCH_LLM_CONCURRENCY, ge=1)
+):
+    """
+    본문: JSONL(application/x-ndjson) 또는 헤더 있는 CSV(text/csv), 열은 id, situation, thought.
+    결과는 입력 순서대로 한 줄씩 → 받은 줄 수를 offset으로 다시 보내면 이어서 처리
+    """
+    body = (await request.body()).decode("utf-8")
+    try:
+        records = list(parse_records(io.StringIO(body), input_format(request.headers.get("content-type", ""))))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch input: {e}")
+
+    async def result_lines():
+        async for result in analyze_stream(
+            records[offset:], async_session,
+            top_k=top_k,
+            retrieval_only=retrieval_only,
+            batch_size=batch_size,
+            llm_concurrency=llm_concurrency
+        ):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        result_lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Records": str(len(records)), "X-Accel-Buffering": "no"}
+    )
+
 # === 라우터 등록 ===
 app.include_router(router, prefix="/api")
 
 # === 헬스체크용 GET 엔드포인트 ===
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+# === 데이터 변경 후 명시적 재적재 ===
+@app.post("/api/reload")
+async def reload_data():
+    await reload_static_data()
+    retrieval_cache.clear()  # 이전 데이터 기준 검색 결과 무효화
+    semantic_cache.clear()   # 이전 정의·리프레임 예시로 만든 LLM 응답도 무효화
+    return {"status": "reloaded"}
+
+# === 캐시 적중률 확인용 GET 엔드포인트 ===
+@app.get("/api/cache_stats")
+async def get_cache_stats():
+    return dict(cache_stats(), interaction_log=interaction_logger.stats())
+
+# === Prometheus 스크레이프 엔드포인트 ===
+def _collect_gauges():
+    lines = []
+    caches = cache_stats()
+    for key in ("size", "hits", "misses", "hit_rate"):
+        lines += gauge_lines(
+            f"rag_cache_{key}", f"Cache {key}",
+            {name: stats[key] for name, stats in caches.items() if key in stats},
+            label="cache"
+        )
+    # 시맨틱 캐시 적중으로 아낀 LLM 생성 시간 합
+    lines += gauge_lines(
+        "rag_semantic_cache_saved_seconds", "LLM generation time saved by semantic cache hits",
+        {"": caches["semantic"]["saved_seconds"]}
+    )
+    lines += gauge_lines(
+        "interaction_log_records", "Interaction logger queue / write counts",
+        interaction_logger.stats(), label="state"
+    )
+    return lines
+
+REGISTRY.register_collector(_collect_gauges)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -1,7 +1,15 @@
+import argparse
+import hashlib
+import time
+
+import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
 import psycopg2
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_values
+
+from ann_index import default_ivf_lists, ensure_ann_index
+from embedding_model import get_model
+from pgvector_codec import copy_vectors_binary
 
 # =============================================================================
 # 1. 설정: 파일 경로 및 DB 접속 정보
@@ -10,8 +18,6 @@ examples_PATH   = './archive/distortion_examples.csv'
 description_PATH = './archive/distortion_description.csv'
 reframing_PATH   = './archive/reframing_dataset.csv'
 
-MODEL_NAME = 'all-MiniLM-L6-v2'
-
 DB_PARAMS = {
     'host': 'localhost',
     'port': 5432,
@@ -20,41 +26,51 @@ DB_PARAMS = {
     'password': ''
 }
 
-# =============================================================================
-# 2. 임베딩 모델 로드
-# =============================================================================
-model = SentenceTransformer(MODEL_NAME)
+EMBED_BATCH_SIZE = 256     # model.encode 배치 크기
+LOAD_PAGE_SIZE   = 1000    # execute_values 한 번에 보내는 행 수
+
+
+def _none(value):
+    """pandas NaN → None (DB NULL)"""
+    return None if pd.isna(value) else value
+
 
 # =============================================================================
-# 3. CSV 데이터 로딩
+# 2. CSV 데이터 로딩
 # =============================================================================
-# 3-1) 기존 “왜곡 예시” 데이터
-df_examples   = pd.read_csv(examples_PATH)
-df_examples['Distortion_ID'] = df_examples['Distortion_ID'].fillna(0).astype(int)
+def load_csvs():
+    # 2-1) 기존 “왜곡 예시” 데이터
+    df_examples = pd.read_csv(examples_PATH)
+    df_examples['Distortion_ID'] = df_examples['Distortion_ID'].fillna(0).astype(int)
+    df_examples['Thought'] = df_examples['Thought'].astype(str)
 
-# 3-2) 왜곡 설명 데이터
-df_definition = pd.read_csv(description_PATH)
+    # 2-2) 왜곡 설명 데이터
+    df_definition = pd.read_csv(description_PATH)
+    df_definition = df_definition[df_definition['Distortion_ID'].notna()]
 
+    # 2-3) 리프레이밍 데이터
+    df_reframe = pd.read_csv(reframing_PATH)
+
+    return df_examples, df_definition, df_reframe
 
-# 3-3) 리프레이밍 데이터
-df_reframe = pd.read_csv(reframing_PATH)
 
 # =============================================================================
-# 4. 임베딩 생성
+# 3. 임베딩 생성 (배치)
 # =============================================================================
-# 4-1) 예시 데이터(df_examples)의 “Thought”를 임베딩
-df_examples['embedding'] = df_examples['Thought'].astype(str).apply(
-    lambda x: model.encode(x).tolist()
-)
+def embed_thoughts(model, thoughts, batch_size: int) -> np.ndarray:
+    """문장 목록 → (N, dim) float32 행렬. 배치 단위 forward pass"""
+    return model.encode(
+        list(thoughts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
+
 
 # =============================================================================
-# 5. DB 연결 및 테이블 생성/삽입
+# 4. 테이블 생성 / 적재
 # =============================================================================
-conn = None
-try:
-    conn = psycopg2.connect(**DB_PARAMS)
-    cur  = conn.cursor()
-
+def drop_tables(cur):
     # ========= 기존 테이블 삭제 (초기화) =========
     cur.execute("DROP TABLE IF EXISTS logs;")
     cur.execute("DROP TABLE IF EXISTS users;")
@@ -64,68 +80,38 @@ try:
     cur.execute("DROP TABLE IF EXISTS reframe_embeddings;")
     cur.execute("DROP TABLE IF EXISTS distortions;")
 
-    # ========= 1) 왜곡 설명 테이블(distortions) 생성 =========
+
+def create_tables(cur):
+    # ========= 1) 왜곡 설명 테이블(distortions) =========
     cur.execute("""
-        CREATE TABLE distortions (
+        CREATE TABLE IF NOT EXISTS distortions (
             distortion_id INTEGER PRIMARY KEY,
             trap_name     TEXT NOT NULL,
             definition    TEXT,
             example       TEXT,
-            tips          TEXT
+            tips          TEXT,
+            content_hash  TEXT
         );
     """)
 
-    insert_distortions_sql = """
-        INSERT INTO distortions (
-            distortion_id, trap_name, definition, example, tips
-        ) VALUES (%s, %s, %s, %s, %s)
-        ON CONFLICT (distortion_id) DO NOTHING;
-    """
-
-    records_distortions = [
-        (
-            int(row['Distortion_ID']),
-            row['Distortion'],
-            row['Definition'],
-            row['Example'],
-            row['Tips to Overcome']
-        )
-        for _, row in df_definition.iterrows()
-        if not pd.isna(row['Distortion_ID'])
-    ]
-    execute_batch(cur, insert_distortions_sql, records_distortions)
-
-    # ========= 2) “예시 임베딩” 테이블(example_embeddings) 생성 =========
-    #   - df_examples의 각 Thought 임베딩을 저장
+    # ========= 2) “예시 임베딩” 테이블(example_embeddings) =========
     cur.execute("""
-        CREATE TABLE example_embeddings (
+        CREATE TABLE IF NOT EXISTS example_embeddings (
             embedding_id SERIAL PRIMARY KEY,
             embedding    vector(384) NOT NULL
         );
     """)
 
-    insert_example_embeddings_sql = """
-        INSERT INTO example_embeddings (embedding) VALUES (%s) RETURNING embedding_id;
-    """
-
-    example_embedding_ids = []
-    for vec in df_examples['embedding']:
-        cur.execute(insert_example_embeddings_sql, (vec,))
-        eid = cur.fetchone()[0]
-        example_embedding_ids.append(eid)
-
-    # df_examples에 embedding_id 컬럼 추가
-    df_examples['embedding_id'] = example_embedding_ids
-
-    # ========= 3) “예시 데이터” 테이블(example_dataset) 생성 =========
+    # ========= 3) “예시 데이터” 테이블(example_dataset) =========
     #   - ID (CSV), Thought, Distortion, Distortion_ID, embedding_id (FK)
     cur.execute("""
-        CREATE TABLE example_dataset (
+        CREATE TABLE IF NOT EXISTS example_dataset (
             id             INTEGER PRIMARY KEY,
             thought        TEXT NOT NULL,
             distortion     TEXT,
             distortion_id  INTEGER,
             embedding_id   INTEGER,
+            content_hash   TEXT,
             CONSTRAINT fk_distortion_example FOREIGN KEY (distortion_id)
                 REFERENCES distortions (distortion_id)
                 ON DELETE SET NULL,
@@ -135,56 +121,21 @@ try:
         );
     """)
 
-    insert_example_dataset_sql = """
-        INSERT INTO example_dataset (
-            id, thought, distortion, distortion_id, embedding_id
-        ) VALUES (%s, %s, %s, %s, %s);
-    """
-
-    records_examples = [
-        (
-            int(row['ID']),
-            row['Thought'],
-            row['Distortion'],
-            int(row['Distortion_ID']),
-            int(row['embedding_id'])
-        )
-        for _, row in df_examples.iterrows()
-    ]
-    execute_batch(cur, insert_example_dataset_sql, records_examples)
-
-    # ========= 5) “리프레이밍 데이터” 테이블(reframing_dataset) 생성 =========
+    # ========= 4) “리프레이밍 데이터” 테이블(reframing_dataset) =========
     cur.execute("""
-        CREATE TABLE reframing_dataset (
+        CREATE TABLE IF NOT EXISTS reframing_dataset (
             situation            TEXT,
             thought              TEXT,
             reframe              TEXT,
             distortion_id        INTEGER,
+            content_hash         TEXT,
             CONSTRAINT fk_distortion_reframe FOREIGN KEY (distortion_id)
                 REFERENCES distortions (distortion_id)
                 ON DELETE SET NULL
         );
     """)
 
-    insert_reframing_dataset_sql = """
-        INSERT INTO reframing_dataset (
-            situation, thought, reframe, distortion_id
-        ) VALUES (%s, %s, %s, %s);
-    """
-
-    records_reframes = [
-        (
-            row.get('situation'),
-            row['thought'],
-            row.get('reframe'),
-            int(row['distortion_id'])
-        )
-        for _, row in df_reframe.iterrows()
-    ]
-    execute_batch(cur, insert_reframing_dataset_sql, records_reframes)
-
-
-    # ========= 6) users 테이블 생성 (기존과 동일) =========
+    # ========= 5) users 테이블 =========
     cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
             user_id    TEXT PRIMARY KEY
@@ -192,7 +143,7 @@ try:
     """)
     print("✅ users 테이블 준비 완료")
 
-    # ======= 6) logs 테이블 생성 =======
+    # ========= 6) logs 테이블 =========
     cur.execute("""
         CREATE TABLE IF NOT EXISTS logs (
             log_id        SERIAL PRIMARY KEY,
@@ -200,23 +151,362 @@ try:
             situation     TEXT NOT NULL,
             thought       TEXT NOT NULL,
             distortion_id INTEGER REFERENCES distortions(distortion_id) ON DELETE SET NULL,
+            latency       JSONB,
             created_at    TIMESTAMP DEFAULT NOW()
             );
         """)
+    # 기존 logs 테이블에는 단계별 지연(ms) 컬럼 추가
+    cur.execute("ALTER TABLE logs ADD COLUMN IF NOT EXISTS latency JSONB;")
     print("✅ logs 테이블 준비 완료")
 
-    # ========= 8) 커밋 =========
-    conn.commit()
-    print(f"✅ distortions: {len(records_distortions)}개, "
-          f"example_dataset: {len(records_examples)}개, "
-          f"reframing_dataset: {len(records_reframes)}개 삽입 완료.")
-
-except Exception as e:
-    if conn:
-        conn.rollback()
-    print("🚨 처리 중 에러 발생:", e)
-
-finally:
-    if conn:
-        cur.close()
-        conn.close()
\ No newline at end of file
+
+def copy_embeddings(cur, embedding_ids, embeddings: np.ndarray):
+    """
+    example_embeddings에 COPY (FORMAT BINARY)로 일괄 적재.
+    - embedding_id는 클라이언트에서 미리 배정하므로 행별 RETURNING 왕복이 없다.
+    - 벡터는 float32 버퍼 그대로 전송 (문자열 포맷팅/서버 파싱 없음)
+    """
+    copy_vectors_binary(cur, "example_embeddings", embedding_ids, embeddings)
+    # SERIAL 시퀀스를 배정한 최대 id 이후로 맞춤
+    cur.execute("""
+        SELECT setval(
+            pg_get_serial_sequence('example_embeddings', 'embedding_id'),
+            COALESCE((SELECT MAX(embedding_id) FROM example_embeddings), 0) + 1,
+            false
+        );
+    """)
+
+
+# =============================================================================
+# 5. 콘텐츠 해시 (증분 적재용)
+# =============================================================================
+#   Python과 SQL이 같은 값을 내도록: md5(필드들을 chr(31)로 연결, NULL → '')
+def row_hash(*fields) -> str:
+    joined = "\x1f".join("" if f is None else str(f) for f in fields)
+    return hashlib.md5(joined.encode("utf-8")).hexdigest()
+
+
+def _sql_hash(*columns) -> str:
+    return "md5(" + " || chr(31) || ".join(f"COALESCE({c}::text, '')" for c in columns) + ")"
+
+
+HASH_COLUMNS = {
+    "distortions"      : ("trap_name", "definition", "example", "tips"),
+    "example_dataset"  : ("thought", "distortion", "distortion_id"),
+    "reframing_dataset": ("situation", "thought", "reframe", "distortion_id"),
+}
+
+
+def migrate_content_hash(cur):
+    """
+    content_hash 컬럼이 없던 기존 DB 대응:
+    컬럼 추가 → 비어 있는 해시 채우기 → reframing_dataset 중복 제거 후 유니크 인덱스
+    """
+    for table, columns in HASH_COLUMNS.items():
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+        cur.execute(
+            f"UPDATE {table} SET content_hash = {_sql_hash(*columns)} "
+            f"WHERE content_hash IS NULL;"
+        )
+    cur.execute("""
+        DELETE FROM reframing_dataset AS a
+        USING reframing_dataset AS b
+        WHERE a.content_hash = b.content_hash
+          AND a.ctid > b.ctid;
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_reframing_content_hash
+            ON reframing_dataset (content_hash);
+    """)
+
+
+# =============================================================================
+# 6. 증분 동기화 (새로 추가·변경된 행만 임베딩 / upsert)
+# =============================================================================
+def sync_distortions(cur, df_definition, page_size: int) -> int:
+    records = [
+        (did, name, definition, example, tips, row_hash(name, definition, example, tips))
+        for did, name, definition, example, tips in zip(
+            df_definition['Distortion_ID'].astype(int).tolist(),
+            df_definition['Distortion'].tolist(),
+            map(_none, df_definition['Definition']),
+            map(_none, df_definition['Example']),
+            map(_none, df_definition['Tips to Overcome'])
+        )
+    ]
+    rows = execute_values(cur, """
+        INSERT INTO distortions (
+            distortion_id, trap_name, definition, example, tips, content_hash
+        ) VALUES %s
+        ON CONFLICT (distortion_id) DO UPDATE SET
+            trap_name    = EXCLUDED.trap_name,
+            definition   = EXCLUDED.definition,
+            example      = EXCLUDED.example,
+            tips         = EXCLUDED.tips,
+            content_hash = EXCLUDED.content_hash
+        WHERE distortions.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING distortion_id;
+    """, records, page_size=page_size, fetch=True)
+    return len(rows)
+
+
+def diff_examples(cur, df_examples):
+    """
+    CSV 행 중 DB에 없거나 해시가 달라진 행만 골라낸다.
+    Return: (변경 대상 DataFrame, 기존 id → embedding_id)
+    """
+    cur.execute("SELECT id, content_hash, embedding_id FROM example_dataset;")
+    existing = {rid: (h, eid) for rid, h, eid in cur.fetchall()}
+
+    hashes = [
+        row_hash(thought, _none(distortion), did)
+        for thought, distortion, did in zip(
+            df_examples['Thought'], df_examples['Distortion'], df_examples['Distortion_ID']
+        )
+    ]
+    df = df_examples.assign(content_hash=hashes)
+    changed = [
+        rid not in existing or existing[rid][0] != h
+        for rid, h in zip(df['ID'].astype(int).tolist(), hashes)
+    ]
+    existing_eids = {rid: eid for rid, (_, eid) in existing.items()}
+    return df[changed], existing_eids
+
+
+def write_examples(cur, df_delta, embeddings: np.ndarray, existing_eids, page_size: int):
+    """
+    변경 행: 기존 embedding_id의 벡터를 UPDATE
+    신규 행: MAX(embedding_id) 다음 번호를 미리 배정해 COPY
+    그 뒤 example_dataset을 id 기준 upsert
+    """
+    ids = df_delta['ID'].astype(int).tolist()
+    update_mask = np.array([existing_eids.get(rid) is not None for rid in ids], dtype=bool)
+
+    cur.execute("SELECT COALESCE(MAX(embedding_id), 0) FROM example_embeddings;")
+    next_eid = cur.fetchone()[0] + 1
+    n_new = int((~update_mask).sum())
+    new_eids = iter(range(next_eid, next_eid + n_new))
+    embedding_ids = [
+        existing_eids[rid] if upd else next(new_eids)
+        for rid, upd in zip(ids, update_mask)
+    ]
+
+    # ========= example_embeddings =========
+    if update_mask.any():
+        # 변경 벡터도 임시 테이블에 바이너리 COPY 후 한 번에 UPDATE
+        cur.execute("""
+            CREATE TEMP TABLE tmp_changed_embeddings (
+                embedding_id INTEGER PRIMARY KEY,
+                embedding    vector(384) NOT NULL
+            ) ON COMMIT DROP;
+        """)
+        copy_vectors_binary(
+            cur, "tmp_changed_embeddings",
+            [eid for eid, upd in zip(embedding_ids, update_mask) if upd],
+            embeddings[update_mask]
+        )
+        cur.execute("""
+            UPDATE example_embeddings AS e
+            SET embedding = t.embedding
+            FROM tmp_changed_embeddings AS t
+            WHERE e.embedding_id = t.embedding_id;
+        """)
+    if n_new:
+        copy_embeddings(
+            cur,
+            [eid for eid, upd in zip(embedding_ids, update_mask) if not upd],
+            embeddings[~update_mask]
+        )
+
+    # ========= example_dataset =========
+    records = list(zip(
+        ids,
+        df_delta['Thought'].tolist(),
+        map(_none, df_delta['Distortion']),
+        df_delta['Distortion_ID'].tolist(),
+        embedding_ids,
+        df_delta['content_hash'].tolist()
+    ))
+    execute_values(cur, """
+        INSERT INTO example_dataset (
+            id, thought, distortion, distortion_id, embedding_id, content_hash
+        ) VALUES %s
+        ON CONFLICT (id) DO UPDATE SET
+            thought       = EXCLUDED.thought,
+            distortion    = EXCLUDED.distortion,
+            distortion_id = EXCLUDED.distortion_id,
+            embedding_id  = EXCLUDED.embedding_id,
+            content_hash  = EXCLUDED.content_hash;
+    """, records, page_size=page_size)
+    return int(update_mask.sum()), n_new
+
+
+def _reframe_records(df_reframe):
+    return [
+        (situation, thought, reframe, did, row_hash(situation, thought, reframe, did))
+        for situation, thought, reframe, did in zip(
+            map(_none, df_reframe['situation']),
+            df_reframe['thought'].tolist(),
+            map(_none, df_reframe['reframe']),
+            df_reframe['distortion_id'].astype(int).tolist()
+        )
+    ]
+
+
+def sync_reframes(cur, df_reframe, page_size: int):
+    """
+    리프레이밍 행은 id로 참조되지 않으므로 내용 해시로 동기화:
+    CSV에 없는 해시(수정 전 버전 포함)는 삭제하고 새 해시만 INSERT
+    → 수정된 행이 이전 버전과 함께 few-shot 후보에 남지 않음
+    Return: (추가 수, 삭제 수)
+    """
+    records = _reframe_records(df_reframe)
+    cur.execute(
+        "DELETE FROM reframing_dataset WHERE NOT (content_hash = ANY(%s));",
+        ([rec[-1] for rec in records],)
+    )
+    n_deleted = cur.rowcount
+    rows = execute_values(cur, """
+        INSERT INTO reframing_dataset (
+            situation, thought, reframe, distortion_id, content_hash
+        ) VALUES %s
+        ON CONFLICT (content_hash) DO NOTHING
+        RETURNING content_hash;
+    """, records, page_size=page_size, fetch=True)
+    return len(rows), n_deleted
+
+
+def prune_removed(cur, df_examples) -> int:
+    """CSV에서 사라진 예시 행과 그 임베딩 삭제 (--prune)"""
+    cur.execute("""
+        WITH removed AS (
+            DELETE FROM example_dataset
+            WHERE NOT (id = ANY(%s))
+            RETURNING embedding_id
+        )
+        DELETE FROM example_embeddings
+        WHERE embedding_id IN (SELECT embedding_id FROM removed);
+    """, (df_examples['ID'].astype(int).tolist(),))
+    return cur.rowcount
+
+
+# =============================================================================
+# 7. 실행
+# =============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description="CSV → Postgres(pgvector) 적재 (기본: 변경분만 증분 적재)"
+    )
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="모든 테이블(users, logs 포함)을 삭제하고 처음부터 다시 적재")
+    parser.add_argument("--prune", action="store_true",
+                        help="CSV에서 사라진 예시 행을 DB에서도 삭제 (리프레이밍 행은 항상 CSV와 동기화)")
+    parser.add_argument("--index", choices=["keep", "none", "hnsw", "ivfflat"], default="keep",
+                        help="example_embeddings ANN 인덱스 (keep: 기존 인덱스 유지)")
+    parser.add_argument("--hnsw-m", type=int, default=16,
+                        help="HNSW 노드당 최대 연결 수")
+    parser.add_argument("--hnsw-ef-construction", type=int, default=64,
+                        help="HNSW 빌드 시 후보 리스트 크기")
+    parser.add_argument("--ivf-lists", type=int, default=0,
+                        help="IVFFlat 리스트 수 (0: 행 수 기준 자동)")
+    parser.add_argument("--index-encoding", choices=["float32", "float16", "binary"], default="float32",
+                        help="인덱싱할 표현: float16 → halfvec, binary → binary_quantize "
+                             "(서버의 EMBEDDING_ENCODING과 맞출 것, 원본 vector는 re-rank용으로 유지)")
+    parser.add_argument("--reindex", action="store_true",
+                        help="파라미터가 같아도 인덱스를 다시 빌드 (IVFFlat은 대량 적재 후 권장)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="임베딩 배치 크기")
+    parser.add_argument("--page-size", type=int, default=LOAD_PAGE_SIZE,
+                        help="execute_values 페이지 크기")
+    args = parser.parse_args()
+
+    df_examples, df_definition, df_reframe = load_csvs()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_PARAMS)
+        cur  = conn.cursor()
+
+        if args.full_rebuild:
+            drop_tables(cur)
+        create_tables(cur)
+        migrate_content_hash(cur)
+
+        # ========= 1) distortions (FK 대상이므로 먼저) =========
+        n_dist = sync_distortions(cur, df_definition, args.page_size)
+
+        # ========= 2) 변경분만 임베딩 =========
+        df_delta, existing_eids = diff_examples(cur, df_examples)
+        embed_sec = 0.0
+        if len(df_delta):
+            # 변경분이 있을 때만 모델 로드 (질의 경로와 같은 EMBED_MODEL_NAME / EMBED_BACKEND)
+            model = get_model()
+            t0 = time.perf_counter()
+            embeddings = embed_thoughts(model, df_delta['Thought'], args.batch_size)
+            embed_sec = time.perf_counter() - t0
+
+        # ========= 3) 적재 =========
+        t0 = time.perf_counter()
+        n_updated, n_new = 0, 0
+        if len(df_delta):
+            n_updated, n_new = write_examples(
+                cur, df_delta, embeddings, existing_eids, args.page_size
+            )
+        n_reframes, n_reframes_deleted = sync_reframes(cur, df_reframe, args.page_size)
+        n_pruned = prune_removed(cur, df_examples) if args.prune else 0
+        load_sec = time.perf_counter() - t0
+
+        # ========= 4) ANN 인덱스 (적재 처리량과 따로 측정) =========
+        index_status, index_sec = None, 0.0
+        if args.index != "keep":
+            cur.execute("SELECT COUNT(*) FROM example_embeddings;")
+            n_total = cur.fetchone()[0]
+            params = {
+                "m": args.hnsw_m,
+                "ef_construction": args.hnsw_ef_construction,
+                "lists": args.ivf_lists or default_ivf_lists(n_total),
+            }
+            t_idx = time.perf_counter()
+            index_status = ensure_ann_index(
+                cur, args.index, params, rebuild=args.reindex, encoding=args.index_encoding
+            )
+            index_sec = time.perf_counter() - t_idx
+
+        # ========= 커밋 =========
+        t_commit = time.perf_counter()
+        conn.commit()
+        load_sec += time.perf_counter() - t_commit
+
+        n_examples = n_updated + n_new
+        n_rows = n_dist + n_examples * 2 + n_reframes  # 임베딩 + 예시 데이터
+        print(f"✅ distortions: {n_dist}개, "
+              f"example_dataset: 신규 {n_new}개 / 변경 {n_updated}개 "
+              f"(전체 {len(df_examples)}개 중), "
+              f"reframing_dataset: {n_reframes}개 추가 / {n_reframes_deleted}개 삭제 반영 완료.")
+        if index_status is not None:
+            print(f"🗂️ ANN 인덱스({args.index}, {args.index_encoding}): {index_status}")
+        if args.prune:
+            print(f"🧹 삭제: example_dataset {n_pruned}개")
+        if n_examples:
+            print(f"⏱️ 임베딩: {n_examples}행 / {embed_sec:.2f}s "
+                  f"({n_examples / max(embed_sec, 1e-9):.1f} rows/s, batch={args.batch_size})")
+        else:
+            print("⏱️ 임베딩: 변경된 예시 없음 (건너뜀)")
+        print(f"⏱️ 적재  : {n_rows}행 / {load_sec:.2f}s "
+              f"({n_rows / max(load_sec, 1e-9):.1f} rows/s, 인덱스 빌드 제외)")
+        if index_status is not None:
+            print(f"⏱️ 인덱스: {index_sec:.2f}s")
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print("🚨 처리 중 에러 발생:", e)
+
+    finally:
+        if conn:
+            cur.close()
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# interaction_logger.py
+import asyncio
+import atexit
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+_STOP = object()
+
+
+# ──────────────────────────────────────────────
+# users / logs 비동기 배치 기록기 (write-behind)
+# ──────────────────────────────────────────────
+class InteractionLogger:
+    """
+    log()는 레코드를 프로세스 내 큐에 넣고 즉시 반환한다 (DB 대기 없음).
+    전용 스레드가 자체 이벤트 루프·엔진으로 큐를 비우며,
+    max_batch개가 모이거나 flush_interval초가 지나면 한 번에 기록한다.
+
+    - users: unnest(...) + ON CONFLICT DO NOTHING  (쿼리 1회)
+    - logs : unnest(...) 다중 행 INSERT             (쿼리 1회)
+    - stop(): 남은 레코드를 모두 기록한 뒤 종료 (graceful shutdown)
+    - 큐가 가득 차면 레코드를 버리고 dropped를 증가 (응답 경로를 막지 않음)
+    - enabled=False: 아무것도 기록하지 않음 (DB 없는 벤치마크 등)
+
+    별도 스레드/루프를 쓰므로 FastAPI(uvicorn 루프)와
+    Streamlit(클릭마다 asyncio.run) 양쪽에서 그대로 쓸 수 있다.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        max_batch: int = 200,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        enabled: bool = True
+    ):
+        self.db_url = db_url
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    # ─── 공개 API ───
+    def log(
+        self,
+        user_id: Optional[str],
+        situation: str,
+        thought: str,
+        distortion_id: Optional[int],
+        latency: Optional[Dict[str, float]] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        self.start()
+        record = {
+            "user_id"      : user_id or None,
+            "situation"    : situation,
+            "thought"      : thought,
+            "distortion_id": distortion_id or None,
+            "latency"      : json.dumps(latency) if latency else None,
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="interaction-logger", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """큐에 남은 레코드를 모두 기록하고 스레드 종료"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued" : self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed" : self.failed,
+        }
+
+    # ─── 백그라운드 스레드 ───
+    def _run(self) -> None:
+        asyncio.run(self._consume())
+
+    async def _consume(self) -> None:
+        engine = create_async_engine(self.db_url, echo=False)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            stopping = False
+            while not stopping:
+                batch: List[Dict] = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        # 이 루프는 기록 전용이므로 큐 대기로 블록해도 무방
+                        item = self._queue.get(True, remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                if stopping:
+                    # 종료 요청 이후 남은 것까지 모두 비움
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is not _STOP:
+                            batch.append(item)
+
+                for i in range(0, len(batch), self.max_batch):
+                    await self._flush(session_factory, batch[i:i + self.max_batch])
+        finally:
+            await engine.dispose()
+
+    async def _flush(self, session_factory, batch: List[Dict]) -> None:
+        if not batch:
+            return
+        user_ids = sorted({r["user_id"] for r in batch if r["user_id"]})
+        try:
+            async with session_factory() as session:
+                if user_ids:
+                    await session.execute(
+                        text("""
+                            INSERT INTO users (user_id)
+                            SELECT unnest(CAST(:uids AS TEXT[]))
+                            ON CONFLICT (user_id) DO NOTHING;
+                        """),
+                        {"uids": user_ids}
+                    )
+                await session.execute(
+                    text("""
+                        INSERT INTO logs (user_id, situation, thought, distortion_id, latency)
+                        SELECT *
+                        FROM unnest(
+                            CAST(:uids AS TEXT[]),
+                            CAST(:situations AS TEXT[]),
+                            CAST(:thoughts AS TEXT[]),
+                            CAST(:dids AS INTEGER[]),
+                            CAST(:latencies AS JSONB[])
+                        );
+                    """),
+                    {
+                        "uids"      : [r["user_id"] for r in batch],
+                        "situations": [r["situation"] for r in batch],
+                        "thoughts"  : [r["thought"] for r in batch],
+                        "dids"      : [r["distortion_id"] for r in batch],
+                        "latencies" : [r["latency"] for r in batch],
+                    }
+                )
+                await session.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print("🚨 interaction log 기록 실패:", e)
+
+
+# ──────────────────────────────────────────────
+# 프로세스당 공유 인스턴스
+# ──────────────────────────────────────────────
+_loggers: Dict[str, InteractionLogger] = {}
+_loggers_lock = threading.Lock()
+
+
+def get_interaction_logger(db_url: str, **kwargs) -> InteractionLogger:
+    with _loggers_lock:
+        if db_url not in _loggers:
+            _loggers[db_url] = InteractionLogger(db_url, **kwargs)
+        return _loggers[db_url]
+
+
+@atexit.register
+def _stop_all() -> None:
+    for logger in list(_loggers.values()):
+        logger.stop()
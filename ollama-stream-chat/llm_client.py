@@ -0,0 +1,135 @@
+# llm_client.py
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+
+class LLMOverloadedError(Exception):
+    """동시 생성 한도 + 대기열이 가득 차 요청을 받을 수 없을 때"""
+
+
+# ──────────────────────────────────────────────
+# Ollama 클라이언트 (커넥션 풀 + 동시 생성 제한)
+# ──────────────────────────────────────────────
+class LLMClient:
+    """
+    하나의 httpx.AsyncClient를 재사용(keep-alive)하고,
+    세마포어로 동시에 진행 중인 생성 수를 max_concurrency로 제한한다.
+    대기 중인 요청이 max_queue를 넘거나 queue_timeout 안에 차례가 오지 않으면
+    LLMOverloadedError를 던진다 (API에서는 503 + Retry-After로 변환).
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        model: str = "llama3.2",
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        max_connections: int = 16,
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        queue_timeout: float = 30.0
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0  # 진행 중 + 대기 중
+
+    @property
+    def in_flight(self) -> int:
+        return min(self._pending, self.max_concurrency)
+
+    @property
+    def waiting(self) -> int:
+        return max(0, self._pending - self.max_concurrency)
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self._pending >= self.max_concurrency + self.max_queue:
+            raise LLMOverloadedError("LLM queue is full")
+        self._pending += 1
+        try:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise LLMOverloadedError("Timed out waiting for a free LLM slot")
+            try:
+                yield
+            finally:
+                self._semaphore.release()
+        finally:
+            self._pending -= 1
+
+    def _payload(self, prompt: str, stream: bool, **options) -> Dict:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        payload.update(options)
+        return payload
+
+    async def generate(self, prompt: str, **options) -> Dict:
+        """stream=False 생성. Ollama 응답 JSON 전체를 반환"""
+        async with self._slot():
+            resp = await self.client.post(
+                "/api/generate", json=self._payload(prompt, False, **options)
+            )
+            resp.raise_for_status()
+            return resp.json()
+
+    async def generate_stream(self, prompt: str, **options) -> AsyncIterator[Dict]:
+        """stream=True 생성. NDJSON 청크(dict)를 순서대로 yield"""
+        async with self._slot():
+            async with self.client.stream(
+                "POST", "/api/generate", json=self._payload(prompt, True, **options)
+            ) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+# ──────────────────────────────────────────────
+# 이벤트 루프별 공유 인스턴스
+# ──────────────────────────────────────────────
+_client: Optional[LLMClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_llm_client(**kwargs) -> LLMClient:
+    """
+    현재 이벤트 루프에 묶인 공유 LLMClient 반환.
+    (httpx 커넥션과 세마포어는 루프에 종속되므로, Streamlit처럼 루프가 바뀌면 새로 만든다)
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = LLMClient(**kwargs)
+        _client_loop = loop
+    return _client
+
+
+async def close_llm_client() -> None:
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client, _client_loop = None, None
@@ -0,0 +1,207 @@
+# metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ──────────────────────────────────────────────
+# Prometheus 텍스트 포맷 지표 (외부 의존성 없음)
+# ──────────────────────────────────────────────
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+
+def _label_str(labelnames: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key → (버킷별 개수, 합계, 전체 개수)
+        self._values: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {n}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        m = Counter(*args, **kwargs)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        m = Histogram(*args, **kwargs)
+        self._metrics.append(m)
+        return m
+
+    def register_collector(self, fn: Callable[[], Iterable[str]]) -> None:
+        """스크레이프 시점에 호출되어 gauge 등 추가 라인을 반환하는 함수 등록"""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, doc: str, samples: Dict[str, float], label: str = "") -> List[str]:
+    """{라벨값: 값} → gauge 라인 (label이 비어 있으면 단일 값)"""
+    lines = [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+    for lv, value in samples.items():
+        labels = f'{{{label}="{lv}"}}' if label else ""
+        lines.append(f"{name}{labels} {value}")
+    return lines
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in each RAG pipeline stage", ["stage"]
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "HTTP request latency", ["path", "method", "status"]
+)
+OLLAMA_SECONDS = REGISTRY.histogram(
+    "ollama_duration_seconds",
+    "Durations reported by Ollama (total, load, prompt_eval, eval)", ["phase"]
+)
+OLLAMA_TOKENS = REGISTRY.counter(
+    "ollama_tokens_total", "Tokens processed by Ollama", ["kind"]
+)
+OLLAMA_PROMPT_TOKENS = REGISTRY.histogram(
+    "ollama_prompt_tokens", "Prompt tokens per generation",
+    buckets=(128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192)
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "rag_prompt_tokens", "Prompt tokens counted by the prompt budget",
+    buckets=(128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192)
+)
+PROMPT_DROPPED = REGISTRY.counter(
+    "rag_prompt_dropped_total", "Examples / candidates left out to fit the prompt budget", ["kind"]
+)
+PROMPT_OVER_BUDGET = REGISTRY.counter(
+    "rag_prompt_over_budget_total", "Prompts still over the token budget after dropping examples / candidates"
+)
+OLLAMA_EVAL_RATE = REGISTRY.histogram(
+    "ollama_eval_tokens_per_second", "Generation speed reported by Ollama",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+)
+
+
+# ──────────────────────────────────────────────
+# 요청 단위 타이밍 (Server-Timing 헤더용)
+# ──────────────────────────────────────────────
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timings() -> Dict[str, float]:
+    """현재 요청(컨텍스트)의 단계별 누적 시간(초) 딕셔너리를 새로 만든다"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    return _request_timings.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """with span("embed"): ... → rag_stage_seconds{stage="embed"} + 요청 타이밍"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """{'embed': 0.0123} → 'embed;dur=12.30'"""
+    return ", ".join(f"{stage};dur={sec * 1000:.2f}" for stage, sec in timings.items())
+
+
+def record_ollama(data: Dict) -> None:
+    """Ollama 최종 응답(done=true)의 *_duration(ns)·*_count 필드 기록"""
+    for phase in ("total", "load", "prompt_eval", "eval"):
+        ns = data.get(f"{phase}_duration")
+        if ns:
+            OLLAMA_SECONDS.observe(ns / 1e9, phase=phase)
+
+    prompt_tokens = data.get("prompt_eval_count")
+    eval_tokens = data.get("eval_count")
+    if prompt_tokens:
+        OLLAMA_TOKENS.inc(prompt_tokens, kind="prompt")
+        OLLAMA_PROMPT_TOKENS.observe(prompt_tokens)
+    if eval_tokens:
+        OLLAMA_TOKENS.inc(eval_tokens, kind="eval")
+        if data.get("eval_duration"):
+            OLLAMA_EVAL_RATE.observe(eval_tokens / (data["eval_duration"] / 1e9))
@@ -0,0 +1,125 @@
+# pgvector_codec.py
+import io
+import struct
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import event
+
+# ──────────────────────────────────────────────
+# pgvector `vector` 바이너리 포맷
+#   int16 dim | int16 unused | float32[dim] (모두 big-endian)
+# ──────────────────────────────────────────────
+_HEADER = struct.Struct(">HH")
+
+
+def encode_vector(vec: Sequence[float]) -> bytes:
+    """NumPy 배열(또는 시퀀스) → pgvector 바이너리. 문자열 포맷팅 없음"""
+    arr = np.asarray(vec, dtype=">f4")
+    return _HEADER.pack(arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    dim, _ = _HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=">f4", count=dim, offset=_HEADER.size).astype(np.float32)
+
+
+def vector_text(vec: Sequence[float]) -> str:
+    """텍스트 표현 '[x,y,...]' (바이너리 코덱을 쓰지 않을 때)"""
+    return "[" + ",".join(f"{x:.6f}" for x in np.asarray(vec, dtype=np.float32).tolist()) + "]"
+
+
+# ──────────────────────────────────────────────
+# asyncpg (SQLAlchemy async engine) 코덱 등록
+# ──────────────────────────────────────────────
+async def _set_codec(conn) -> None:
+    try:
+        await conn.set_type_codec(
+            "vector",
+            schema="public",
+            encoder=encode_vector,
+            decoder=decode_vector,
+            format="binary"
+        )
+    except ValueError:
+        pass  # vector 확장이 아직 없는 DB (예: main.py로 최초 테이블 생성)
+
+
+def register_vector_codec(engine) -> None:
+    """
+    새 커넥션마다 `vector` 타입에 바이너리 코덱을 등록한다.
+    이후 쿼리 파라미터로 NumPy 배열을 그대로 넘기면 float32 버퍼로 전송되고,
+    SELECT한 vector 컬럼은 np.ndarray로 돌아온다.
+    """
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(_set_codec)
+
+
+# ──────────────────────────────────────────────
+# psycopg2 COPY ... (FORMAT BINARY) 일괄 적재
+# ──────────────────────────────────────────────
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+
+
+def copy_binary_payload(ids: Sequence[int], embeddings: np.ndarray) -> bytes:
+    """
+    (int4 id, vector) 행들을 COPY BINARY 스트림으로 직렬화.
+    행 단위 파이썬 루프 없이 구조화 배열 한 번으로 만든다.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+    row = np.dtype([
+        ("nfields", ">i2"),
+        ("id_len" , ">i4"), ("id" , ">i4"),
+        ("vec_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"),
+        ("vec"    , ">f4", (dim,)),
+    ])
+    rows = np.empty(n, dtype=row)
+    rows["nfields"] = 2
+    rows["id_len"] = 4
+    rows["id"] = np.asarray(ids, dtype=np.int64)
+    rows["vec_len"] = _HEADER.size + 4 * dim
+    rows["dim"] = dim
+    rows["unused"] = 0
+    rows["vec"] = embeddings
+    return _COPY_SIGNATURE + rows.tobytes() + _COPY_TRAILER
+
+
+def copy_vectors_binary(cur, table: str, ids: Sequence[int], embeddings: np.ndarray,
+                        id_column: str = "embedding_id", vec_column: str = "embedding") -> None:
+    cur.copy_expert(
+        f"COPY {table} ({id_column}, {vec_column}) FROM STDIN WITH (FORMAT BINARY)",
+        io.BytesIO(copy_binary_payload(ids, embeddings))
+    )
+
+
+# ──────────────────────────────────────────────
+# 마이크로 벤치마크: 질의 1건당 파라미터 직렬화 비용
+#   python pgvector_codec.py [--dim 384] [--n 20000]
+# ──────────────────────────────────────────────
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="vector 파라미터 text vs binary 직렬화 비교")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    vec = np.random.default_rng(0).standard_normal(args.dim).astype(np.float32)
+
+    def bench(fn):
+        t0 = time.perf_counter()
+        for _ in range(args.n):
+            out = fn()
+        return (time.perf_counter() - t0) / args.n * 1e6, len(out)
+
+    text_us, text_len = bench(lambda: "[" + ",".join(f"{x:.6f}" for x in vec.tolist()) + "]")
+    bin_us, bin_len = bench(lambda: encode_vector(vec))
+    print(f"dim={args.dim}, n={args.n}")
+    print(f"text  : {text_us:8.2f} µs/query, {text_len:6d} bytes (서버에서 다시 파싱)")
+    print(f"binary: {bin_us:8.2f} µs/query, {bin_len:6d} bytes")
+    print(f"→ 질의당 {text_us - bin_us:.2f} µs 절약 (x{text_us / max(bin_us, 1e-9):.1f}), "
+          f"전송량 {text_len / bin_len:.1f}배 감소")
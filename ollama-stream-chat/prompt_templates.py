@@ -0,0 +1,401 @@
+# prompt_templates.py
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from token_budget import PromptBudget, TokenCounter, example_order
+
+
+# ──────────────────────────────────────────────
+# 버전별 프롬프트 템플릿
+#   요청마다 바뀌는 것: 상황/생각, 후보 순서(번호), 후보 수
+#   distortion_id에만 의존하는 것: 후보 줄, 팁 + few-shot 리프레임 블록 → 미리 렌더링
+#
+# 배치(layout)
+#   user_first  : 상황/생각 → 후보 → 리프레임 블록 → 출력 형식 (기존 순서)
+#   static_first: 고정 안내문 + 후보 distortion의 참고 블록(distortion_id 순) → 상황/생각 → 후보 순서
+#   static_all  : static_first와 같지만 참고 블록에 모든 distortion 포함
+#                 → 프롬프트 앞부분이 모든 요청에서 동일해 Ollama가 KV 캐시를 재사용
+# ──────────────────────────────────────────────
+LAYOUTS = ("user_first", "static_first", "static_all")
+
+
+class PromptTemplate:
+    def __init__(
+        self,
+        version: str,
+        part1: str,
+        candidate: str,
+        part2: str,
+        tips: str,
+        example: Sequence[str],
+        part3: str,
+        answer_slot: Sequence[str],
+        preamble: str = (
+            "You help users reframe cognitive distortions. Reference material on the "
+            "cognitive distortions comes first; the user's situation and thought follow it.\n"
+        ),
+        reference: str = "[Distortion: {trap_name}]\nDefinition: {definition}",
+        candidate_ref: str = "{trap_name}",
+        part2_ref: str = (
+            "2. Your task is to suggest alternative rational thoughts to address each of the "
+            "identified cognitive distortions. Use the tips and reframing examples in the "
+            "reference material above.\n"
+        )
+    ):
+        self.version = version
+        self.part1 = part1                      # "1. ..." 머리말
+        self.candidate = candidate              # "Candidate {idx}: " 뒤에 붙는 부분
+        self.part2 = part2                      # "2. ..." 머리말
+        self.tips = tips                        # 리프레임 블록 첫 줄
+        self.example = tuple(example)           # reframe 예시 1개당 줄들 ({ridx}, {situation} …)
+        self.part3 = part3                      # "3. ..." 출력 형식 지시
+        self.answer_slot = tuple(answer_slot)   # 후보 1개당 출력 형식 줄들 ({idx})
+        # static_* 배치 전용
+        self.preamble = preamble                # 프롬프트 맨 앞 고정 안내문
+        self.reference = reference              # 참고 블록 머리 (뒤에 팁 + 리프레임 블록)
+        self.candidate_ref = candidate_ref      # 정의는 참고 블록에 있으므로 이름만
+        self.part2_ref = part2_ref
+
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    # 현재 포맷 ("버전 1")
+    "v1": PromptTemplate(
+        version="v1",
+        part1="1. Several possible cognitive distortions that may underlie the user's thoughts:\n",
+        candidate="{trap_name} (Definition: {definition})",
+        part2="2. Your task is to suggest alternative rational thoughts to address each of the identified cognitive distortions. Use the following tips and reframing examples:",
+        tips="Tips to overcome {trap_name}: {tips}",
+        example=(
+            "Example Situation {ridx}: {situation}",
+            "Example Original Thought   {ridx}: {thought}",
+            "Example Reframed Thought   {ridx}: {reframe}",
+        ),
+        part3=(
+            "3. Now generate new reframed thoughts for the user's input (based on their Situation & Thought). Do not include the Example Situation and Example Thought in the output."
+            "Output in the following format:\n"
+            "[Notice] Reference only. For accurate evaluation of potential cognitive distortions, please consult a mental health professional.\n"
+        ),
+        answer_slot=(
+            "Candidate Distortion {idx}:",
+            "Definition of the Distortion:",
+            "Tips to Overcome the Distortion:",
+            "Example Reframed Thoughts for the Distortion:\n",
+        ),
+    ),
+    # archive/rag_engine.py 포맷
+    "archive": PromptTemplate(
+        version="archive",
+        part1="1. Several possible cognitive distortions that may underlie the user's thoughts:\n",
+        candidate="{trap_name} (Definition: {definition})",
+        part2="2. Your task is to suggest alternative rational thoughts to address each of the identified cognitive distortions. Use the following tips and reframing examples:",
+        tips="Tips to overcome {trap_name}: {tips}",
+        example=(
+            "Example Situation {ridx}: {situation}",
+            "Example Thought   {ridx}: {thought}",
+            "Example Reframe   {ridx}: {reframe}",
+        ),
+        part3=(
+            "3. Now generate new reframed thoughts for the user's input (based on their Situation & Thought). "
+            "Output in the following format:\n"
+        ),
+        answer_slot=(
+            "Candidate Distortion {idx}:",
+            "Tips to overcome the distortion:",
+            "Reframed Thoughts for Distortion {idx}:\n",
+        ),
+    ),
+}
+
+
+def get_template(version: str) -> PromptTemplate:
+    try:
+        return TEMPLATES[version]
+    except KeyError:
+        raise ValueError(f"unknown prompt template: {version} (expected one of {sorted(TEMPLATES)})")
+
+
+# ──────────────────────────────────────────────
+# 템플릿 + distortion별 조각 캐시
+# ──────────────────────────────────────────────
+class _Fragment:
+    """distortion 1개의 미리 렌더링된 조각 (+ 예산 계산용 토큰 수)"""
+
+    __slots__ = ("candidate", "reference", "tips", "examples",
+                 "candidate_tokens", "reference_tokens", "tips_tokens", "example_tokens")
+
+    def __init__(self, candidate: str, reference: str, tips: str, examples: List[str], counter=None):
+        self.candidate = candidate      # "Candidate {idx}: " 뒷부분
+        self.reference = reference      # static_* 참고 블록 머리
+        self.tips = tips                # 리프레임 블록 첫 줄
+        self.examples = examples        # 예시 1개 = 여러 줄을 이은 문자열 (번호 포함)
+        # 예산 계산용 토큰 수 (줄바꿈 1토큰으로 계산)
+        count = counter.count if counter is not None else (lambda text: 0)
+        self.candidate_tokens = count(candidate) + 1
+        self.reference_tokens = count(reference) + 1
+        self.tips_tokens = count(tips) + 2
+        self.example_tokens = [count(ex) + 1 for ex in examples]
+
+    def required_tokens(self, layout: str) -> int:
+        """예시를 뺀 필수 부분: user_first는 후보 줄 + 팁, static_*는 참고 머리 + 팁"""
+        head = self.candidate_tokens if layout == "user_first" else self.reference_tokens
+        return head + self.tips_tokens
+
+    def block(self, n: Optional[int] = None) -> str:
+        """팁 + 앞에서부터 n개 예시 (None: 전부)"""
+        return "\n".join([self.tips, *self.examples[:n], ""])
+
+    def reference_block(self, n: Optional[int] = None) -> str:
+        return f"{self.reference}\n{self.block(n)}"
+
+
+class PromptBuilder:
+    """
+    ReferenceDataStore에서 distortion별 조각(후보 줄, 팁 + 리프레임 블록)을 한 번 렌더링해 두고
+    요청마다 상황/생각과 후보 순서만 끼워 넣어 프롬프트를 만든다.
+    저장소가 교체되면(reload) 다음 render() 때 조각을 다시 만든다.
+    budget(token_budget.PromptBudget)이 주어지면 필드 상한을 조각 생성 시 적용하고,
+    요청마다 전체 예산 안에서 예시/후보를 우선순위대로 고른다.
+    """
+
+    def __init__(self, template: PromptTemplate, reframe_limit: int = 2, layout: str = "user_first",
+                 budget: Optional[PromptBudget] = None):
+        if layout not in LAYOUTS:
+            raise ValueError(f"unknown prompt layout: {layout} (expected one of {LAYOUTS})")
+        self.template = template
+        self.reframe_limit = reframe_limit
+        self.layout = layout
+        self.budget = budget if budget is not None and budget.enabled else None
+        self._counter = self.budget.counter if self.budget else None
+        self._fragments: Dict[int, _Fragment] = {}
+        # static_all: 모든 distortion 참고 블록을 이어 붙인 고정 앞부분
+        self._static_prefix = ""
+        self._static_prefix_tokens = 0
+        self._answer_slots: Dict[int, str] = {}
+        self._fixed_tokens: Dict[int, int] = {}
+        self._store_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # ─── 조각 렌더링 ───
+    def _fragment(self, item: Dict, reframes: List[Dict]) -> _Fragment:
+        t = self.template
+        trim = self.budget.trim_field if self.budget else (lambda text: text)
+        fields = {k: trim(item[k]) for k in ("trap_name", "definition", "tips")}
+        examples = [
+            "\n".join(
+                line.format(ridx=ridx, situation=trim(ex["situation"]), thought=trim(ex["thought"]),
+                            reframe=trim(ex["reframe"]))
+                for line in t.example
+            )
+            for ridx, ex in enumerate(reframes, 1)
+        ]
+        return _Fragment(
+            candidate=t.candidate.format(**fields),
+            reference=t.reference.format(**fields),
+            tips=t.tips.format(**fields),
+            examples=examples,
+            counter=self._counter
+        )
+
+    def _answer_slot_block(self, n: int) -> str:
+        block = self._answer_slots.get(n)
+        if block is None:
+            block = "\n".join(
+                line.format(idx=idx) for idx in range(1, n + 1) for line in self.template.answer_slot
+            )
+            self._answer_slots[n] = block
+        return block
+
+    def _fixed(self, n: int) -> int:
+        """후보 n개일 때 조각·사용자 입력을 뺀 고정 텍스트 토큰 수"""
+        tokens = self._fixed_tokens.get(n)
+        if tokens is None:
+            t, count = self.template, self._counter.count
+            part2 = t.part2 if self.layout == "user_first" else t.part2_ref
+            tokens = (count("[User Situation] [User Thought]") + count(t.part1) + count(part2)
+                      + count(t.part3) + count(self._answer_slot_block(n))
+                      + (0 if self.layout == "user_first" else count(t.preamble))
+                      + n * count("Candidate 1: [Reframe 1]") + 10)
+            self._fixed_tokens[n] = tokens
+        return tokens
+
+    def rebuild(self, store) -> None:
+        """ReferenceDataStore의 distortions/reframes로 조각 캐시 재생성"""
+        distortions, reframes = store.distortions, store.reframes
+        fragments = {
+            did: self._fragment(d, reframes.get(did, [])[:self.reframe_limit])
+            for did, d in distortions.items()
+        }
+        static_prefix = "\n".join(
+            [self.template.preamble] + [fragments[did].reference_block() for did in sorted(fragments)]
+        )
+        with self._lock:
+            self._fragments = fragments
+            self._static_prefix = static_prefix
+            self._static_prefix_tokens = self._counter.count(static_prefix) if self._counter else 0
+            self._store_version = store.version
+
+    def context_tokens(self, counter: TokenCounter, n_candidates: int) -> int:
+        """
+        후보 n_candidates개·예시 전부 기준 프롬프트 최대 토큰 수 (사용자 입력 제외).
+        Ollama num_ctx가 이보다 작으면 앞부분(static_*의 공유 앞부분)이 잘려 나간다
+        """
+        with self._lock:
+            fragments = list(self._fragments.values())
+            static_prefix = self._static_prefix
+        t, count = self.template, counter.count
+        if self.layout == "user_first":
+            head, part2 = 0, t.part2
+            blocks = [count(f.candidate) + count(f.block()) for f in fragments]
+        else:
+            head, part2 = count(t.preamble), t.part2_ref
+            blocks = [count(f.reference_block()) for f in fragments]
+        if self.layout == "static_all" and fragments:
+            body = count(static_prefix)
+        else:
+            body = head + sum(sorted(blocks, reverse=True)[:n_candidates])
+        # 후보 줄("Candidate n: 이름")은 후보당 16토큰으로 여유 있게
+        return (body + count(t.part1) + count(part2) + count(t.part3)
+                + count(self._answer_slot_block(n_candidates)) + n_candidates * 16)
+
+    # ─── 예산 배분 ───
+    def _allocate(self, units: List[_Fragment], ranks: List[int], user_tokens: int,
+                  n_candidates: int) -> Tuple[int, List[int]]:
+        """
+        units: 렌더링할 블록, ranks: 각 블록이 처음 등장하는 후보 순위(0부터).
+        Return: (남길 후보 수, unit별 예시 수).
+        필수 부분이 예산을 넘으면 하위 후보부터 제외, 남은 예산으로 예시를 우선순위대로 추가
+        (한 후보의 예시가 들어가지 못하면 그 후보의 이후 예시도 제외 → 번호 연속 유지)
+        """
+        total = self.budget.total
+        if total <= 0:
+            return n_candidates, [len(u.examples) for u in units]
+
+        def required(n: int) -> int:
+            return (user_tokens + self._fixed(n)
+                    + sum(u.required_tokens(self.layout) for u, r in zip(units, ranks) if r < n))
+
+        used = required(n_candidates)
+        while n_candidates > 1 and used > total:
+            n_candidates -= 1
+            used = required(n_candidates)
+
+        counts = [0] * len(units)
+        closed = {i for i, r in enumerate(ranks) if r >= n_candidates}
+        for u, e in example_order([len(x.examples) for x in units]):
+            if u in closed:
+                continue
+            cost = units[u].example_tokens[e]
+            if used + cost > total:
+                closed.add(u)
+                continue
+            used += cost
+            counts[u] = e + 1
+        return n_candidates, counts
+
+    # ─── 요청 단위 조립 ───
+    def render(self, user_situation: str, user_thought: str, items: Sequence[Dict], store=None) -> str:
+        return self.build(user_situation, user_thought, items, store)[0]
+
+    def build(
+        self,
+        user_situation: str,
+        user_thought: str,
+        items: Sequence[Dict],
+        store=None
+    ) -> Tuple[str, Dict]:
+        """
+        items: fetch_top_k_similar_thoughts() 결과 (+ 'reframes').
+        store가 적재되어 있으면 캐시된 조각을, 없으면 items로 그 자리에서 렌더링
+        Return: (프롬프트, 예산 사용 내역 — 예산 미사용 시 {})
+        """
+        if store is not None and store.loaded and store.version != self._store_version:
+            self.rebuild(store)
+        fragments = self._fragments if store is not None else {}
+
+        t = self.template
+        frags = []
+        for it in items:
+            cached = fragments.get(it["distortion_id"])
+            if cached is None:
+                cached = self._fragment(it, it.get("reframes", []))
+            frags.append(cached)
+
+        if self.budget:
+            user_situation = self.budget.trim_user(user_situation)
+            user_thought = self.budget.trim_user(user_thought)
+        user_part = [
+            "[User Situation]\n" + (user_situation or "(none provided)") + "\n",
+            "[User Thought]\n" + user_thought + "\n",
+            t.part1,
+        ]
+
+        # 블록 단위: user_first는 후보마다, static_first는 distortion마다(순위 순, 중복 제거)
+        static_all = self.layout == "static_all" and bool(fragments)
+        if self.layout == "user_first":
+            units, unit_ids, ranks = frags, list(range(len(frags))), list(range(len(frags)))
+        else:
+            unique: Dict = {}
+            for rank, (it, f) in enumerate(zip(items, frags)):
+                if not (static_all and it["distortion_id"] in fragments):
+                    unique.setdefault(it["distortion_id"], (f, rank))
+            unit_ids = list(unique)
+            units = [f for f, _ in unique.values()]
+            ranks = [r for _, r in unique.values()]
+
+        n_candidates, counts = len(items), [None] * len(units)
+        if self.budget:
+            user_tokens = self._counter.count(user_part[0]) + self._counter.count(user_part[1])
+            # static_all의 고정 앞부분은 KV 캐시로 재사용되므로 요청별 부분만 예산으로 관리
+            n_candidates, counts = self._allocate(units, ranks, user_tokens, len(items))
+        kept_items, kept_frags = list(items)[:n_candidates], frags[:n_candidates]
+
+        if self.layout == "user_first":
+            prompt = "\n".join([
+                *user_part,
+                *(f"Candidate {idx}: {f.candidate}" for idx, f in enumerate(kept_frags, 1)),
+                "",
+                t.part2,
+                *(f"\n[Reframe {idx}]\n{f.block(n)}"
+                  for idx, (f, n) in enumerate(zip(kept_frags, counts), 1)),
+                t.part3,
+                self._answer_slot_block(n_candidates),
+            ])
+        else:
+            # static_*: 요청과 무관한(또는 distortion 조합에만 의존하는) 부분을 앞에
+            kept_ids = {it["distortion_id"] for it in kept_items}
+            blocks = sorted(
+                ((did, u.reference_block(n)) for did, u, n in zip(unit_ids, units, counts) if did in kept_ids),
+                key=lambda x: (x[0] is None, x[0])
+            )
+            # static_all: 저장소에 없는 distortion(메타데이터만 있는 경우)만 뒤에 덧붙임
+            prefix = [self._static_prefix] if static_all else [t.preamble]
+            prompt = "\n".join([
+                *prefix,
+                *(b for _, b in blocks),
+                *user_part,
+                *(f"Candidate {idx}: " + t.candidate_ref.format(trap_name=it["trap_name"])
+                  for idx, it in enumerate(kept_items, 1)),
+                "",
+                t.part2_ref,
+                t.part3,
+                self._answer_slot_block(n_candidates),
+            ])
+
+        if not self.budget:
+            return prompt, {}
+        available = [len(u.examples) for u in units]
+        kept = [len(u.examples) if n is None else (n if r < n_candidates else 0)
+                for u, n, r in zip(units, counts, ranks)]
+        tokens = self._counter.count(prompt)
+        shared = self._static_prefix_tokens if static_all else 0
+        return prompt, {
+            "budget"            : self.budget.total,
+            "tokens"            : tokens,
+            "shared_prefix_tokens": shared,
+            # 후보 1개의 필수 부분만으로도 예산을 넘으면 그대로 두고 초과 사실만 보고
+            "over_budget"       : self.budget.total > 0 and tokens - shared > self.budget.total,
+            "candidates"        : n_candidates,
+            "candidates_dropped": len(items) - n_candidates,
+            "examples"          : sum(kept),
+            "examples_dropped"  : sum(available) - sum(kept),
+        }
@@ -1,18 +1,209 @@
 # rag_engine.py
-from typing import Optional, List, Dict, Tuple
-from sentence_transformers import SentenceTransformer
+from typing import Optional, List, Dict, Tuple, AsyncIterator, Sequence, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-import httpx
+import asyncio
+import hashlib
+import json
+import time
+import numpy as np
+
+import config
+from ann_index import knn_subquery, search_settings_sql
+from pgvector_codec import vector_text
+from cache import TTLCache, make_cache_backend, normalize_thought
+import embedding_model
+from embedding_service import EmbeddingBatcher
+from llm_client import LLMClient, get_llm_client
+from metrics import PROMPT_DROPPED, PROMPT_OVER_BUDGET, PROMPT_TOKENS, span, record_ollama, record_stage
+from semantic_cache import SemanticResponseCache, context_fingerprint, prompt_hash
+from prompt_templates import PromptBuilder, get_template
+from token_budget import PromptBudget, TokenCounter
+from reference_data import ReferenceDataStore, fetch_reframe_examples_batch
+from vector_index import InMemoryVectorIndex, CentroidVectorIndex, QuantizedVectorIndex
+
+MODEL_NAME = config.EMBED_MODEL_NAME
+
+# 동시 요청을 묶어 한 번의 배치 encode로 처리 (이벤트 루프 밖 워커 스레드에서 실행)
+# 모델은 첫 encode(또는 warm_up) 때 로드되고, EMBED_SERVER_SOCKET이면 공유 워커 사용
+embedder = EmbeddingBatcher(
+    embedding_model.encode,
+    max_batch_size=config.EMBED_MAX_BATCH_SIZE,
+    max_wait_ms=config.EMBED_MAX_WAIT_MS
+)
+
+
+async def warm_up_embeddings() -> float:
+    """모델 로드 + 첫 forward pass를 임베딩 워커 스레드에서 수행 (캐시에는 넣지 않음)"""
+    t0 = time.perf_counter()
+    await embedder.encode_many(["warm-up"])
+    return time.perf_counter() - t0
+
+# RETRIEVAL_BACKEND == "memory" | "centroid"일 때 사용하는 인메모리 인덱스 (프로세스당 1회 적재)
+_vector_index: Optional[InMemoryVectorIndex] = None
+IN_MEMORY_BACKENDS = ("memory", "centroid")
+
+
+def _index_class_and_options():
+    if config.RETRIEVAL_BACKEND == "centroid":
+        # centroid partition은 float32 행렬만 지원 (조용히 float32로 검색하지 않도록)
+        if config.EMBEDDING_ENCODING != "float32":
+            raise ValueError(
+                f"EMBEDDING_ENCODING={config.EMBEDDING_ENCODING} is not supported by the centroid backend "
+                "(use RETRIEVAL_BACKEND=memory for quantized in-memory search)"
+            )
+        return CentroidVectorIndex, {
+            "sub_centroids": config.CENTROID_SUB_CENTROIDS,
+            "n_probe"      : config.CENTROID_N_PROBE
+        }
+    if config.EMBEDDING_ENCODING != "float32":
+        return QuantizedVectorIndex, {
+            "encoding": config.EMBEDDING_ENCODING,
+            "rerank"  : config.RERANK_FACTOR
+        }
+    return InMemoryVectorIndex, {}
+
+
+async def load_vector_index(session: Optional[AsyncSession] = None) -> InMemoryVectorIndex:
+    """
+    스냅샷 파일(VECTOR_INDEX_SNAPSHOT)이 있으면 파일에서, 없으면 DB에서 인덱스를 적재.
+    서버 시작 시 호출하거나, 데이터 변경 후 재적재할 때 호출한다.
+    """
+    global _vector_index
+    index_cls, options = _index_class_and_options()
+    if config.VECTOR_INDEX_SNAPSHOT:
+        _vector_index = index_cls.load_snapshot(config.VECTOR_INDEX_SNAPSHOT, **options)
+    else:
+        if session is None:
+            raise ValueError("session is required to load the vector index from the DB")
+        _vector_index = await index_cls.load_from_db(session, **options)
+    return _vector_index
+
+
+# distortions / reframing_dataset 인메모리 사본 (REFERENCE_DATA_PRELOAD)
+reference_data = ReferenceDataStore()
+
+# 버전별 프롬프트 템플릿 + distortion별 조각 캐시 (참조 데이터 적재 시 재생성)
+prompt_builder = PromptBuilder(
+    get_template(config.PROMPT_TEMPLATE), reframe_limit=2, layout=config.PROMPT_LAYOUT,
+    budget=PromptBudget(
+        total=config.PROMPT_TOKEN_BUDGET,
+        user_tokens=config.PROMPT_USER_MAX_TOKENS,
+        field_tokens=config.PROMPT_FIELD_MAX_TOKENS,
+        counter=TokenCounter(config.PROMPT_TOKENIZER)
+    )
+)
+
+
+# 질의당 최대 후보 수 (API top_k 상한)
+MAX_TOP_K = 10
+
+
+async def load_reference_data(session: AsyncSession) -> ReferenceDataStore:
+    """시작 시 또는 데이터 변경 후 명시적으로 호출 (reload 겸용)"""
+    await reference_data.reload(session)
+    prompt_builder.rebuild(reference_data)
+    ensure_num_ctx()
+    return reference_data
+
+
+def ensure_num_ctx() -> Optional[int]:
+    """
+    static_* 레이아웃: 가장 긴 프롬프트(후보 MAX_TOP_K개) + OLLAMA_NUM_CTX_HEADROOM이 들어가도록
+    OLLAMA_NUM_CTX가 0이면 num_ctx를 자동 설정(1024 단위 올림, 줄이지 않음), 지정값이 작으면 ValueError.
+    Return: 적용된 num_ctx (user_first면 None)
+    """
+    if config.PROMPT_LAYOUT == "user_first":
+        return None
+    counter = prompt_builder.budget.counter if prompt_builder.budget else TokenCounter(config.PROMPT_TOKENIZER)
+    needed = prompt_builder.context_tokens(counter, MAX_TOP_K) + config.OLLAMA_NUM_CTX_HEADROOM
+    if config.OLLAMA_NUM_CTX > 0:
+        if config.OLLAMA_NUM_CTX < needed:
+            raise ValueError(
+                f"OLLAMA_NUM_CTX={config.OLLAMA_NUM_CTX} is too small for PROMPT_LAYOUT={config.PROMPT_LAYOUT} "
+                f"(needs ~{needed} tokens incl. headroom); raise it or set it to 0 to size it automatically"
+            )
+        return config.OLLAMA_NUM_CTX
+    options = GENERATE_OPTIONS.setdefault("options", {})
+    options["num_ctx"] = max(options.get("num_ctx", 0), -(-needed // 1024) * 1024)
+    return options["num_ctx"]
+
+
+# 정규화된 thought → 임베딩,  (임베딩, top_k) → 검색 결과
+def _make_cache(namespace: str) -> TTLCache:
+    backend = make_cache_backend(
+        config.CACHE_BACKEND, namespace,
+        redis_url=config.CACHE_REDIS_URL, disk_path=config.CACHE_DISK_PATH
+    )
+    return TTLCache(config.CACHE_MAXSIZE, config.CACHE_TTL_SECONDS, backend)
+
+embedding_cache = _make_cache("rag_embedding")
+retrieval_cache = _make_cache("rag_retrieval")
+
+# (질의 임베딩, top-k distortion 조합) → LLM 응답
+semantic_cache = SemanticResponseCache(
+    threshold=config.SEMANTIC_CACHE_THRESHOLD,
+    maxsize=config.SEMANTIC_CACHE_MAXSIZE,
+    ttl=config.SEMANTIC_CACHE_TTL_SECONDS
+)
+
+
+def cache_stats() -> Dict[str, Dict]:
+    return {
+        "embedding": embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "semantic" : semantic_cache.stats()
+    }
+
+
+async def embed_text(sentence: str) -> np.ndarray:
+    """문장 임베딩 (EmbeddingBatcher 경유, 이벤트 루프를 막지 않음). float32 배열 반환"""
+    key = normalize_thought(sentence)
+    if config.CACHE_ENABLED:
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return np.asarray(cached, dtype=np.float32)
+
+    vec = np.asarray(await embedder.encode(sentence), dtype=np.float32)
+    if config.CACHE_ENABLED:
+        embedding_cache.set(key, vec)
+    return vec
+
+
+async def embed_many(sentences: Sequence[str]) -> np.ndarray:
+    """
+    문장 목록 임베딩 (배치 분석용). 캐시에 없는 문장만 모아 encode 1회로 계산.
+    Return: (N, dim) float32
+    """
+    keys = [normalize_thought(s) for s in sentences]
+    vecs: Dict[str, np.ndarray] = {}
+    if config.CACHE_ENABLED:
+        for key in set(keys):
+            cached = embedding_cache.get(key)
+            if cached is not None:
+                vecs[key] = np.asarray(cached, dtype=np.float32)
+
+    missing = list(dict.fromkeys(k for k in keys if k not in vecs))
+    if missing:
+        # 정규화 키가 같은 문장은 처음 나온 원문으로 한 번만 계산
+        first = {}
+        for key, sentence in zip(keys, sentences):
+            first.setdefault(key, sentence)
+        encoded = np.asarray(await embedder.encode_many([first[k] for k in missing]), dtype=np.float32)
+        for key, vec in zip(missing, encoded):
+            vecs[key] = vec
+            if config.CACHE_ENABLED:
+                embedding_cache.set(key, vec)
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vecs[k] for k in keys])
 
-MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-model = SentenceTransformer(MODEL_NAME)
 
 # ──────────────────────────────────────────────
 # 1. 예시 Thought + Distortion 메타데이터 검색
 # ──────────────────────────────────────────────
 async def fetch_top_k_similar_thoughts(
-    user_embedding: List[float],
+    user_embedding: Sequence[float],
     session: AsyncSession,
     top_k: int = 3
 ) -> List[Dict]:
@@ -27,41 +218,161 @@ async def fetch_top_k_similar_thoughts(
         }, …
     ]
     """
-    sql = text("""
+    if not config.CACHE_ENABLED:
+        return await _fetch_top_k_uncached(user_embedding, session, top_k)
+
+    digest = hashlib.sha1(np.asarray(user_embedding, dtype=np.float32).tobytes()).hexdigest()
+    key = (f"{config.RETRIEVAL_BACKEND}:{config.EMBEDDING_ENCODING}:{config.RERANK_FACTOR}:"
+           f"{top_k}:{int(config.RETRIEVAL_DIVERSIFY)}:{digest}")
+    items = retrieval_cache.get(key)
+    if items is None:
+        items = await _fetch_top_k_uncached(user_embedding, session, top_k)
+        retrieval_cache.set(key, items)
+    # 호출자가 항목을 수정(reframes 추가 등)하므로 사본 반환
+    return [dict(it) for it in items]
+
+
+async def fetch_top_k_many(
+    embeddings: np.ndarray,
+    session: AsyncSession,
+    top_k: int = 3
+) -> List[List[Dict]]:
+    """
+    질의 임베딩 여러 개의 top-k 검색 (배치 분석용, 결과 캐시는 거치지 않음)
+    memory/centroid: InMemoryVectorIndex.search_many (행렬 곱 1회)
+    pgvector       : unnest + LATERAL k-NN 쿼리 1회 (diversify는 질의별 쿼리)
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if config.RETRIEVAL_BACKEND in IN_MEMORY_BACKENDS:
+        index = _vector_index or await load_vector_index(session)
+        return index.search_many(embeddings, top_k, diversify=config.RETRIEVAL_DIVERSIFY)
+    if config.RETRIEVAL_DIVERSIFY:
+        return [await _fetch_top_k_uncached(emb, session, top_k) for emb in embeddings]
+    if len(embeddings) == 0:
+        return []
+
+    settings_sql = search_settings_sql(config.PGVECTOR_EF_SEARCH, config.PGVECTOR_IVF_PROBES)
+    if settings_sql:
+        await session.execute(text(settings_sql))
+
+    rerank = _rerank_placeholder()
+    knn = knn_subquery(config.EMBEDDING_ENCODING, "CAST(q.vec AS vector)", ":k", rerank)
+    sql = text(f"""
         SELECT
+            q.i                      AS query_index,
             r.thought                AS example_thought,
             r.distortion_id          AS distortion_id,
             d.trap_name,
             d.definition,
             d.tips,
-            e.embedding <-> CAST(:vec AS vector) AS distance
-        FROM example_embeddings AS e
+            e.distance
+        FROM unnest(CAST(:vecs AS text[])) WITH ORDINALITY AS q(vec, i)
+        CROSS JOIN LATERAL ({knn}) AS e
         INNER JOIN example_dataset AS r
           ON e.embedding_id = r.embedding_id
         LEFT JOIN distortions AS d
           ON r.distortion_id = d.distortion_id
-        ORDER BY distance
-        LIMIT :k;
+        ORDER BY q.i, e.distance;
     """)
+    # 배열 파라미터는 '[x,y,...]' 문자열 배열로 전달 (바이너리 코덱은 단일 vector 전용)
+    params = {"vecs": [vector_text(emb) for emb in embeddings], "k": top_k}
+    if rerank:
+        params["cand"] = top_k * config.RERANK_FACTOR
+    result = await session.execute(sql, params)
 
-    result = await session.execute(
-        sql,
-        {
-            "vec": "[" + ",".join(f"{x:.6f}" for x in user_embedding) + "]",
-            "k":   top_k
-        }
-    )
-    rows = result.mappings().all()
-    return [
-        {
-            "example_thought": row["example_thought"],
-            "distortion_id"  : row["distortion_id"],
-            "trap_name"      : row["trap_name"] or "UnknownDistortion",
-            "definition"     : row["definition"] or "Definition not available.",
-            "tips"           : row["tips"] or "No tips available."
-        }
-        for row in rows
-    ]
+    out: List[List[Dict]] = [[] for _ in range(len(embeddings))]
+    for row in result.mappings().all():
+        out[row["query_index"] - 1].append(_retrieved_item(row))
+    return out
+
+
+def _rerank_placeholder() -> Optional[str]:
+    # EMBEDDING_ENCODING이 float16/binary면 해당 식 인덱스로 후보를 고르고
+    # RERANK_FACTOR > 0이면 원본 vector L2로 다시 정렬 (ann_index.knn_subquery)
+    if config.EMBEDDING_ENCODING == "int8":
+        raise ValueError("EMBEDDING_ENCODING=int8 is only supported by the in-memory backend")
+    quantized = config.EMBEDDING_ENCODING != "float32"
+    return ":cand" if quantized and config.RERANK_FACTOR > 0 else None
+
+
+def _retrieved_item(row) -> Dict:
+    return {
+        "example_thought": row["example_thought"],
+        "distortion_id"  : row["distortion_id"],
+        "trap_name"      : row["trap_name"] or "UnknownDistortion",
+        "definition"     : row["definition"] or "Definition not available.",
+        "tips"           : row["tips"] or "No tips available."
+    }
+
+
+async def _fetch_top_k_uncached(
+    user_embedding: Sequence[float],
+    session: AsyncSession,
+    top_k: int = 3
+) -> List[Dict]:
+    if config.RETRIEVAL_BACKEND in IN_MEMORY_BACKENDS:
+        index = _vector_index or await load_vector_index(session)
+        return index.search(user_embedding, top_k, diversify=config.RETRIEVAL_DIVERSIFY)
+
+    # HNSW ef_search / IVFFlat probes (현재 트랜잭션에만 적용)
+    settings_sql = search_settings_sql(config.PGVECTOR_EF_SEARCH, config.PGVECTOR_IVF_PROBES)
+    if settings_sql:
+        await session.execute(text(settings_sql))
+
+    # k-NN은 example_embeddings 단독 서브쿼리에서 수행 → ANN 인덱스 스캔 가능
+    rerank = _rerank_placeholder()
+    # diversify: 후보 pool개를 가져온 뒤 distortion별 가장 가까운 1개만 남김
+    if config.RETRIEVAL_DIVERSIFY:
+        knn = knn_subquery(config.EMBEDDING_ENCODING, "CAST(:vec AS vector)", ":pool", rerank)
+        sql = text(f"""
+            SELECT * FROM (
+                SELECT DISTINCT ON (r.distortion_id)
+                    r.thought                AS example_thought,
+                    r.distortion_id          AS distortion_id,
+                    d.trap_name,
+                    d.definition,
+                    d.tips,
+                    e.distance
+                FROM ({knn}) AS e
+                INNER JOIN example_dataset AS r
+                  ON e.embedding_id = r.embedding_id
+                LEFT JOIN distortions AS d
+                  ON r.distortion_id = d.distortion_id
+                ORDER BY r.distortion_id, e.distance
+            ) AS t
+            ORDER BY distance
+            LIMIT :k;
+        """)
+    else:
+        knn = knn_subquery(config.EMBEDDING_ENCODING, "CAST(:vec AS vector)", ":k", rerank)
+        sql = text(f"""
+            SELECT
+                r.thought                AS example_thought,
+                r.distortion_id          AS distortion_id,
+                d.trap_name,
+                d.definition,
+                d.tips,
+                e.distance
+            FROM ({knn}) AS e
+            INNER JOIN example_dataset AS r
+              ON e.embedding_id = r.embedding_id
+            LEFT JOIN distortions AS d
+              ON r.distortion_id = d.distortion_id
+            ORDER BY e.distance;
+        """)
+
+    params = {
+        # 바이너리 코덱 등록 시 NumPy 배열 그대로 전달 (pgvector_codec)
+        "vec": (np.asarray(user_embedding, dtype=np.float32)
+                if config.PGVECTOR_BINARY else vector_text(user_embedding)),
+        "k":   top_k
+    }
+    if config.RETRIEVAL_DIVERSIFY:
+        params["pool"] = max(config.RETRIEVAL_DIVERSIFY_POOL, top_k)
+    if rerank:
+        params["cand"] = params.get("pool", top_k) * config.RERANK_FACTOR
+    result = await session.execute(sql, params)
+    return [_retrieved_item(row) for row in result.mappings().all()]
 
 # ──────────────────────────────────────────────
 # 2. distortion_id → Reframe 예시 n개(상황 + 생각 + 리프레임) 추출
@@ -89,6 +400,37 @@ async def fetch_reframe_examples(
         for row in rows
     ]
 
+
+async def get_reframes_for(
+    distortion_ids: List[int],
+    session: AsyncSession,
+    limit: int = 2
+) -> Dict[int, List[Dict]]:
+    """
+    사전 적재된 참조 데이터가 있으면 DB 왕복 없이,
+    없으면 배치 쿼리 1회로 distortion_id별 reframe 예시를 가져온다.
+    """
+    if config.REFERENCE_DATA_PRELOAD:
+        if not reference_data.loaded:
+            await reference_data.load(session)
+        return {did: reference_data.get_reframes(did, limit) for did in set(distortion_ids)}
+    return await fetch_reframe_examples_batch(distortion_ids, session, limit)
+
+async def _prefetch_reference(
+    session_factory: Callable[[], AsyncSession],
+    limit: int = 2
+) -> Optional[Dict[int, List[Dict]]]:
+    """
+    검색 결과(distortion_id)를 기다리지 않고 별도 세션으로 참조 데이터를 미리 조회.
+    사전 적재 모드면 저장소를 채우고 None, 아니면 전체 distortion의 reframe 예시 반환
+    """
+    with span("reference"):
+        async with session_factory() as session:
+            if config.REFERENCE_DATA_PRELOAD:
+                await reference_data.load(session)
+                return None
+            return await fetch_reframe_examples_batch(None, session, limit)
+
 # ──────────────────────────────────────────────
 # 3. 전체 프롬프트 생성 + 가장 유사한 distortion_id 반환
 # ──────────────────────────────────────────────
@@ -96,87 +438,218 @@ async def search_similar_and_build_prompt(
     user_situation: str,
     user_thought  : str,
     session: AsyncSession,
-    top_k: int = 3
+    top_k: int = 3,
+    session_factory: Optional[Callable[[], AsyncSession]] = None
 ) -> Optional[Tuple[str, int]]:
     """
     1) thought 임베딩 → example_embeddings에서 상위 k개 예시 찾기
     2) 각 distortion_id로 정의·팁·리프레이밍(상황+생각+예시) 조회
-    3) “버전 1” 포맷에 맞춰 프롬프트 반환
+    3) PROMPT_TEMPLATE 포맷(기본 “버전 1”)에 맞춰 프롬프트 반환
     4) 가장 유사한 distortion_id도 함께 반환
     """
-
-    # 1. 임베딩
-    query_emb = model.encode(user_thought.strip()).tolist()
-
-    # 2. 상위 k 예시 + 메타데이터
-    similar_items = await fetch_top_k_similar_thoughts(query_emb, session, top_k)
-    if not similar_items:
+    ctx = await prepare_prompt(user_situation, user_thought, session, top_k, session_factory)
+    if ctx is None:
         return None
+    return ctx["prompt"], ctx["distortion_id"]
 
-    top_distortion_id = similar_items[0]["distortion_id"]
 
-    # 3. distortion_id → reframe 예시 캐시 (상황, 생각, 예시 리프레임)
-    for item in similar_items:
-        item["reframes"] = await fetch_reframe_examples(item["distortion_id"], session, limit=2)
+async def prepare_prompt(
+    user_situation: str,
+    user_thought  : str,
+    session: AsyncSession,
+    top_k: int = 3,
+    session_factory: Optional[Callable[[], AsyncSession]] = None
+) -> Optional[Dict]:
+    """
+    search_similar_and_build_prompt()와 같지만 중간 결과도 함께 반환
+    session_factory가 주어지면 참조 데이터 조회를 별도 세션으로 임베딩·검색과 동시에 수행
+    Return: {
+        'prompt'         : str,
+        'distortion_id'  : int,          # 가장 유사한 distortion_id
+        'distortion_ids' : List[int],    # top-k 순서대로
+        'query_embedding': np.ndarray,
+        'items'          : List[Dict],   # 검색 결과 + reframes
+        'prompt_usage'   : Dict,         # PROMPT_TOKEN_BUDGET 등 설정 시 토큰 사용량, 아니면 {}
+        'situation_hash' : str           # 정규화한 상황 문장의 sha1
+    }
+    """
 
-    # 4. 프롬프트 조립
-    prompt_parts: List[str] = []
+    # 0. 참조 데이터가 메모리에 없으면 검색과 무관하게 먼저 조회 시작
+    #    (AsyncSession은 동시 쿼리를 허용하지 않으므로 별도 세션 사용)
+    prefetch = None
+    if session_factory is not None and not (config.REFERENCE_DATA_PRELOAD and reference_data.loaded):
+        prefetch = asyncio.create_task(_prefetch_reference(session_factory, limit=2))
 
-    # ─── 머리말: Situation / Thought ───
-    prompt_parts.append("[User Situation]\n" + (user_situation or "(none provided)") + "\n")
-    prompt_parts.append("[User Thought]\n" + user_thought + "\n")
+    try:
+        # 1. 임베딩 (EmbeddingBatcher 워커 스레드)
+        with span("embed"):
+            query_emb = await embed_text(user_thought.strip())
 
-    # ─── Part 1: Candidate N ───
-    prompt_parts.append(
-        "1. Several possible cognitive distortions that may underlie the user's thoughts:\n"
-    )
-    for idx, it in enumerate(similar_items, 1):
-        prompt_parts.append(
-            f"Candidate {idx}: {it['trap_name']} "
-            f"(Definition: {it['definition']})"
-        )
-    prompt_parts.append("")
+        # 2. 상위 k 예시 + 메타데이터
+        with span("retrieval"):
+            similar_items = await fetch_top_k_similar_thoughts(query_emb, session, top_k)
+        if not similar_items:
+            return None
 
-    # ─── Part 2: Reframe N 블록 (few-shot guidance) ───
-    prompt_parts.append(
-        "2. Your task is to suggest alternative rational thoughts to address each of the identified cognitive distortions. Use the following tips and reframing examples:"
-    )
+        # 3. distortion_id → reframe 예시 캐시 (상황, 생각, 예시 리프레임)
+        #    중복 id는 한 번만, DB 조회는 최대 1회
+        distortion_ids = [item["distortion_id"] for item in similar_items]
+        with span("reframes"):
+            prefetched = await prefetch if prefetch is not None else None
+            if prefetched is not None:
+                reframes_by_id = {did: [dict(r) for r in prefetched.get(did, [])] for did in distortion_ids}
+            else:
+                reframes_by_id = await get_reframes_for(distortion_ids, session, limit=2)
+    finally:
+        if prefetch is not None and not prefetch.done():
+            prefetch.cancel()
 
-    for idx, it in enumerate(similar_items, 1):
-        prompt_parts.append(f"\n[Reframe {idx}]")
-        prompt_parts.append(f"Tips to overcome {it['trap_name']}: {it['tips']}")
+    return build_prompt_context(user_situation, user_thought, query_emb, similar_items, reframes_by_id)
 
-        for ridx, ex in enumerate(it["reframes"], 1):
-            prompt_parts.append(f"Example Situation {ridx}: {ex['situation']}")
-            prompt_parts.append(f"Example Original Thought   {ridx}: {ex['thought']}")
-            prompt_parts.append(f"Example Reframed Thought   {ridx}: {ex['reframe']}")
 
-        prompt_parts.append("")
+def build_prompt_context(
+    user_situation: str,
+    user_thought  : str,
+    query_emb     : np.ndarray,
+    similar_items : List[Dict],
+    reframes_by_id: Dict[int, List[Dict]]
+) -> Dict:
+    """검색 결과 + reframe 예시 → prepare_prompt()와 같은 형태의 dict (배치 분석과 공용)"""
+    top_distortion_id = similar_items[0]["distortion_id"]
+    for item in similar_items:
+        item["reframes"] = reframes_by_id.get(item["distortion_id"], [])
 
-    # ─── Part 3: 출력 포맷 지시 ───
-    prompt_parts.append(
-        "3. Now generate new reframed thoughts for the user's input (based on their Situation & Thought). Do not include the Example Situation and Example Thought in the output."
-        "Output in the following format:\n"
-        "[Notice] Reference only. For accurate evaluation of potential cognitive distortions, please consult a mental health professional.\n"
+    # 4. 프롬프트 조립 (distortion별 조각은 캐시, 상황/생각과 후보 순서만 요청마다)
+    t_prompt = time.perf_counter()
+    #    토큰 예산이 있으면 예시/하위 후보를 우선순위대로 제외하고 사용량 보고
+    prompt, prompt_usage = prompt_builder.build(
+        user_situation, user_thought, similar_items,
+        store=reference_data if config.REFERENCE_DATA_PRELOAD else None
     )
-    for idx in range(1, len(similar_items) + 1):
-        prompt_parts.append(f"Candidate Distortion {idx}:")
-        prompt_parts.append(f"Definition of the Distortion:")
-        prompt_parts.append(f"Tips to Overcome the Distortion:")
-        prompt_parts.append(f"Example Reframed Thoughts for the Distortion:\n")
+    record_stage("prompt", time.perf_counter() - t_prompt)
+    if prompt_usage:
+        PROMPT_TOKENS.observe(prompt_usage["tokens"])
+        PROMPT_DROPPED.inc(prompt_usage["examples_dropped"], kind="example")
+        PROMPT_DROPPED.inc(prompt_usage["candidates_dropped"], kind="candidate")
+        if prompt_usage["over_budget"]:
+            PROMPT_OVER_BUDGET.inc()
 
-    return "\n".join(prompt_parts), top_distortion_id
+    return {
+        "prompt"         : prompt,
+        "distortion_id"  : top_distortion_id,
+        "distortion_ids" : [it["distortion_id"] for it in similar_items],
+        "query_embedding": query_emb,
+        "items"          : similar_items,
+        "prompt_usage"   : prompt_usage,   # 예산 미사용 시 {}
+        # 시맨틱 캐시 지문용 (상황이 다른 사용자끼리 응답을 공유하지 않도록)
+        "situation_hash" : hashlib.sha1(normalize_thought(user_situation).encode("utf-8")).hexdigest()
+    }
 
 # ──────────────────────────────────────────────
 # 4. LLM 호출
 # ──────────────────────────────────────────────
-async def ask_llm(prompt: str) -> str:
-    payload = {
-        "model": "llama3.2",
-        "prompt": prompt,
-        "stream": False
-    }
-    async with httpx.AsyncClient(timeout=None) as client:
-        resp = await client.post("http://localhost:11434/api/generate", json=payload)
-        resp.raise_for_status()
-        return resp.json().get("response", "")
+def llm_client() -> LLMClient:
+    """현재 이벤트 루프의 공유 LLMClient (설정은 config에서)"""
+    return get_llm_client(
+        base_url=config.OLLAMA_BASE_URL,
+        model=config.OLLAMA_MODEL,
+        connect_timeout=config.LLM_CONNECT_TIMEOUT,
+        read_timeout=config.LLM_READ_TIMEOUT,
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_concurrency=config.LLM_MAX_CONCURRENCY,
+        max_queue=config.LLM_MAX_QUEUE,
+        queue_timeout=config.LLM_QUEUE_TIMEOUT
+    )
+
+
+def _generate_options() -> Dict:
+    """/api/generate 공통 필드: keep_alive(모델 상주) + options(num_ctx 등)"""
+    options = json.loads(config.OLLAMA_OPTIONS) if config.OLLAMA_OPTIONS else {}
+    if config.OLLAMA_NUM_CTX > 0:
+        options["num_ctx"] = config.OLLAMA_NUM_CTX
+    fields: Dict = {}
+    keep_alive = config.OLLAMA_KEEP_ALIVE
+    if keep_alive:
+        # 단위 없는 숫자는 초 단위 정수로 (-1: 무기한)
+        fields["keep_alive"] = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+    if options:
+        fields["options"] = options
+    return fields
+
+
+GENERATE_OPTIONS = _generate_options()
+
+
+PROMPT_BUDGET_KEY = (f"{config.PROMPT_TOKEN_BUDGET}/{config.PROMPT_USER_MAX_TOKENS}/"
+                     f"{config.PROMPT_FIELD_MAX_TOKENS}/{config.PROMPT_TOKENIZER}")
+
+
+def _semantic_key(prompt: str, context: Optional[Dict]):
+    """(fingerprint, prompt_hash) — 캐시 비활성 또는 context 없음이면 None"""
+    if not config.SEMANTIC_CACHE_ENABLED or context is None:
+        return None
+    # 같은 질의라도 프롬프트 포맷(템플릿·레이아웃·토큰 예산)이 다르면 다른 응답으로 취급
+    # 응답이 상황을 그대로 옮겨 적는 경우가 많으므로 상황이 같을 때만 생각 임베딩 유사도로 적중
+    fingerprint = context_fingerprint(
+        context["distortion_ids"], config.OLLAMA_MODEL,
+        config.PROMPT_TEMPLATE, config.PROMPT_LAYOUT, PROMPT_BUDGET_KEY,
+        context["situation_hash"]
+    )
+    return fingerprint, prompt_hash(prompt)
+
+
+async def ask_llm(prompt: str, context: Optional[Dict] = None) -> str:
+    """
+    context(prepare_prompt 결과)가 주어지고 SEMANTIC_CACHE_ENABLED이면
+    유사한 과거 질의의 응답을 먼저 찾아 재사용한다.
+    """
+    key = _semantic_key(prompt, context)
+    if key is not None:
+        cached = semantic_cache.lookup(context["query_embedding"], *key)
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    with span("llm"):
+        data = await llm_client().generate(prompt, **GENERATE_OPTIONS)
+    record_ollama(data)
+    answer = data.get("response", "")
+
+    if key is not None and answer:
+        semantic_cache.store(
+            context["query_embedding"], *key, answer, time.perf_counter() - start
+        )
+    return answer
+
+
+async def ask_llm_stream(prompt: str, context: Optional[Dict] = None) -> AsyncIterator[str]:
+    """
+    ask_llm의 스트리밍 버전: Ollama NDJSON 청크를 읽어 토큰 단위로 yield
+    (청크 예: {"response": "...", "done": false})
+    시맨틱 캐시 적중 시 저장된 응답 전체를 한 번에 yield
+    """
+    key = _semantic_key(prompt, context)
+    if key is not None:
+        cached = semantic_cache.lookup(context["query_embedding"], *key)
+        if cached is not None:
+            yield cached
+            return
+
+    start = time.perf_counter()
+    tokens: List[str] = []
+    async for chunk in llm_client().generate_stream(prompt, **GENERATE_OPTIONS):
+        token = chunk.get("response", "")
+        if token:
+            if not tokens:
+                record_stage("llm_first_token", time.perf_counter() - start)
+            tokens.append(token)
+            yield token
+        if chunk.get("done"):
+            # 마지막 청크에 토큰 수 / eval_duration 등 통계가 포함됨
+            record_ollama(chunk)
+    record_stage("llm", time.perf_counter() - start)
+
+    if key is not None and tokens:
+        semantic_cache.store(
+            context["query_embedding"], *key, "".join(tokens), time.perf_counter() - start
+        )
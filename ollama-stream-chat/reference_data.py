@@ -0,0 +1,117 @@
+# reference_data.py
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+
+
+def _reframe_row(row) -> Dict:
+    return {
+        "situation": row["situation"] or "(no situation provided)",
+        "thought"  : row["thought"],
+        "reframe"  : row["reframe"]
+    }
+
+
+# ──────────────────────────────────────────────
+# distortion_id 목록 → Reframe 예시 (단일 배치 쿼리)
+# ──────────────────────────────────────────────
+async def fetch_reframe_examples_batch(
+    distortion_ids: Optional[Iterable[int]],
+    session: AsyncSession,
+    limit: int = 2
+) -> Dict[int, List[Dict]]:
+    """
+    fetch_reframe_examples()를 id마다 반복하는 대신
+    `distortion_id = ANY(:ids)` 한 번으로 id별 최대 limit개씩 조회
+    (distortion_ids=None이면 모든 distortion — 검색 결과를 기다리지 않고 미리 조회할 때)
+    Return: { distortion_id: [ {'situation', 'thought', 'reframe'}, … ] }
+    """
+    ids = None if distortion_ids is None else sorted({int(i) for i in distortion_ids if i is not None})
+    if ids is not None and not ids:
+        return {}
+
+    id_filter = "" if ids is None else "distortion_id = ANY(:ids) AND"
+    sql = text(f"""
+        SELECT distortion_id, situation, thought, reframe
+        FROM (
+            SELECT
+                distortion_id, situation, thought, reframe,
+                ROW_NUMBER() OVER (PARTITION BY distortion_id) AS rn
+            FROM reframing_dataset
+            WHERE {id_filter} reframe IS NOT NULL
+        ) AS t
+        WHERE rn <= :lim;
+    """)
+    params = {"lim": limit} if ids is None else {"ids": ids, "lim": limit}
+    result = await session.execute(sql, params)
+
+    grouped: Dict[int, List[Dict]] = {i: [] for i in ids or ()}
+    for row in result.mappings().all():
+        grouped.setdefault(row["distortion_id"], []).append(_reframe_row(row))
+    return grouped
+
+
+# ──────────────────────────────────────────────
+# 참조 데이터 저장소 (distortions + reframing_dataset)
+# ──────────────────────────────────────────────
+class ReferenceDataStore:
+    """
+    distortions(≈13행)와 reframing_dataset(≈40행)은 작고 정적이므로
+    시작 시 한 번 적재해 distortion_id로 색인해 둔다.
+    데이터가 바뀌면 reload()로 다시 적재한다.
+    """
+
+    def __init__(self):
+        self.distortions: Dict[int, Dict] = {}
+        self.reframes: Dict[int, List[Dict]] = {}
+        self.loaded = False
+        self.version = 0  # replace()마다 증가 → 파생 캐시(프롬프트 조각) 무효화 판단
+
+    async def load(self, session: AsyncSession) -> "ReferenceDataStore":
+        result = await session.execute(text("""
+            SELECT distortion_id, trap_name, definition, example, tips
+            FROM distortions
+            ORDER BY distortion_id;
+        """))
+        distortions = {
+            row["distortion_id"]: {
+                "distortion_id": row["distortion_id"],
+                "trap_name"    : row["trap_name"] or "UnknownDistortion",
+                "definition"   : row["definition"] or "Definition not available.",
+                "example"      : row["example"],
+                "tips"         : row["tips"] or "No tips available."
+            }
+            for row in result.mappings().all()
+        }
+
+        result = await session.execute(text("""
+            SELECT distortion_id, situation, thought, reframe
+            FROM reframing_dataset
+            WHERE reframe IS NOT NULL;
+        """))
+        reframes: Dict[int, List[Dict]] = {}
+        for row in result.mappings().all():
+            reframes.setdefault(row["distortion_id"], []).append(_reframe_row(row))
+
+        return self.replace(distortions, reframes)
+
+    def replace(
+        self,
+        distortions: Dict[int, Dict],
+        reframes: Dict[int, List[Dict]]
+    ) -> "ReferenceDataStore":
+        """완전히 적재된 뒤 한 번에 교체 (동시 요청이 반쯤 채워진 상태를 보지 않도록)"""
+        self.distortions, self.reframes = distortions, reframes
+        self.loaded = True
+        self.version += 1
+        return self
+
+    async def reload(self, session: AsyncSession) -> "ReferenceDataStore":
+        return await self.load(session)
+
+    def get_distortion(self, distortion_id: int) -> Optional[Dict]:
+        return self.distortions.get(distortion_id)
+
+    def get_reframes(self, distortion_id: int, limit: int = 2) -> List[Dict]:
+        return [dict(r) for r in self.reframes.get(distortion_id, [])[:limit]]
@@ -0,0 +1,356 @@
+import argparse
+import json
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from archive_paths import EXAMPLES_PATH
+from vector_index import InMemoryVectorIndex, CentroidVectorIndex, QuantizedVectorIndex
+
+# =============================================================================
+# 검색 품질 / 속도 평가 (distortion_examples.csv 의 Distortion_ID 라벨 기준)
+#   - split   : loo (leave-one-out, 자기 자신 제외) | holdout (시드 고정 무작위 분할)
+#   - 정확도  : top-1 (최근접 예시의 라벨 == 정답), top-k (정답이 k개 중 하나라도),
+#               vote@k (k개 라벨 다수결 == 정답)
+#   - recall  : NumPy 전수 검색 결과 대비 겹치는 비율 (근사/양자화 백엔드 판단용)
+#   - 다양성  : 질의당 top-k에 포함된 서로 다른 distortion 수
+#   - 메모리  : 백엔드별 검색용 배열 크기 (float16 / int8 / binary 양자화 비교)
+#   - 속도    : 백엔드별 질의 1건씩 q/s, p50/p95 / 모델별 인코딩 속도
+#
+#   python retrieval_eval.py --models sentence-transformers/all-MiniLM-L6-v2 \
+#       --backends exact memory --k 3 --json retrieval_eval.json
+#   python retrieval_eval.py --pgvector   # insert.py로 적재된 DB 임베딩 평가 (LOO)
+# =============================================================================
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+QUERY_CHUNK = 1024
+
+
+def load_labeled_examples(keep_duplicates: bool = False) -> pd.DataFrame:
+    df = pd.read_csv(EXAMPLES_PATH)
+    df["Distortion_ID"] = df["Distortion_ID"].fillna(0).astype(int)
+    df["Thought"] = df["Thought"].astype(str)
+    if not keep_duplicates:
+        # 같은 문장이 여러 번 있으면 LOO에서도 자기 자신을 찾게 되므로 제거
+        df = df.drop_duplicates("Thought").reset_index(drop=True)
+    return df
+
+
+def make_split(n: int, split: str, test_size: float, seed: int):
+    """Return: (index에 넣을 행, 질의 행). loo면 둘 다 전체"""
+    rows = np.arange(n)
+    if split == "loo":
+        return rows, rows
+    rng = np.random.default_rng(seed)
+    perm = rng.permutation(n)
+    n_test = max(1, int(round(n * test_size)))
+    return np.sort(perm[n_test:]), np.sort(perm[:n_test])
+
+
+# =============================================================================
+# 1. 정답(전수 검색)
+# =============================================================================
+def exact_top_k(
+    index_emb: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    exclude: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    L2 거리 기준 상위 k개의 index 행 번호 (nq, k).
+    exclude[i] 가 주어지면 i번째 질의에서 그 행을 제외 (LOO)
+    """
+    sq_norms = np.einsum("ij,ij->i", index_emb, index_emb)
+    out = np.empty((len(queries), k), dtype=np.int64)
+    for s in range(0, len(queries), QUERY_CHUNK):
+        q = queries[s:s + QUERY_CHUNK]
+        scores = sq_norms[None, :] - 2.0 * (q @ index_emb.T)
+        if exclude is not None:
+            scores[np.arange(len(q)), exclude[s:s + QUERY_CHUNK]] = np.inf
+        idx = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(scores, idx, axis=1), axis=1, kind="stable")
+        out[s:s + QUERY_CHUNK] = np.take_along_axis(idx, order, axis=1)
+    return out
+
+
+# =============================================================================
+# 2. 평가 대상 백엔드: (index 임베딩, 라벨, 옵션) → (search(query, k, exclude), 메모리 바이트)
+#    search는 index 행 번호 목록을 반환
+# =============================================================================
+def _row_metadata(index_labels: np.ndarray) -> List[Dict]:
+    return [{"row": i, "distortion_id": int(d)} for i, d in enumerate(index_labels)]
+
+
+def _index_search(index, diversify: bool = False):
+    return lambda q, k, exclude=None: [
+        m["row"] for m in index.search(q, k, diversify, None if exclude is None else [exclude])
+    ]
+
+
+def _exact_backend(index_emb, index_labels, options):
+    def search(q, k, exclude=None):
+        ex = None if exclude is None else np.array([exclude])
+        return exact_top_k(index_emb, q[None, :], k, ex)[0].tolist()
+    return search, index_emb.nbytes
+
+
+def _memory_backend(index_emb, index_labels, options, diversify: bool = False):
+    index = InMemoryVectorIndex(index_emb, _row_metadata(index_labels))
+    return _index_search(index, diversify), index.nbytes
+
+
+def _centroid_backend(index_emb, index_labels, options, diversify: bool = False):
+    index = CentroidVectorIndex(
+        index_emb, _row_metadata(index_labels),
+        sub_centroids=options.get("sub_centroids", 1), n_probe=options.get("n_probe", 3)
+    )
+    return _index_search(index, diversify), index.nbytes + index.centroids.nbytes
+
+
+def _quantized_backend(encoding: str, rerank: bool):
+    def build(index_emb, index_labels, options):
+        index = QuantizedVectorIndex(
+            index_emb, _row_metadata(index_labels),
+            encoding=encoding, rerank=options.get("rerank", 4) if rerank else 0
+        )
+        return _index_search(index), index.nbytes
+    return build
+
+
+BACKENDS: Dict[str, Callable] = {
+    "exact"           : _exact_backend,
+    "memory"          : _memory_backend,
+    "memory-diverse"  : lambda *a: _memory_backend(*a, diversify=True),
+    "centroid"        : _centroid_backend,
+    "centroid-diverse": lambda *a: _centroid_backend(*a, diversify=True),
+}
+for _enc in QuantizedVectorIndex.ENCODINGS:
+    BACKENDS[_enc] = _quantized_backend(_enc, rerank=False)
+    BACKENDS[f"{_enc}-rerank"] = _quantized_backend(_enc, rerank=True)
+
+
+def run_backend(search, queries: np.ndarray, k: int, exclude: Optional[np.ndarray]):
+    """질의를 한 건씩 실행 (서버와 같은 호출 패턴). Return: (결과 행 번호, 지연 ms 배열)"""
+    results = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        ex = None if exclude is None else int(exclude[i])
+        t0 = time.perf_counter()
+        found = search(q, k, ex)
+        latencies[i] = (time.perf_counter() - t0) * 1000
+        found = (list(found) + [-1] * k)[:k]
+        results[i] = found
+    return results, latencies
+
+
+# =============================================================================
+# 3. 지표
+# =============================================================================
+def _vote(row: np.ndarray) -> int:
+    """k개 라벨 다수결. 동률이면 더 가까운 예시의 라벨 (row는 거리순)"""
+    row = row[row >= 0]
+    if len(row) == 0:
+        return -1
+    vals, counts = np.unique(row, return_counts=True)
+    winners = set(vals[counts == counts.max()].tolist())
+    return next(int(v) for v in row if v in winners)
+
+
+def score(
+    found: np.ndarray,
+    truth: np.ndarray,
+    index_labels: np.ndarray,
+    query_labels: np.ndarray,
+    latencies: np.ndarray
+) -> Dict:
+    k = found.shape[1]
+    valid = found >= 0
+    labels = np.where(valid, index_labels[np.clip(found, 0, None)], -1)
+
+    votes = np.array([_vote(row) for row in labels])
+
+    recall = np.mean([
+        len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)
+    ])
+    total_s = latencies.sum() / 1000
+    return {
+        "queries"        : int(len(found)),
+        "top1_accuracy"  : float(np.mean(labels[:, 0] == query_labels)),
+        "topk_accuracy"  : float(np.mean((labels == query_labels[:, None]).any(axis=1))),
+        "vote_accuracy"  : float(np.mean(votes == query_labels)),
+        "recall_vs_exact": float(recall),
+        # 프롬프트 후보 다양성: 질의당 서로 다른 distortion 수 (평균)
+        "distinct_distortions": float(np.mean([len(set(r[r >= 0].tolist())) for r in labels])),
+        "qps"            : float(len(found) / total_s) if total_s > 0 else None,
+        "p50_ms"         : float(np.percentile(latencies, 50)),
+        "p95_ms"         : float(np.percentile(latencies, 95)),
+    }
+
+
+def evaluate_embeddings(
+    embeddings: np.ndarray,
+    labels: np.ndarray,
+    backends: Sequence[str],
+    k: int,
+    split: str,
+    test_size: float,
+    seed: int,
+    options: Optional[Dict] = None
+) -> List[Dict]:
+    index_rows, query_rows = make_split(len(embeddings), split, test_size, seed)
+    index_emb = np.ascontiguousarray(embeddings[index_rows])
+    queries = embeddings[query_rows]
+    # loo: 질의 i 는 index 의 i 행 자신 → 제외
+    exclude = np.arange(len(query_rows)) if split == "loo" else None
+
+    truth = exact_top_k(index_emb, queries, k, exclude)
+    report = []
+    for name in backends:
+        search, nbytes = BACKENDS[name](index_emb, labels[index_rows], options or {})
+        found, latencies = run_backend(search, queries, k, exclude)
+        row = {"backend": name, "index_bytes": int(nbytes),
+               "bytes_per_row": round(nbytes / max(len(index_emb), 1), 1)}
+        row.update(score(found, truth, labels[index_rows], labels[query_rows], latencies))
+        report.append(row)
+    return report
+
+
+# =============================================================================
+# 4. 임베딩 모델별 평가
+# =============================================================================
+def encode_all(model, thoughts: List[str], batch_size: int) -> tuple:
+    """Return: (임베딩, 배치 인코딩 문장/s, 단건 인코딩 평균 ms)"""
+    t0 = time.perf_counter()
+    emb = model.encode(
+        thoughts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False
+    ).astype(np.float32, copy=False)
+    batch_sps = len(thoughts) / (time.perf_counter() - t0)
+
+    sample = thoughts[:50]
+    t0 = time.perf_counter()
+    for s in sample:
+        model.encode([s], convert_to_numpy=True, show_progress_bar=False)
+    single_ms = (time.perf_counter() - t0) / len(sample) * 1000
+    return emb, batch_sps, single_ms
+
+
+def evaluate_models(args) -> List[Dict]:
+    from embedding_model import get_model
+
+    df = load_labeled_examples(args.keep_duplicates)
+    thoughts = df["Thought"].tolist()
+    labels = df["Distortion_ID"].to_numpy()
+
+    report = []
+    for model_name in args.models:
+        for embed_backend in args.embed_backends:
+            model = get_model(model_name, embed_backend)
+            emb, batch_sps, single_ms = encode_all(model, thoughts, args.batch_size)
+            for row in evaluate_embeddings(
+                emb, labels, args.backends, args.k, args.split, args.test_size, args.seed,
+                {"n_probe": args.n_probe, "sub_centroids": args.sub_centroids, "rerank": args.rerank}
+            ):
+                row.update({
+                    "model"           : model_name if embed_backend == "torch"
+                                        else f"{model_name} [{embed_backend}]",
+                    "embed_backend"   : embed_backend,
+                    "dim"             : int(emb.shape[1]),
+                    "encode_batch_sps": batch_sps,
+                    "encode_single_ms": single_ms,
+                })
+                report.append(row)
+    return report
+
+
+# =============================================================================
+# 5. pgvector (DB에 적재된 임베딩 그대로, LOO)
+# =============================================================================
+def evaluate_pgvector(args) -> List[Dict]:
+    import psycopg2
+    from ann_index import search_settings_sql
+    from ann_report import load_embeddings
+    from insert import DB_PARAMS
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    cur = conn.cursor()
+    try:
+        ids, mat = load_embeddings(cur)
+        cur.execute("""
+            SELECT r.embedding_id, COALESCE(r.distortion_id, 0)
+            FROM example_dataset AS r
+            WHERE r.embedding_id IS NOT NULL;
+        """)
+        label_of = dict(cur.fetchall())
+        labels = np.array([label_of.get(int(i), 0) for i in ids])
+        truth = exact_top_k(mat, mat, args.k, np.arange(len(ids)))
+        row_of = {int(i): r for r, i in enumerate(ids)}
+
+        settings_sql = search_settings_sql(args.ef_search, args.probes)
+        if settings_sql:
+            cur.execute(settings_sql)
+
+        def search(q, k, exclude=None):
+            # 자기 자신은 WHERE 대신 k+1개를 받아 제거 (ANN 인덱스 스캔 유지)
+            cur.execute(
+                "SELECT embedding_id FROM example_embeddings "
+                "ORDER BY embedding <-> %s::vector LIMIT %s;",
+                ("[" + ",".join(map(repr, q.tolist())) + "]", k + 1)
+            )
+            rows = [row_of[r[0]] for r in cur.fetchall()]
+            return [r for r in rows if r != exclude][:k]
+
+        found, latencies = run_backend(search, mat, args.k, np.arange(len(ids)))
+        row = {"backend": "pgvector", "model": "db", "dim": int(mat.shape[1]),
+               "ef_search": args.ef_search, "probes": args.probes}
+        row.update(score(found, truth, labels, labels, latencies))
+        return [row]
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+# =============================================================================
+# 6. main
+# =============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="검색 품질(distortion 정확도) / 속도 평가")
+    parser.add_argument("--models", nargs="+", default=[DEFAULT_MODEL])
+    parser.add_argument("--embed-backends", nargs="+", default=["torch"],
+                        choices=["torch", "onnx", "onnx-int8"], help="임베딩 추론 백엔드 비교")
+    parser.add_argument("--backends", nargs="+", default=["exact", "memory"], choices=sorted(BACKENDS))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--n-probe", type=int, default=3, help="centroid: 검색할 distortion 수")
+    parser.add_argument("--sub-centroids", type=int, default=1, help="centroid: distortion당 centroid 수")
+    parser.add_argument("--rerank", type=int, default=4, help="*-rerank: top_k * rerank개 후보 재정렬")
+    parser.add_argument("--split", choices=["loo", "holdout"], default="loo")
+    parser.add_argument("--test-size", type=float, default=0.2, help="holdout 비율")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--keep-duplicates", action="store_true", help="중복 Thought 유지")
+    parser.add_argument("--pgvector", action="store_true", help="DB 임베딩으로 pgvector도 평가 (LOO)")
+    parser.add_argument("--ef-search", type=int, default=0)
+    parser.add_argument("--probes", type=int, default=0)
+    parser.add_argument("--json", default="", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    report = evaluate_models(args)
+    if args.pgvector:
+        report += evaluate_pgvector(args)
+
+    print(f"{'model':40s} {'backend':16s} {'top1':>6s} {'top' + str(args.k):>6s} "
+          f"{'vote':>6s} {'recall':>7s} {'uniq':>5s} {'B/row':>7s} {'q/s':>9s} {'p95 ms':>8s}")
+    for r in report:
+        print(f"{r['model'][-40:]:40s} {r['backend']:16s} {r['top1_accuracy']:6.3f} "
+              f"{r['topk_accuracy']:6.3f} {r['vote_accuracy']:6.3f} {r['recall_vs_exact']:7.3f} "
+              f"{r['distinct_distortions']:5.2f} {r.get('bytes_per_row', 0):7.1f} "
+              f"{r['qps'] or 0:9.1f} {r['p95_ms']:8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"params": vars(args), "results": report}, f, indent=2, ensure_ascii=False)
+        print(f"✅ 결과 저장: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# semantic_cache.py
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def context_fingerprint(distortion_ids: Sequence[int], *extra: Any) -> str:
+    """검색된 top-k distortion_id 순서 + (모델명, 템플릿 버전, 상황 해시 등) → 지문 문자열"""
+    return "|".join(str(x) for x in (*distortion_ids, "#", *extra))
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+# ──────────────────────────────────────────────
+# LLM 응답 시맨틱 캐시
+# ──────────────────────────────────────────────
+class SemanticResponseCache:
+    """
+    같은 context_fingerprint(= 같은 top-k distortion 조합 + 같은 상황) 안에서
+    질의 임베딩의 코사인 유사도가 threshold 이상인 과거 응답을 재사용한다.
+    프롬프트 해시가 완전히 같으면 유사도와 무관하게 적중.
+
+    - 크기 초과 시 LRU, TTL 경과 시 조회 시점에 제거
+    - hits / misses / saved_seconds(적중으로 아낀 생성 시간 합) 집계
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1024, ttl: float = 86400.0):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._buckets: Dict[str, List[int]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, query_embedding: Sequence[float], fingerprint: str, p_hash: str) -> Optional[str]:
+        q = self._unit(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            ids = [i for i in self._buckets.get(fingerprint, []) if self._alive(i, now)]
+            best_id, best_sim = None, -1.0
+            if ids:
+                for i in ids:
+                    if self._entries[i]["prompt_hash"] == p_hash:
+                        best_id, best_sim = i, 1.0
+                        break
+                else:
+                    mat = np.vstack([self._entries[i]["embedding"] for i in ids])
+                    sims = mat @ q
+                    j = int(np.argmax(sims))
+                    best_id, best_sim = ids[j], float(sims[j])
+
+            if best_id is None or best_sim < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+            return entry["response"]
+
+    def store(
+        self,
+        query_embedding: Sequence[float],
+        fingerprint: str,
+        p_hash: str,
+        response: str,
+        latency: float = 0.0
+    ) -> None:
+        entry = {
+            "embedding"  : self._unit(query_embedding),
+            "fingerprint": fingerprint,
+            "prompt_hash": p_hash,
+            "response"   : response,
+            "latency"    : latency,
+            "expires_at" : time.monotonic() + self.ttl
+        }
+        with self._lock:
+            eid = next(self._ids)
+            self._entries[eid] = entry
+            self._buckets.setdefault(fingerprint, []).append(eid)
+            while len(self._entries) > self.maxsize:
+                old_id, _ = next(iter(self._entries.items()))
+                self._remove(old_id)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3)
+            }
+
+    # ─── 내부 (lock 보유 상태에서 호출) ───
+    @staticmethod
+    def _unit(vec: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm > 0 else v
+
+    def _alive(self, eid: int, now: float) -> bool:
+        if self._entries[eid]["expires_at"] >= now:
+            return True
+        self._remove(eid)
+        return False
+
+    def _remove(self, eid: int) -> None:
+        entry = self._entries.pop(eid)
+        bucket = self._buckets.get(entry["fingerprint"], [])
+        if eid in bucket:
+            bucket.remove(eid)
+        if not bucket:
+            self._buckets.pop(entry["fingerprint"], None)
@@ -1,82 +1,154 @@
 # streamlit_app.py
 
 import os
+import time
 import asyncio
+import threading
 
 os.environ["STREAMLIT_WATCH_SKIP_PACKAGES"] = "torch"
 
 import streamlit as st
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from rag_engine import search_similar_and_build_prompt, ask_llm
-from database import async_session, init_db
+import config
+from rag_engine import (
+    prepare_prompt,
+    ask_llm,
+    ask_llm_stream,
+    warm_up_embeddings,
+    load_reference_data,
+    load_vector_index,
+    IN_MEMORY_BACKENDS
+)
+from database import async_session, init_db, DATABASE_URL
+from interaction_logger import get_interaction_logger
+
+# ──────────────────────────────────────────────
+# 프로세스당 1회 생성되는 리소스 (st.cache_resource)
+#   Streamlit은 클릭마다 스크립트 전체를 다시 실행하므로
+#   이벤트 루프 · DB 엔진(커넥션 풀) · 임베딩 모델 · 참조 데이터는 여기서 한 번만 만든다
+# ──────────────────────────────────────────────
+class AsyncRunner:
+    """
+    백그라운드 스레드에서 계속 도는 이벤트 루프.
+    asyncpg 풀 · 공유 LLMClient · EmbeddingBatcher가 모두 이 루프에 묶이므로
+    클릭마다 asyncio.run()으로 새 루프를 만들지 않고 여기에 코루틴을 제출한다.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="streamlit-async", daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, agen):
+        """
+        async generator → 동기 generator (st 호출은 스크립트 스레드에서 해야 하므로)
+        Stop / 재실행으로 도중에 버려져도 aclose()로 LLM 응답과 동시성 슬롯을 바로 반환
+        """
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+
+async def _startup():
+    # 스키마 생성(create_all)은 시작 시 1회
+    await init_db()
+    if config.EMBED_WARMUP:
+        await warm_up_embeddings()
+    async with async_session() as session:
+        if config.REFERENCE_DATA_PRELOAD:
+            await load_reference_data(session)
+        if config.RETRIEVAL_BACKEND in IN_MEMORY_BACKENDS:
+            await load_vector_index(session)
+
+
+@st.cache_resource(show_spinner="Loading model and reference data...")
+def get_runner() -> AsyncRunner:
+    runner = AsyncRunner()
+    runner.run(_startup())
+    return runner
+
+
+@st.cache_resource
+def get_logger():
+    logger = get_interaction_logger(
+        DATABASE_URL,
+        max_batch=config.LOG_MAX_BATCH,
+        flush_interval=config.LOG_FLUSH_INTERVAL,
+        max_queue=config.LOG_MAX_QUEUE,
+        enabled=config.LOG_ENABLED
+    )
+    logger.start()
+    return logger
+
+
+async def _prepare(situation: str, thought: str):
+    async with async_session() as session:
+        # 참조 데이터가 메모리에 없으면 별도 세션으로 검색과 동시에 조회
+        return await prepare_prompt(situation, thought, session, session_factory=async_session)
+
 
 # 페이지 설정
 st.set_page_config(page_title="Cognitive Distortion Chatbot", layout="wide")
 st.title("🧠 Cognitive Reframing Assistant")
 
+runner = get_runner()
+interaction_logger = get_logger()
+
 user_situation = st.text_area("Describe the situation", height=70)
 user_thought   = st.text_area("What thought came to your mind?", height=70)
 user_id        = st.text_input("Please input your ID (for future use)", value="")
+stream_answer  = st.sidebar.checkbox("Stream response", value=True)
 
 if st.button("Analyze Thought"):
     if not user_situation.strip() or not user_thought.strip() or not user_id.strip():
         st.warning("Please provide situation, thought, and your ID.")
         st.stop()
 
-    async def main():
-        # 1) DB 초기화
-        await init_db()
-
-        # 2) AsyncSession 열기
-        async with async_session() as session:
-            with st.spinner("Retrieving similar cases and generating explanation..."):
-                # (2.1) RAG 프롬프트 생성
-                prompt, distortion_id = await search_similar_and_build_prompt(
-                    user_situation,
-                    user_thought,
-                    session
-                )
-                if not prompt:
-                    st.error("❌ No relevant examples found.")
-                    return
+    with st.spinner("Retrieving similar cases and generating explanation..."):
+        # (1) RAG 프롬프트 생성 (상시 이벤트 루프에서 실행)
+        t_start = time.perf_counter()
+        ctx = runner.run(_prepare(user_situation, user_thought))
+        if not ctx:
+            st.error("❌ No relevant examples found.")
+            st.stop()
+        prompt, distortion_id = ctx["prompt"], ctx["distortion_id"]
+        retrieval_ms = (time.perf_counter() - t_start) * 1000
+        t_llm = time.perf_counter()
 
-                # (2.2) LLM 호출
-                answer = await ask_llm(prompt)
-
-                # (2.3-1) users 테이블에 user_id가 없으면 추가 (ON CONFLICT DO NOTHING)
-                await session.execute(
-                    text("""
-                        INSERT INTO users (user_id)
-                        VALUES (:uid)
-                        ON CONFLICT (user_id) DO NOTHING;
-                    """),
-                    {"uid": user_id}
-                )
-
-                # (2.3-2) logs 테이블에 삽입
-                await session.execute(
-                    text("""
-                        INSERT INTO logs (user_id, situation, thought, distortion_id)
-                        VALUES (:uid, :situation, :thought, :d);
-                    """),
-                    {
-                        "uid": user_id,
-                        "situation": user_situation,
-                        "thought": user_thought,
-                        "d": distortion_id or None
-                    }
-                )
-
-                # (2.4) 커밋
-                await session.commit()
-
-        # (3) 결과 출력
+        # (2) LLM 호출 (스트리밍이면 토큰이 도착하는 대로 렌더링)
         st.subheader("🧾 Generated Explanation")
-        st.markdown(answer)
-        with st.expander("📄 Prompt Sent to LLM"):
-            st.code(prompt)
+        placeholder = st.empty()
+        if stream_answer:
+            answer = ""
+            for token in runner.iterate(ask_llm_stream(prompt, ctx)):
+                answer += token
+                placeholder.markdown(answer + "▌")
+        else:
+            answer = runner.run(ask_llm(prompt, ctx))
+        placeholder.markdown(answer)
+
+        llm_ms = (time.perf_counter() - t_llm) * 1000
+
+    # (3) users / logs 기록은 백그라운드 배치 기록기에 위임 (응답 경로에서 DB 대기 없음)
+    interaction_logger.log(
+        user_id,
+        user_situation,
+        user_thought,
+        distortion_id,
+        latency={
+            "retrieval_ms": round(retrieval_ms, 1),
+            "llm_ms"      : round(llm_ms, 1),
+            "total_ms"    : round(retrieval_ms + llm_ms, 1)
+        }
+    )
 
-    # (4) asyncio.run(...)으로 비동기 함수 실행
-    asyncio.run(main())
+    with st.expander("📄 Prompt Sent to LLM"):
+        st.code(prompt)
@@ -0,0 +1,97 @@
+# token_budget.py
+import re
+import threading
+from typing import List, Optional
+
+# ──────────────────────────────────────────────
+# 토큰 수 계산 / 자르기
+#   tokenizer_name이 있으면 해당 HF 토크나이저(대상 LLM과 같은 것)를 처음 쓸 때 로드,
+#   없으면 단어·문장부호 단위 근사 (영어 BPE 기준 단어당 ≈1.3토큰)
+# ──────────────────────────────────────────────
+_PIECE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+ELLIPSIS = " …"
+
+
+def _piece_tokens(piece: str) -> int:
+    # 긴 단어·한글 어절은 여러 토큰으로 쪼개지므로 길이에 비례해 가산
+    return 1 + len(piece) // 5 if piece[0].isascii() else 1 + len(piece) // 2
+
+
+class TokenCounter:
+    def __init__(self, tokenizer_name: str = ""):
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if self.tokenizer_name and self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return sum(_piece_tokens(m.group()) for m in _PIECE.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """max_tokens 이하로 자르고 잘렸으면 ' …'를 붙인다 (max_tokens <= 0: 그대로)"""
+        if max_tokens <= 0 or not text or self.count(text) <= max_tokens:
+            return text
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+            return self.tokenizer.decode(ids).rstrip() + ELLIPSIS
+
+        used, end = 0, 0
+        for m in _PIECE.finditer(text):
+            used += _piece_tokens(m.group())
+            if used > max_tokens:
+                break
+            end = m.end()
+        return text[:end].rstrip() + ELLIPSIS
+
+
+# ──────────────────────────────────────────────
+# 프롬프트 예산 설정
+# ──────────────────────────────────────────────
+class PromptBudget:
+    """
+    total        : 프롬프트 전체 토큰 예산 (0: 제한 없음 — 필드 상한만 적용)
+    user_tokens  : 사용자 상황 / 생각 각각의 상한
+    field_tokens : 정의·팁·예시 필드(상황/생각/리프레임) 각각의 상한 (조각 캐시 생성 시 적용)
+    우선순위: 안내문 + 사용자 입력 > 후보(이름·정의) > 팁 > 리프레임 예시(순위 1의 예시 1, 순위 2의 예시 1, …)
+    예산을 넘으면 예시를 통째로 빼고, 그래도 넘으면 하위 후보부터 뺀다 (최소 1개 유지).
+    남은 1개의 필수 부분만으로도 넘으면 예산 초과 상태로 두고 usage['over_budget']로 알린다.
+    """
+
+    def __init__(self, total: int = 0, user_tokens: int = 0, field_tokens: int = 0,
+                 counter: Optional[TokenCounter] = None):
+        self.total = total
+        self.user_tokens = user_tokens
+        self.field_tokens = field_tokens
+        self.counter = counter or TokenCounter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.total > 0 or self.user_tokens > 0 or self.field_tokens > 0
+
+    def trim_field(self, text: str) -> str:
+        return self.counter.truncate(text, self.field_tokens) if isinstance(text, str) else text
+
+    def trim_user(self, text: str) -> str:
+        return self.counter.truncate(text, self.user_tokens)
+
+
+def example_order(counts: List[int]) -> List[tuple]:
+    """후보별 예시 수 → 추가 우선순위 [(후보 순번, 예시 순번), …] (예시 순번 우선, 그 다음 후보 순위)"""
+    return [
+        (c, e)
+        for e in range(max(counts, default=0))
+        for c, n in enumerate(counts)
+        if e < n
+    ]
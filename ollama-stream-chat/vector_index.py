@@ -0,0 +1,430 @@
+# vector_index.py
+import json
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+
+
+# search_many: 한 번에 (질의 수 × 행 수) 점수 행렬을 만드는 질의 수
+_QUERY_CHUNK = 256
+
+
+def parse_vector(value) -> np.ndarray:
+    """pgvector 텍스트 표현('[0.1,0.2,...]') 또는 바이너리 코덱의 배열 → float32 배열"""
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+# ──────────────────────────────────────────────
+# 인메모리 벡터 인덱스 (example_embeddings + 메타데이터)
+# ──────────────────────────────────────────────
+class InMemoryVectorIndex:
+    """
+    example_embeddings 전체를 연속된 float32 행렬로 보관하고,
+    pgvector의 `<->`(L2 거리)와 동일한 순서로 top-k를 반환한다.
+
+    metadata[i]는 embeddings[i] 행에 대응하며
+    fetch_top_k_similar_thoughts()와 같은 키를 가진다.
+    """
+
+    def __init__(self, embeddings: np.ndarray, metadata: List[Dict]):
+        if len(embeddings) != len(metadata):
+            raise ValueError("embeddings and metadata must have the same length")
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.metadata = metadata
+        # ||e||^2 는 고정이므로 미리 계산
+        self._sq_norms = np.einsum("ij,ij->i", self.embeddings, self.embeddings)
+        # 행별 distortion_id (diversify / partition 용, 없으면 -1)
+        self._labels = np.array(
+            [m.get("distortion_id") if m.get("distortion_id") is not None else -1 for m in metadata],
+            dtype=np.int64
+        )
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        """검색에 쓰는 배열의 메모리 사용량 (메타데이터 제외)"""
+        return self.embeddings.nbytes + self._sq_norms.nbytes
+
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int = 3,
+        diversify: bool = False,
+        exclude_rows: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        """
+        행렬-벡터 곱 1회 + argpartition으로 L2 거리 기준 상위 k개 반환.
+        diversify=True면 서로 다른 distortion에서 가장 가까운 예시를 하나씩 고른다.
+        exclude_rows: 결과에서 뺄 행 (생성자에 넘긴 순서 기준, 예: leave-one-out 평가)
+        """
+        n = len(self.metadata)
+        if n == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+
+        # ||e - q||^2 = ||e||^2 - 2 e·q + ||q||^2  (||q||^2는 순위에 영향 없음)
+        scores = self._sq_norms - 2.0 * (self.embeddings @ q)
+        rows = np.arange(n)
+        if exclude_rows is not None and len(exclude_rows):
+            keep = np.ones(n, dtype=bool)
+            keep[np.asarray(exclude_rows)] = False
+            rows, scores = rows[keep], scores[keep]
+        idx = self._select(scores, rows, top_k, diversify)
+        return [dict(self.metadata[i]) for i in idx]
+
+    def search_many(
+        self,
+        queries: np.ndarray,
+        top_k: int = 3,
+        diversify: bool = False
+    ) -> List[List[Dict]]:
+        """
+        질의 여러 개를 (청크당) 행렬 곱 1회로 검색. 질의마다 search()를 부른 것과 같은 결과.
+        diversify가 아니면 top-k 선택도 행 단위 argpartition 한 번으로 처리
+        """
+        qs = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n = len(self.metadata)
+        if n == 0 or top_k <= 0:
+            return [[] for _ in range(len(qs))]
+        k = min(top_k, n)
+        rows = np.arange(n)
+        out: List[List[Dict]] = []
+        for s in range(0, len(qs), _QUERY_CHUNK):
+            scores = self._sq_norms[None, :] - 2.0 * (qs[s:s + _QUERY_CHUNK] @ self.embeddings.T)
+            if diversify:
+                picked = [self._select(row, rows, top_k, True) for row in scores]
+            else:
+                idx = np.argpartition(scores, k - 1, axis=1)[:, :k]
+                order = np.argsort(np.take_along_axis(scores, idx, axis=1), axis=1, kind="stable")
+                picked = np.take_along_axis(idx, order, axis=1)
+            out.extend([dict(self.metadata[i]) for i in r] for r in picked)
+        return out
+
+    def _search_each(self, queries: np.ndarray, top_k: int = 3, diversify: bool = False) -> List[List[Dict]]:
+        return [self.search(q, top_k, diversify=diversify) for q in np.atleast_2d(queries)]
+
+    def _select(self, scores: np.ndarray, rows: np.ndarray, top_k: int, diversify: bool) -> np.ndarray:
+        """scores[j] 는 rows[j] 행의 점수. 점수 순 상위 top_k 행 번호 반환"""
+        k = min(top_k, len(rows))
+        if not diversify:
+            idx = np.argpartition(scores, k - 1)[:k]
+            return rows[idx[np.argsort(scores[idx], kind="stable")]]
+
+        # 가까운 후보 pool 안에서 먼저 시도, distortion 종류가 부족하면 전체 정렬
+        pool = min(len(rows), max(16 * k, 64))
+        cand = np.argpartition(scores, pool - 1)[:pool] if pool < len(rows) else np.arange(len(rows))
+        order = rows[cand[np.argsort(scores[cand], kind="stable")]]
+        _, first = np.unique(self._labels[order], return_index=True)
+        if len(first) < k and pool < len(rows):
+            order = rows[np.argsort(scores, kind="stable")]
+            _, first = np.unique(self._labels[order], return_index=True)
+        # distortion별 첫 번째(가장 가까운) 행만 → 거리순 유지
+        picked = order[np.sort(first)][:k]
+        if len(picked) < k:
+            # distortion 종류가 k보다 적으면 남은 자리는 거리순으로 채움
+            rest = order[~np.isin(order, picked)][:k - len(picked)]
+            picked = np.concatenate([picked, rest])
+        return picked
+
+    # ─── 적재 / 저장 ───
+    @classmethod
+    async def load_from_db(cls, session: AsyncSession, **kwargs) -> "InMemoryVectorIndex":
+        sql = text("""
+            SELECT
+                r.thought                AS example_thought,
+                r.distortion_id          AS distortion_id,
+                d.trap_name,
+                d.definition,
+                d.tips,
+                e.embedding              AS embedding
+            FROM example_embeddings AS e
+            INNER JOIN example_dataset AS r
+              ON e.embedding_id = r.embedding_id
+            LEFT JOIN distortions AS d
+              ON r.distortion_id = d.distortion_id
+            ORDER BY e.embedding_id;
+        """)
+        result = await session.execute(sql)
+        rows = result.mappings().all()
+
+        metadata = [
+            {
+                "example_thought": row["example_thought"],
+                "distortion_id"  : row["distortion_id"],
+                "trap_name"      : row["trap_name"] or "UnknownDistortion",
+                "definition"     : row["definition"] or "Definition not available.",
+                "tips"           : row["tips"] or "No tips available."
+            }
+            for row in rows
+        ]
+        if rows:
+            embeddings = np.vstack([parse_vector(row["embedding"]) for row in rows])
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        return cls(embeddings, metadata, **kwargs)
+
+    @classmethod
+    def load_snapshot(cls, path: str, **kwargs) -> "InMemoryVectorIndex":
+        with np.load(path, allow_pickle=False) as data:
+            embeddings = data["embeddings"]
+            metadata = json.loads(str(data["metadata"]))
+        return cls(embeddings, metadata, **kwargs)
+
+    def save_snapshot(self, path: str) -> None:
+        np.savez(
+            path,
+            embeddings=self.embeddings,
+            metadata=np.array(json.dumps(self.metadata, ensure_ascii=False))
+        )
+
+
+# ──────────────────────────────────────────────
+# 2단계 검색: distortion centroid → partition 내부 전수 검색
+# ──────────────────────────────────────────────
+def _kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """작은 partition용 Lloyd k-means. Return: (k, dim) centroid"""
+    k = min(k, len(x))
+    rng = np.random.default_rng(seed)
+    centers = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        d = (np.einsum("ij,ij->i", centers, centers)[None, :] - 2.0 * (x @ centers.T))
+        assign = d.argmin(axis=1)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centers[c] = members.mean(axis=0)
+    return centers
+
+
+class CentroidVectorIndex(InMemoryVectorIndex):
+    """
+    example을 distortion_id별 partition으로 묶고, partition마다
+    centroid(sub_centroids > 1이면 k-means로 여러 개)를 미리 계산해 둔다.
+
+    search():
+      1) 질의 ↔ centroid (13 × sub_centroids개) 거리 계산
+      2) 가장 가까운 n_probe개 distortion partition 선택
+      3) 선택된 partition 행들에서만 정확한 L2 top-k
+    partition 행은 연속 구간으로 재배열해 슬라이스만으로 접근한다.
+    """
+
+    def __init__(self, embeddings: np.ndarray, metadata: List[Dict],
+                 sub_centroids: int = 1, n_probe: int = 3):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        labels = np.array(
+            [m.get("distortion_id") if m.get("distortion_id") is not None else -1 for m in metadata],
+            dtype=np.int64
+        )
+        # distortion_id 순으로 재배열 → partition = 연속 구간
+        order = np.argsort(labels, kind="stable")
+        super().__init__(embeddings[order] if len(order) else embeddings,
+                         [metadata[i] for i in order])
+        # 입력 행 번호 → 재배열 후 행 번호 (exclude_rows 변환용)
+        self._position = np.empty(len(order), dtype=np.int64)
+        self._position[order] = np.arange(len(order))
+        self.n_probe = n_probe
+        self.sub_centroids = sub_centroids
+
+        self.partitions: Dict[int, tuple] = {}
+        centroids, owners = [], []
+        if len(self._labels):
+            ids, starts, counts = np.unique(self._labels, return_index=True, return_counts=True)
+            for did, start, count in zip(ids.tolist(), starts.tolist(), counts.tolist()):
+                self.partitions[did] = (start, start + count)
+                block = self.embeddings[start:start + count]
+                cs = (_kmeans(block, sub_centroids, seed=did) if sub_centroids > 1
+                      else block.mean(axis=0, keepdims=True))
+                centroids.append(cs)
+                owners.extend([did] * len(cs))
+        self.centroids = (np.vstack(centroids).astype(np.float32) if centroids
+                          else np.zeros((0, self.dim), dtype=np.float32))
+        self._centroid_owner = np.array(owners, dtype=np.int64)
+        self._centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    def probe(self, query: Sequence[float], n_probe: int) -> List[int]:
+        """질의와 가까운 순서로 distortion_id n_probe개"""
+        q = np.asarray(query, dtype=np.float32)
+        d = self._centroid_sq - 2.0 * (self.centroids @ q)
+        owners = self._centroid_owner[np.argsort(d, kind="stable")]
+        _, first = np.unique(owners, return_index=True)
+        return owners[np.sort(first)][:n_probe].tolist()
+
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int = 3,
+        diversify: bool = False,
+        exclude_rows: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        if len(self.metadata) == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        # diversify는 distortion마다 1개이므로 최소 top_k개 partition 필요
+        n_probe = max(self.n_probe, top_k) if diversify else self.n_probe
+
+        rows = np.concatenate([
+            np.arange(*self.partitions[did]) for did in self.probe(q, n_probe)
+        ])
+        if exclude_rows is not None and len(exclude_rows):
+            rows = rows[~np.isin(rows, self._position[np.asarray(exclude_rows)])]
+            if len(rows) == 0:
+                return []
+        scores = self._sq_norms[rows] - 2.0 * (self.embeddings[rows] @ q)
+        idx = self._select(scores, rows, top_k, diversify)
+        return [dict(self.metadata[i]) for i in idx]
+
+    def search_many(self, queries: np.ndarray, top_k: int = 3, diversify: bool = False) -> List[List[Dict]]:
+        # 질의마다 probe되는 partition이 달라 행렬 곱 1회로 묶지 않음
+        return self._search_each(queries, top_k, diversify)
+
+
+# ──────────────────────────────────────────────
+# 양자화 인덱스: float16 / int8 / binary + 선택적 float re-rank
+# ──────────────────────────────────────────────
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+_SCAN_CHUNK = 8192
+
+
+class QuantizedVectorIndex(InMemoryVectorIndex):
+    """
+    encoding (행당 바이트, dim=384 기준):
+      "float16": 반정밀도 (768B)
+      "int8"   : 차원별 min/max 스칼라 양자화, uint8 코드 (384B)
+      "binary" : 차원별 평균 기준 부호 비트, 해밍 거리 (48B)
+
+    rerank > 0 이면 양자화 점수로 top_k * rerank개 후보를 고른 뒤
+    원본 float32로 정확한 L2 재정렬 (float32 사본을 유지).
+    rerank == 0 이면 float32 사본을 버리고 양자화 코드만 보관한다.
+    """
+
+    ENCODINGS = ("float16", "int8", "binary")
+
+    def __init__(self, embeddings: np.ndarray, metadata: List[Dict],
+                 encoding: str = "int8", rerank: int = 4):
+        if encoding not in self.ENCODINGS:
+            raise ValueError(f"Unknown embedding encoding: {encoding}")
+        super().__init__(embeddings, metadata)
+        self.encoding = encoding
+        self.rerank = rerank
+        self._dim = super().dim
+        x = self.embeddings
+
+        if encoding == "float16":
+            self.codes = x.astype(np.float16)
+            approx = self.codes.astype(np.float32)
+            self._approx_sq = np.einsum("ij,ij->i", approx, approx)
+        elif encoding == "int8":
+            lo = x.min(axis=0) if len(x) else np.zeros(self._dim, dtype=np.float32)
+            hi = x.max(axis=0) if len(x) else np.zeros(self._dim, dtype=np.float32)
+            self._lo = lo.astype(np.float32)
+            self._scale = np.where(hi > lo, (hi - lo) / 255.0, 1.0).astype(np.float32)
+            self.codes = np.clip(np.rint((x - self._lo) / self._scale), 0, 255).astype(np.uint8)
+            approx = self._lo + self.codes.astype(np.float32) * self._scale
+            self._approx_sq = np.einsum("ij,ij->i", approx, approx)
+        else:
+            self._threshold = (x.mean(axis=0) if len(x) else np.zeros(self._dim)).astype(np.float32)
+            self.codes = np.packbits(x > self._threshold, axis=1)
+            self._approx_sq = None
+
+        if rerank <= 0:
+            # 정확한 재정렬을 하지 않으면 float32 사본은 필요 없음
+            self.embeddings = np.zeros((0, self._dim), dtype=np.float32)
+            self._sq_norms = np.zeros(0, dtype=np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @property
+    def nbytes(self) -> int:
+        aux = sum(a.nbytes for a in (
+            self._approx_sq, getattr(self, "_lo", None), getattr(self, "_scale", None),
+            getattr(self, "_threshold", None)
+        ) if a is not None)
+        return self.codes.nbytes + aux + super().nbytes
+
+    def _approx_scores(self, q: np.ndarray) -> np.ndarray:
+        """작을수록 가까운 근사 점수 (행 순서 그대로)"""
+        n = len(self.codes)
+        if self.encoding == "binary":
+            qbits = np.packbits(q > self._threshold)
+            return _POPCOUNT[np.bitwise_xor(self.codes, qbits)].sum(axis=1).astype(np.float32)
+
+        dots = np.empty(n, dtype=np.float32)
+        if self.encoding == "float16":
+            for s in range(0, n, _SCAN_CHUNK):
+                dots[s:s + _SCAN_CHUNK] = self.codes[s:s + _SCAN_CHUNK].astype(np.float32) @ q
+        else:
+            # x̂·q = lo·q + code·(scale*q)
+            qs = self._scale * q
+            for s in range(0, n, _SCAN_CHUNK):
+                dots[s:s + _SCAN_CHUNK] = self.codes[s:s + _SCAN_CHUNK].astype(np.float32) @ qs
+            dots += float(self._lo @ q)
+        return self._approx_sq - 2.0 * dots
+
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int = 3,
+        diversify: bool = False,
+        exclude_rows: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        n = len(self.metadata)
+        if n == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        scores = self._approx_scores(q)
+        rows = np.arange(n)
+        if exclude_rows is not None and len(exclude_rows):
+            keep = np.ones(n, dtype=bool)
+            keep[np.asarray(exclude_rows)] = False
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) == 0:
+            return []
+
+        if self.rerank > 0:
+            # 양자화 점수로 후보 축소 → 원본 float32로 정확한 L2
+            n_cand = min(len(rows), top_k * self.rerank * (4 if diversify else 1))
+            cand = np.argpartition(scores, n_cand - 1)[:n_cand] if n_cand < len(rows) else np.arange(len(rows))
+            rows = rows[cand]
+            scores = self._sq_norms[rows] - 2.0 * (self.embeddings[rows] @ q)
+
+        idx = self._select(scores, rows, top_k, diversify)
+        return [dict(self.metadata[i]) for i in idx]
+
+    def search_many(self, queries: np.ndarray, top_k: int = 3, diversify: bool = False) -> List[List[Dict]]:
+        # 근사 점수 계산이 이미 청크 단위 스캔이므로 질의별 search() 재사용
+        return self._search_each(queries, top_k, diversify)
+
+    def save_snapshot(self, path: str) -> None:
+        if self.rerank <= 0:
+            raise ValueError("snapshot requires float embeddings (rerank > 0)")
+        super().save_snapshot(path)
+
+
+# ──────────────────────────────────────────────
+# CLI: DB → 스냅샷 파일 덤프
+#   python vector_index.py ./archive/example_index.npz
+# ──────────────────────────────────────────────
+if __name__ == "__main__":
+    import sys
+    import asyncio
+    from database import async_session
+
+    async def _dump(path: str):
+        async with async_session() as session:
+            index = await InMemoryVectorIndex.load_from_db(session)
+        index.save_snapshot(path)
+        print(f"✅ {len(index)}개 임베딩(dim={index.dim}) → {path} 저장 완료")
+
+    asyncio.run(_dump(sys.argv[1] if len(sys.argv) > 1 else "example_index.npz"))